@@ -33,6 +33,7 @@
 from six.moves import configparser
 from six.moves import input
 import getopt
+import os
 import sys
 
 from pycsw.core import admin, config
@@ -63,6 +64,8 @@ SYNOPSIS
               - get_sysprof
               - validate_xml
               - delete_records
+              - probe_db
+              - render_records
 
     -f    Filepath to pycsw configuration
 
@@ -111,7 +114,9 @@ EXAMPLES
 
         pycsw-admin.py -c export_records -p /path/to/records -f default.cfg
 
-    4.) rebuild_db_indexes: Rebuild repository database indexes
+    4.) rebuild_db_indexes: Fill in the envelopes of records lacking them,
+        adding the columns holding them if needed, and rebuild repository
+        database indexes
 
         pycsw-admin.py -c rebuild_db_indexes -f default.cfg
 
@@ -148,6 +153,19 @@ EXAMPLES
 
         pycsw-admin.py -c delete_records -f default.cfg -y
 
+   13.) probe_db: Re-probe repository database capabilities (PostGIS, FTS)
+        after schema changes, and signal running servers using the same
+        configuration to do the same (the configuration file is touched)
+
+        pycsw-admin.py -c probe_db -f default.cfg
+
+   14.) render_records: Pre-render the brief and summary csw:Record of
+        all records, adding the columns holding them if needed, and signal
+        running servers using the same configuration (the configuration
+        file is touched)
+
+        pycsw-admin.py -c render_records -f default.cfg
+
 '''
 
 COMMAND = None
@@ -205,7 +223,8 @@ if COMMAND not in ['setup_db', 'load_records', 'export_records',
                    'rebuild_db_indexes', 'optimize_db',
                    'refresh_harvested_records', 'gen_sitemap',
                    'post_xml', 'get_sysprof',
-                   'validate_xml', 'delete_records']:
+                   'validate_xml', 'delete_records', 'probe_db',
+                   'render_records']:
     print('ERROR: invalid command name: %s' % COMMAND)
     sys.exit(5)
 
@@ -262,7 +281,8 @@ elif COMMAND == 'load_records':
 elif COMMAND == 'export_records':
     admin.export_records(CONTEXT, DATABASE, TABLE, XML_DIRPATH)
 elif COMMAND == 'rebuild_db_indexes':
-    admin.rebuild_db_indexes(DATABASE, TABLE)
+    admin.rebuild_db_indexes(DATABASE, TABLE, CONTEXT)
+    os.utime(CFG, None)
 elif COMMAND == 'optimize_db':
     admin.optimize_db(CONTEXT, DATABASE, TABLE)
 elif COMMAND == 'refresh_harvested_records':
@@ -281,5 +301,11 @@ elif COMMAND == 'delete_records':
             FORCE_CONFIRM = True
     if FORCE_CONFIRM:
         admin.delete_records(CONTEXT, DATABASE, TABLE)
+elif COMMAND == 'probe_db':
+    print(admin.probe_db(CONTEXT, DATABASE, TABLE))
+    os.utime(CFG, None)
+elif COMMAND == 'render_records':
+    admin.render_records(CONTEXT, DATABASE, TABLE)
+    os.utime(CFG, None)
 
 print('Done')
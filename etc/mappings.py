@@ -47,6 +47,8 @@ MD_CORE_MODEL = {
         'pycsw:InsertDate': 'insert_date',
         'pycsw:XML': 'xml',
         'pycsw:AnyText': 'anytext',
+        'pycsw:BriefXML': 'xml_brief',
+        'pycsw:SummaryXML': 'xml_summary',
         'pycsw:Language': 'language',
         'pycsw:Title': 'title',
         'pycsw:Abstract': 'abstract',
@@ -58,6 +60,10 @@ MD_CORE_MODEL = {
         'pycsw:Modified': 'date_modified',
         'pycsw:Type': 'type',
         'pycsw:BoundingBox': 'wkt_geometry',
+        'pycsw:MinX': 'minx',
+        'pycsw:MinY': 'miny',
+        'pycsw:MaxX': 'maxx',
+        'pycsw:MaxY': 'maxy',
         'pycsw:CRS': 'crs',
         'pycsw:AlternateTitle': 'title_alternate',
         'pycsw:RevisionDate': 'date_revision',
@@ -45,9 +45,10 @@ LOGGER = logging.getLogger(__name__)
 
 def setup_db(database, table, home, create_sfsql_tables=True, create_plpythonu_functions=True, postgis_geometry_column='wkb_geometry', extra_columns=[], language='english'):
     """Setup database tables and indexes"""
-    from sqlalchemy import Column, create_engine, Integer, MetaData, \
-        Table, Text
+    from sqlalchemy import Column, create_engine, Float, Integer, \
+        MetaData, Table, Text
     from sqlalchemy.orm import create_session
+    from pycsw.core.config import StaticContext
 
     LOGGER.info('Creating database %s', database)
     if database.startswith('sqlite'):
@@ -126,6 +127,8 @@ def setup_db(database, table, home, create_sfsql_tables=True, create_plpythonu_f
         Column('insert_date', Text, nullable=False, index=True),
         Column('xml', Text, nullable=False),
         Column('anytext', Text, nullable=False),
+        Column('xml_brief', Text),
+        Column('xml_summary', Text),
         Column('language', Text, index=True),
 
         # identification
@@ -170,6 +173,10 @@ def setup_db(database, table, home, create_sfsql_tables=True, create_plpythonu_f
         Column('distancevalue', Text, index=True),
         Column('distanceuom', Text, index=True),
         Column('wkt_geometry', Text),
+        Column('minx', Float(precision=53), index=True),
+        Column('miny', Float(precision=53), index=True),
+        Column('maxx', Float(precision=53), index=True),
+        Column('maxy', Float(precision=53), index=True),
 
         # service
         Column('servicetype', Text, index=True),
@@ -308,6 +315,197 @@ FOR EACH ROW EXECUTE PROCEDURE %(table)s_update_geometry();
         conn.execute(create_insert_update_trigger_sql)
         conn.execute(create_spatial_index_sql)
 
+    if dbase.name == 'sqlite':
+        LOGGER.info('Creating SQLite R*Tree spatial index')
+        try:
+            with conn.begin():
+                _setup_sqlite_spatial_index(conn, table_name)
+        except Exception as err:  # SQLite built without the R*Tree module
+            LOGGER.warning('Spatial index not created: %s', err)
+
+        LOGGER.info('Creating SQLite FTS5 full text index')
+        try:
+            with conn.begin():
+                _setup_sqlite_fts(conn, table_name)
+        except Exception as err:  # SQLite without FTS5 or trigram (< 3.34)
+            LOGGER.warning('Full text index not created: %s', err)
+
+    LOGGER.info('Creating trigger clearing stale pre-rendered records')
+    with conn.begin():
+        _setup_rendered_trigger(conn, table,
+                                StaticContext().md_core_model['mappings'])
+
+    # table definition changed: discard any previously reflected mapping
+    repository.Repository.refresh_datasets(database, table)
+    repository.Repository.refresh_capabilities(database, table)
+
+def _setup_sqlite_spatial_index(conn, table_name, populate=False):
+    """(Re)create the R*Tree of record envelopes and the triggers keeping
+    it in sync with the minx, miny, maxx and maxy columns of the records
+    table.  The triggers are plain SQL, so that records can be written by
+    any client.  Records with a geometry but no envelope, as written by
+    other tools, get an entry matching any query and are left to the exact
+    predicate; an envelope left as is by a geometry update is cleared"""
+
+    spatial_index = '%s_rtree' % table_name
+    # R*Tree order: x, then y; an unknown envelope spans any coordinate
+    no_bounds = '-1e38, 1e38, -1e38, 1e38'
+    bounds = ('coalesce(%(row)sminx, -1e38), coalesce(%(row)smaxx, 1e38), '
+              'coalesce(%(row)sminy, -1e38), coalesce(%(row)smaxy, 1e38)')
+    stale = ('new.wkt_geometry IS NOT old.wkt_geometry AND '
+             'new.minx IS old.minx AND new.miny IS old.miny AND '
+             'new.maxx IS old.maxx AND new.maxy IS old.maxy')
+
+    statements = [
+        'DROP TRIGGER IF EXISTS %s_insert' % spatial_index,
+        'DROP TRIGGER IF EXISTS %s_update' % spatial_index,
+        'DROP TRIGGER IF EXISTS %s_stale' % spatial_index,
+        'DROP TRIGGER IF EXISTS %s_delete' % spatial_index,
+        'DROP TABLE IF EXISTS %s' % spatial_index,
+        'CREATE VIRTUAL TABLE %s USING rtree(id, minx, maxx, miny, maxy)'
+        % spatial_index,
+        """CREATE TRIGGER %(index)s_insert AFTER INSERT ON %(table)s
+BEGIN
+    INSERT INTO %(index)s SELECT new.rowid, %(new_bounds)s
+    WHERE new.wkt_geometry IS NOT NULL;
+END""",
+        """CREATE TRIGGER %(index)s_update AFTER UPDATE OF wkt_geometry, minx, miny, maxx, maxy ON %(table)s
+BEGIN
+    DELETE FROM %(index)s WHERE id = old.rowid;
+    INSERT INTO %(index)s SELECT new.rowid, %(new_bounds)s
+    WHERE new.wkt_geometry IS NOT NULL AND NOT (%(stale)s);
+    INSERT INTO %(index)s SELECT new.rowid, %(no_bounds)s
+    WHERE new.wkt_geometry IS NOT NULL AND %(stale)s;
+END""",
+        """CREATE TRIGGER %(index)s_stale AFTER UPDATE OF wkt_geometry ON %(table)s
+WHEN %(stale)s
+BEGIN
+    UPDATE %(table)s SET minx = NULL, miny = NULL, maxx = NULL, maxy = NULL
+    WHERE rowid = new.rowid;
+END""",
+        """CREATE TRIGGER %(index)s_delete AFTER DELETE ON %(table)s
+BEGIN
+    DELETE FROM %(index)s WHERE id = old.rowid;
+END"""
+    ]
+
+    if populate:
+        statements.append("""INSERT INTO %(index)s SELECT rowid, %(bounds)s
+FROM %(table)s WHERE wkt_geometry IS NOT NULL""")
+
+    params = {
+        'index': spatial_index,
+        'table': table_name,
+        'stale': stale,
+        'bounds': bounds % {'row': ''},
+        'new_bounds': bounds % {'row': 'new.'},
+        'no_bounds': no_bounds
+    }
+
+    for statement in statements:
+        conn.execute(statement % params)
+
+
+def _setup_rendered_trigger(conn, table, mappings):
+    """(Re)create the trigger clearing the pre-rendered brief and summary
+    csw:Record of records whose presented columns are changed by another
+    client, so that they are presented from their columns until rendered
+    again.  pycsw itself writes the renderings along with the columns"""
+    from pycsw.ogc.csw.csw2 import RENDERED_ELEMENTSETS, RENDERED_SOURCES
+
+    table_name = repository._split_table(table)[1]
+    rendered = [mappings[name] for elname, name in
+                sorted(RENDERED_ELEMENTSETS.values())]
+    sources = [mappings[name] for name in RENDERED_SOURCES]
+
+    if conn.dialect.name == 'postgresql':
+        distinct, same = 'IS DISTINCT FROM', 'IS NOT DISTINCT FROM'
+    elif conn.dialect.name == 'sqlite':
+        distinct, same = 'IS NOT', 'IS'
+    else:
+        LOGGER.warning('Pre-rendered records of other clients\' updates '
+                       'are not cleared on %s', conn.dialect.name)
+        return
+
+    params = {
+        'trigger': '%s_rendered' % table_name,
+        'table': table,
+        'sources': ', '.join(sources),
+        'changed': ' OR '.join('new.%s %s old.%s' % (column, distinct, column)
+                               for column in sources),
+        'kept': ' AND '.join('new.%s %s old.%s' % (column, same, column)
+                             for column in rendered),
+    }
+
+    if conn.dialect.name == 'postgresql':
+        params['clear'] = '\n'.join('    NEW.%s := NULL;' % column
+                                     for column in rendered)
+        statements = [
+            'DROP TRIGGER IF EXISTS %(trigger)s ON %(table)s',
+            """CREATE OR REPLACE FUNCTION %(trigger)s() RETURNS trigger AS $%(trigger)s$
+BEGIN
+%(clear)s
+    RETURN NEW;
+END;
+$%(trigger)s$ LANGUAGE plpgsql""",
+            """CREATE TRIGGER %(trigger)s BEFORE UPDATE OF %(sources)s ON %(table)s
+FOR EACH ROW WHEN ((%(changed)s) AND %(kept)s)
+EXECUTE PROCEDURE %(trigger)s()"""
+        ]
+    else:
+        params['clear'] = ', '.join('%s = NULL' % column
+                                    for column in rendered)
+        statements = [
+            'DROP TRIGGER IF EXISTS %(trigger)s',
+            """CREATE TRIGGER %(trigger)s AFTER UPDATE OF %(sources)s ON %(table)s
+WHEN (%(changed)s) AND %(kept)s
+BEGIN
+    UPDATE %(table)s SET %(clear)s WHERE rowid = new.rowid;
+END"""
+        ]
+
+    for statement in statements:
+        conn.execute(statement % params)
+
+
+def _setup_sqlite_fts(conn, table_name, populate=False):
+    """(Re)create the FTS5 table indexing anytext and the triggers keeping
+    it in sync with the records table.  The trigram tokenizer matches
+    substrings, like the LIKE queries it replaces"""
+
+    fts = '%s_fts' % table_name
+
+    statements = [
+        'DROP TRIGGER IF EXISTS %s_insert' % fts,
+        'DROP TRIGGER IF EXISTS %s_update' % fts,
+        'DROP TRIGGER IF EXISTS %s_delete' % fts,
+        'DROP TABLE IF EXISTS %s' % fts,
+        """CREATE VIRTUAL TABLE %(fts)s USING fts5(anytext,
+content='%(table)s', content_rowid='rowid', tokenize='trigram')""",
+        """CREATE TRIGGER %(fts)s_insert AFTER INSERT ON %(table)s
+BEGIN
+    INSERT INTO %(fts)s (rowid, anytext) VALUES (new.rowid, new.anytext);
+END""",
+        """CREATE TRIGGER %(fts)s_update AFTER UPDATE OF anytext ON %(table)s
+BEGIN
+    INSERT INTO %(fts)s (%(fts)s, rowid, anytext)
+    VALUES ('delete', old.rowid, old.anytext);
+    INSERT INTO %(fts)s (rowid, anytext) VALUES (new.rowid, new.anytext);
+END""",
+        """CREATE TRIGGER %(fts)s_delete AFTER DELETE ON %(table)s
+BEGIN
+    INSERT INTO %(fts)s (%(fts)s, rowid, anytext)
+    VALUES ('delete', old.rowid, old.anytext);
+END"""
+    ]
+
+    if populate:
+        statements.append("INSERT INTO %(fts)s (%(fts)s) VALUES ('rebuild')")
+
+    for statement in statements:
+        conn.execute(statement % {'fts': fts, 'table': table_name})
+
+
 def load_records(context, database, table, xml_dirpath, recursive=False, force_update=False):
     """Load metadata records from directory of files to database"""
     repo = repository.Repository(database, context, table=table)
@@ -445,9 +643,111 @@ def refresh_harvested_records(context, database, table, url):
         LOGGER.info('No harvested records')
 
 
-def rebuild_db_indexes(database, table):
-    """Rebuild database indexes"""
-    raise NotImplementedError
+def update_bounds(context, database, table):
+    """Fill in the envelope columns of records with a geometry but no
+    envelope, adding the columns to tables created before they existed"""
+    from sqlalchemy import Float
+
+    repos = repository.Repository(database, context, table=table)
+    mappings = context.md_core_model['mappings']
+    columns = [mappings.get(name) for name in
+               ['pycsw:MinX', 'pycsw:MinY', 'pycsw:MaxX', 'pycsw:MaxY']]
+    if not all(columns):
+        LOGGER.info('No envelope columns mapped')
+        return 0
+    missing = [column for column in columns
+               if not hasattr(repos.dataset, column)]
+
+    if missing:
+        column_type = Float(precision=53).compile(dialect=repos.engine.dialect)
+        table_name = repository._split_table(table)[1]
+        for column in missing:
+            LOGGER.info('Adding column %s', column)
+            with repos.engine.begin() as conn:
+                conn.execute('ALTER TABLE %s ADD COLUMN %s %s' %
+                             (table, column, column_type))
+                conn.execute('CREATE INDEX ix_%s_%s ON %s (%s)' %
+                             (table_name, column, table, column))
+        repository.Repository.refresh_datasets(database, table)
+        repos = repository.Repository(database, context, table=table)
+
+    LOGGER.info('Filling in record envelopes')
+    count = repos.update_bounds()
+    LOGGER.info('%d record envelopes filled in', count)
+    return count
+
+
+def rebuild_db_indexes(database, table, context=None):
+    """Rebuild database indexes
+
+    With context, the envelope columns of records lacking them are filled
+    in first (see update_bounds)"""
+
+    if context is not None:
+        update_bounds(context, database, table)
+
+    if not database.startswith('sqlite'):
+        if context is not None:  # no other indexes to rebuild
+            return
+        raise NotImplementedError
+
+    table_name = repository._split_table(table)[1]
+    engine = repository.Repository.create_engine(database)
+    for name, setup in [('R*Tree spatial', _setup_sqlite_spatial_index),
+                        ('FTS5 full text', _setup_sqlite_fts)]:
+        LOGGER.info('Rebuilding SQLite %s index', name)
+        try:
+            with engine.begin() as conn:
+                setup(conn, table_name, populate=True)
+        except Exception as err:
+            LOGGER.warning('%s index not rebuilt: %s', name, err)
+
+    repository.Repository.refresh_capabilities(database, table)
+
+
+def render_records(context, database, table):
+    """Pre-render the brief and summary csw:Record of all records, adding
+    the columns holding them, and the trigger clearing them, to tables
+    created before they existed"""
+
+    repos = repository.Repository(database, context, table=table)
+    mappings = context.md_core_model['mappings']
+    missing = [mappings[name] for name in
+               ['pycsw:BriefXML', 'pycsw:SummaryXML']
+               if not hasattr(repos.dataset, mappings[name])]
+
+    if missing:
+        for column in missing:
+            LOGGER.info('Adding column %s', column)
+            with repos.engine.begin() as conn:
+                conn.execute('ALTER TABLE %s ADD COLUMN %s TEXT' %
+                             (table, column))
+        repository.Repository.refresh_datasets(database, table)
+        repos = repository.Repository(database, context, table=table)
+
+    with repos.engine.begin() as conn:
+        _setup_rendered_trigger(conn, table, mappings)
+
+    LOGGER.info('Rendering records')
+    count = repos.render_records()
+    LOGGER.info('%d records rendered', count)
+    return count
+
+
+def probe_db(context, database, table):
+    """Re-probe database capabilities (PostGIS, native geometry, FTS)"""
+
+    LOGGER.info('Probing database %s', database)
+    repository.Repository.refresh_capabilities(database, table)
+    repos = repository.Repository(database, context, table=table)
+    capabilities = {
+        'dbtype': repos.dbtype,
+        'postgis_geometry_column': repos.postgis_geometry_column,
+        'fts': repos.fts,
+        'spatial_index': repos.spatial_index
+    }
+    LOGGER.info('Database capabilities: %s', capabilities)
+    return capabilities
 
 
 def optimize_db(context, database, table):
@@ -455,7 +755,15 @@ def optimize_db(context, database, table):
 
     LOGGER.info('Optimizing database %s', database)
     repos = repository.Repository(database, context, table=table)
-    repos.engine.connect().execute('VACUUM ANALYZE').close()
+    if repos.dbtype in ['sqlite', 'sqlite3']:
+        repos.engine.connect().execute('VACUUM').close()
+        repos.engine.connect().execute('ANALYZE').close()
+        if repos.fts or (repos.spatial_index is not None and
+                         repos.spatial_index['type'] == 'rtree'):
+            # VACUUM may renumber the rowids referenced by the indexes
+            rebuild_db_indexes(database, table, context)
+    else:
+        repos.engine.connect().execute('VACUUM ANALYZE').close()
 
 
 def gen_sitemap(context, database, table, url, output_file):
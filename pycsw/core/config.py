@@ -28,8 +28,10 @@
 #
 # =================================================================
 
+import copy
 import logging
 from pycsw.core.etree import PARSER
+from pycsw.core import util
 from pycsw import __version__
 
 LOGGER = logging.getLogger(__name__)
@@ -55,6 +57,7 @@ class StaticContext(object):
 
         self.response_codes = {
             'OK': '200 OK',
+            'NotModified': '304 Not Modified',
             'NotFound': '404 Not Found',
             'InvalidValue': '400 Invalid property value',
             'OperationParsingFailed': '400 Bad Request',
@@ -68,7 +71,7 @@ class StaticContext(object):
             'NoApplicableCode': '400 Internal Server Error'
         }
 
-        self.namespaces = {
+        self.namespaces = util.Namespaces({
             'atom': 'http://www.w3.org/2005/Atom',
             'csw': 'http://www.opengis.net/cat/csw/2.0.2',
             'csw30': 'http://www.opengis.net/cat/csw/3.0',
@@ -91,7 +94,7 @@ class StaticContext(object):
             'xlink': 'http://www.w3.org/1999/xlink',
             'xs': 'http://www.w3.org/2001/XMLSchema',
             'xsi': 'http://www.w3.org/2001/XMLSchema-instance'
-        }
+        })
 
         self.keep_ns_prefixes = [
             'csw', 'dc', 'dct', 'gmd', 'gml', 'ows', 'xs'
@@ -114,6 +117,9 @@ class StaticContext(object):
                 'pycsw:XML': 'xml',
                 # bag of metadata element and attributes ONLY, no XML tages
                 'pycsw:AnyText': 'anytext',
+                # brief and summary csw:Record XML, pre-rendered at ingest
+                'pycsw:BriefXML': 'xml_brief',
+                'pycsw:SummaryXML': 'xml_summary',
                 'pycsw:Language': 'language',
                 'pycsw:Title': 'title',
                 'pycsw:Abstract': 'abstract',
@@ -126,6 +132,11 @@ class StaticContext(object):
                 'pycsw:Type': 'type',
                 # geometry, specified in OGC WKT
                 'pycsw:BoundingBox': 'wkt_geometry',
+                # envelope of the geometry, for indexed spatial filtering
+                'pycsw:MinX': 'minx',
+                'pycsw:MinY': 'miny',
+                'pycsw:MaxX': 'maxx',
+                'pycsw:MaxY': 'maxy',
                 'pycsw:CRS': 'crs',
                 'pycsw:AlternateTitle': 'title_alternate',
                 'pycsw:RevisionDate': 'date_revision',
@@ -557,6 +568,19 @@ class StaticContext(object):
 
         self.model = self.models[prefix]
 
+    def clone(self):
+        """return a per-request copy of the context
+
+        Namespaces are copied, as some request modes (SRU, OAI-PMH,
+        OpenSearch) extend them.  Information models are shared and must
+        be treated as read-only.
+        """
+
+        context = copy.copy(self)
+        context.namespaces = self.namespaces.copy()
+        context.keep_ns_prefixes = list(self.keep_ns_prefixes)
+        return context
+
     def gen_domains(self):
         """Generate parameter domain model"""
         domain = {}
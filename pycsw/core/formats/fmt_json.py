@@ -30,8 +30,10 @@
 #
 # =================================================================
 
+from collections import OrderedDict
 import json
 
+import six
 import xmltodict
 
 
@@ -57,13 +59,102 @@ def xml2dict(xml_string, namespaces):
                            namespaces=namespaces_reverse)
 
 
+def etree2dict(element, namespaces):
+    """Convert an lxml element to a dictionary.
+
+    This produces the same structure as ``xml2dict`` does for the
+    serialized element, without serializing and parsing it again.
+
+    Parameters
+    ----------
+    element: lxml.etree._Element
+        XML element to convert to a dictionary.
+    namespaces: dict
+        Namespaces used in the ``element`` parameter
+
+    Returns
+    -------
+    ordereddict
+        An ordered dictionary with the contents of the xml data
+
+    """
+
+    namespaces_reverse = dict((v, k) for k, v in namespaces.items())
+    return OrderedDict([(_qname(element.tag, namespaces_reverse),
+                         _element2dict(element, namespaces_reverse))])
+
+
 def xml2json(xml_string, namespaces, pretty_print=False):
     """Convert an xml string to JSON"""
 
+    return _dumps(xml2dict(xml_string, namespaces), pretty_print)
+
+
+def etree2json(element, namespaces, pretty_print=False):
+    """Convert an lxml element to JSON"""
+
+    return _dumps(etree2dict(element, namespaces), pretty_print)
+
+
+def _dumps(dictionary, pretty_print=False):
+    """Serialize a dictionary to JSON"""
+
     separators = (',', ': ')
 
     if pretty_print:
-        return json.dumps(xml2dict(xml_string, namespaces),
-                          indent=4, separators=separators)
+        return json.dumps(dictionary, indent=4, separators=separators)
+
+    return json.dumps(dictionary, separators=separators)
+
+
+def _qname(tag, namespaces_reverse):
+    """Convert a Clark notation name to prefix:localname, as xmltodict"""
+
+    if tag[0] != '{':
+        return tag
+    namespace, name = tag[1:].split('}', 1)
+    prefix = namespaces_reverse.get(namespace, namespace)
+    if not prefix:
+        return name
+    return '%s:%s' % (prefix, name)
+
+
+def _push(item, key, data):
+    """Add a value to a dictionary, grouping repeated keys in a list"""
+
+    if item is None:
+        item = OrderedDict()
+    if key in item:
+        if isinstance(item[key], list):
+            item[key].append(data)
+        else:
+            item[key] = [item[key], data]
+    else:
+        item[key] = data
+    return item
+
+
+def _element2dict(element, namespaces_reverse):
+    """Convert the attributes, children and text of an element"""
+
+    item = None
+    if element.attrib:
+        item = OrderedDict(
+            ('@%s' % _qname(key, namespaces_reverse), value)
+            for key, value in element.attrib.items())
+
+    text = [element.text] if element.text else []
+    for child in element:
+        if isinstance(child.tag, six.string_types):  # skip comments, PIs
+            item = _push(item, _qname(child.tag, namespaces_reverse),
+                         _element2dict(child, namespaces_reverse))
+        if child.tail:
+            text.append(child.tail)
+
+    text = ''.join(text).strip() or None
 
-    return json.dumps(xml2dict(xml_string, namespaces), separators=separators)
+    if item is None:
+        return text
+    if text:
+        item = _push(item, '#text', text)
+    return item
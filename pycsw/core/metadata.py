@@ -120,6 +120,22 @@ def parse_record(context, record, repos=None,
 def _set(context, obj, name, value):
     ''' convenience method to set values '''
     setattr(obj, context.md_core_model['mappings'][name], value)
+    if name == 'pycsw:BoundingBox':
+        _set_bounds(context, obj, value)
+
+def _set_bounds(context, obj, wkt):
+    ''' set the envelope columns of a geometry, if the repository has them '''
+    columns = [context.md_core_model['mappings'].get(name) for name in
+               ['pycsw:MinX', 'pycsw:MinY', 'pycsw:MaxX', 'pycsw:MaxY']]
+    if not all(column and hasattr(type(obj), column) for column in columns):
+        return
+    try:
+        bounds = util.wkt2geom(wkt)
+    except Exception as err:
+        LOGGER.debug('Cannot derive envelope of %s: %s', wkt, err)
+        bounds = [None] * 4
+    for column, bound in zip(columns, bounds):
+        setattr(obj, column, bound)
 
 def _parse_metadata(context, repos, record):
     """parse metadata formats"""
@@ -32,17 +32,23 @@
 #
 # =================================================================
 
+from collections import OrderedDict
+import heapq
 import inspect
+import itertools
 import logging
 import os
+import threading
 
 import six
+from shapely.prepared import prep
 from shapely.wkt import loads
 from shapely.geos import ReadingError
-from sqlalchemy import create_engine, func, __version__, select
-from sqlalchemy.sql import text
+from sqlalchemy import and_, case, cast, create_engine, Float, func, __version__, or_, select
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.sql import literal_column, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import create_session
+from sqlalchemy.orm import create_session, load_only
 
 from pycsw.core import util
 from pycsw.core.etree import etree
@@ -50,9 +56,112 @@ from pycsw.core.etree import PARSER
 
 LOGGER = logging.getLogger(__name__)
 
+# number of rows fetched at a time when streaming query results
+STREAM_BATCH_SIZE = 10
+
+# number of records ranked at a time when ranking by spatial overlay
+RANKING_BATCH_SIZE = 500
+
+# number of records pre-rendered at a time
+RENDER_BATCH_SIZE = 500
+
+# number of record envelopes filled in at a time
+BOUNDS_BATCH_SIZE = 500
+
+# number of keyset pagination positions remembered
+KEYSET_CACHE_SIZE = 1024
+
+# number of prepared query geometries remembered by the spatial functions
+QUERY_GEOMETRY_CACHE_SIZE = 64
+
+
+class _Descending(object):
+    ''' Value ordered the other way round '''
+
+    __slots__ = ['value']
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __ne__(self, other):
+        return self.value != other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __gt__(self, other):
+        return other.value > self.value
+
+
+class GeometryCache(object):
+    ''' Least recently used cache of geometries parsed from (E)WKT '''
+
+    def __init__(self, size=0, prepared=False):
+        ''' Initialize cache; a size of 0 disables caching '''
+
+        self.size = size
+        self.prepared = prepared
+        self._geometries = OrderedDict()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def get(self, wkt):
+        ''' Return the (prepared) geometry of a WKT string '''
+
+        if self.size <= 0:
+            return self._load(wkt)
+
+        geometries = self._get_geometries()
+
+        with self._lock:
+            geometry = geometries.pop(wkt, None)
+            if geometry is not None:  # most recently used goes last
+                geometries[wkt] = geometry
+                return geometry
+
+        geometry = self._load(wkt)
+
+        with self._lock:
+            geometries[wkt] = geometry
+            while len(geometries) > self.size:
+                geometries.popitem(last=False)
+
+        return geometry
+
+    def clear(self):
+        ''' Discard all cached geometries '''
+
+        with self._lock:
+            self._get_geometries().clear()
+
+    def _get_geometries(self):
+        if not self.prepared:
+            return self._geometries
+        # prepared geometries build their index lazily: keep one per thread
+        if not hasattr(self._local, 'geometries'):
+            self._local.geometries = OrderedDict()
+        return self._local.geometries
+
+    def _load(self, wkt):
+        geometry = loads(wkt.split(';')[-1])
+        return prep(geometry) if self.prepared else geometry
+
+
+# query geometries are constant for a whole query, so they are prepared
+QUERY_GEOMETRIES = GeometryCache(QUERY_GEOMETRY_CACHE_SIZE, prepared=True)
+
+# record geometries, enabled with the repository.geometry_cache setting
+RECORD_GEOMETRIES = GeometryCache()
+
 
 class Repository(object):
     _engines = {}
+    _datasets = {}
+    _capabilities = {}
+    _keysets = {}
 
     @classmethod
     def create_engine(clazz, url):
@@ -83,13 +192,82 @@ class Repository(object):
 
         return clazz._engines[url]
 
+    @classmethod
+    def create_dataset(clazz, engine, schema_name, table_name):
+        '''
+        Reflecting the records table issues a round of catalogue queries,
+        so the mapped class is cached as a class variable as well
+
+        Mapped classes are memoized by (url, schema, table).  Call
+        refresh_datasets() after the table definition changes
+        '''
+        key = (str(engine.url), schema_name, table_name)
+        if key not in clazz._datasets:
+            LOGGER.info('binding ORM to existing database')
+            base = declarative_base(bind=engine)
+            clazz._datasets[key] = type(
+                'dataset',
+                (base,),
+                {
+                    "__tablename__": table_name,
+                    "__table_args__": {
+                        "autoload": True,
+                        "schema": schema_name,
+                    },
+                }
+            )
+
+        return clazz._datasets[key]
+
+    @classmethod
+    def probe_capabilities(clazz, engine, schema_name, table_name):
+        '''
+        Detect PostGIS support, a native geometry column and the FTS index
+
+        Probing costs several round trips, so results are memoized by
+        (url, schema, table).  Call refresh_capabilities() to re-probe
+        after schema changes
+        '''
+        key = (str(engine.url), schema_name, table_name)
+        if key not in clazz._capabilities:
+            clazz._capabilities[key] = _probe_capabilities(engine, table_name)
+
+        return clazz._capabilities[key]
+
+    @classmethod
+    def refresh_capabilities(clazz, url=None, table=None):
+        '''
+        Discard memoized database capabilities so that the next Repository
+        probes the database again.  Without arguments the whole cache is
+        cleared
+        '''
+        clazz._refresh(clazz._capabilities, url, table)
+
+    @classmethod
+    def refresh_datasets(clazz, url=None, table=None):
+        '''
+        Discard cached mapped classes so that the next Repository reflects
+        the table again.  Without arguments the whole cache is cleared
+        '''
+        clazz._refresh(clazz._datasets, url, table)
+
+    @staticmethod
+    def _refresh(cache, url=None, table=None):
+        ''' Discard cache entries keyed by (url, schema, table) '''
+        for key in list(cache.keys()):
+            if url is not None and key[0] != str(make_url(url)):
+                continue
+            if table is not None and key[1:] != _split_table(table):
+                continue
+            LOGGER.info('discarding cached database state for %s', key)
+            cache.pop(key, None)
+
     ''' Class to interact with underlying repository '''
     def __init__(self, database, context, app_root=None, table='records', repo_filter=None):
         ''' Initialize repository '''
 
         self.context = context
         self.filter = repo_filter
-        self.fts = False
 
         # Don't use relative paths, this is hack to get around
         # most wsgi restriction...
@@ -100,73 +278,19 @@ class Repository(object):
 
         self.engine = Repository.create_engine('%s' % database)
 
-        base = declarative_base(bind=self.engine)
-
-        LOGGER.info('binding ORM to existing database')
-
-        self.postgis_geometry_column = None
-
-        schema_name, table_name = table.rpartition(".")[::2]
-
-        self.dataset = type(
-            'dataset',
-            (base,),
-            {
-                "__tablename__": table_name,
-                "__table_args__": {
-                    "autoload": True,
-                    "schema": schema_name or None,
-                },
-            }
-        )
+        schema_name, table_name = _split_table(table)
 
-        self.dbtype = self.engine.name
+        self.dataset = Repository.create_dataset(self.engine, schema_name,
+                                                 table_name)
 
         self.session = create_session(self.engine)
 
-        temp_dbtype = None
-
-        if self.dbtype == 'postgresql':
-            # check if PostgreSQL is enabled with PostGIS 1.x
-            try:
-                self.session.execute(select([func.postgis_version()]))
-                temp_dbtype = 'postgresql+postgis+wkt'
-                LOGGER.debug('PostgreSQL+PostGIS1+WKT detected')
-            except Exception as err:
-                LOGGER.exception('PostgreSQL+PostGIS1+WKT detection failed')
-
-            # check if PostgreSQL is enabled with PostGIS 2.x
-            try:
-                self.session.execute('select(postgis_version())')
-                temp_dbtype = 'postgresql+postgis+wkt'
-                LOGGER.debug('PostgreSQL+PostGIS2+WKT detected')
-            except Exception as err:
-                LOGGER.exception('PostgreSQL+PostGIS2+WKT detection failed')
-
-            # check if a native PostGIS geometry column exists
-            try:
-                result = self.session.execute(
-                    "select f_geometry_column "
-                    "from geometry_columns "
-                    "where f_table_name = '%s' "
-                    "and f_geometry_column != 'wkt_geometry' "
-                    "limit 1;" % table_name
-                )
-                row = result.fetchone()
-                self.postgis_geometry_column = str(row['f_geometry_column'])
-                temp_dbtype = 'postgresql+postgis+native'
-                LOGGER.debug('PostgreSQL+PostGIS+Native detected')
-            except Exception as err:
-                LOGGER.exception('PostgreSQL+PostGIS+Native not picked up: %s')
-
-            # check if a native PostgreSQL FTS GIN index exists
-            result = self.session.execute("select relname from pg_class where relname='fts_gin_idx'").scalar()
-            self.fts = bool(result)
-            LOGGER.debug('PostgreSQL FTS enabled: %r', self.fts)
-
-        if temp_dbtype is not None:
-            LOGGER.debug('%s support detected', temp_dbtype)
-            self.dbtype = temp_dbtype
+        capabilities = Repository.probe_capabilities(self.engine, schema_name,
+                                                     table_name)
+        self.dbtype = capabilities['dbtype']
+        self.postgis_geometry_column = capabilities['postgis_geometry_column']
+        self.fts = capabilities['fts']
+        self.spatial_index = self._get_spatial_index(capabilities)
 
         if self.dbtype in ['sqlite', 'sqlite3']:  # load SQLite query bindings
             # <= 0.6 behaviour
@@ -194,6 +318,70 @@ class Repository(object):
 
         self.queryables['_all'].update(self.context.md_core_model['mappings'])
 
+    def _get_spatial_index(self, capabilities):
+        ''' Describe the index available to prefilter spatial queries '''
+
+        if capabilities['rtree'] is not None:
+            return {'type': 'rtree', 'table': capabilities['rtree']}
+
+        columns = self._get_bounds_columns()
+        if columns is not None and \
+                self.dbtype != 'postgresql+postgis+native':  # GiST indexed
+            return {'type': 'bounds', 'columns': columns}
+
+        return None
+
+    def _get_bounds_columns(self):
+        ''' Envelope (minx, miny, maxx, maxy) columns, if the table has them '''
+
+        mappings = self.context.md_core_model['mappings']
+        columns = [mappings.get(name) for name in
+                   ['pycsw:MinX', 'pycsw:MinY', 'pycsw:MaxX', 'pycsw:MaxY']]
+        if all(column and hasattr(self.dataset, column)
+               for column in columns):
+            return columns
+
+        return None
+
+    def _get_bounds_overlap(self, bounds_columns, bounds):
+        ''' Area the envelopes of records share with envelope bounds, or
+        that of bounds for records with a geometry but no envelope '''
+
+        minx, miny, maxx, maxy = [getattr(self.dataset, column)
+                                  for column in bounds_columns]
+        geometry_column = getattr(self.dataset,
+        self.context.md_core_model['mappings']['pycsw:BoundingBox'])
+        qminx, qminy, qmaxx, qmaxy = bounds
+
+        if self.engine.dialect.name == 'sqlite':  # scalar min and max
+            least, greatest = func.min, func.max
+        else:
+            least, greatest = func.least, func.greatest
+        width = least(maxx, qmaxx) - greatest(minx, qminx)
+        height = least(maxy, qmaxy) - greatest(miny, qminy)
+
+        return case([(geometry_column.is_(None), 0.0),
+                     (or_(minx.is_(None), miny.is_(None), maxx.is_(None),
+                          maxy.is_(None)), (qmaxx - qminx) * (qmaxy - qminy)),
+                     (and_(width > 0, height > 0), width * height)],
+                    else_=0.0)
+
+    def _get_bounds_values(self, wkt):
+        ''' Envelope column values of a geometry set by a property update '''
+
+        columns = self._get_bounds_columns()
+        if columns is None:
+            return {}
+
+        try:
+            bounds = util.wkt2geom(wkt)
+        except Exception as err:
+            LOGGER.debug('Cannot derive envelope of %s: %s', wkt, err)
+            bounds = [None] * 4
+
+        return dict((getattr(self.dataset, column), bound)
+                    for column, bound in zip(columns, bounds))
+
     def _create_values(self, values):
         value_dict = {}
         for num, value in enumerate(values):
@@ -246,9 +434,41 @@ class Repository(object):
         query = self.session.query(self.dataset).filter(column == source)
         return self._get_repo_filter(query).all()
 
+    def count(self, constraint):
+        ''' Count records matching constraint in underlying repository '''
+
+        query = self.session.query(func.count()).select_from(self.dataset)
+
+        if 'where' in constraint:  # GetRecords with constraint
+            query = query.filter(text(constraint['where'])).params(
+            self._create_values(constraint['values']))
+
+        return self._get_repo_filter(query).scalar()
+
     def query(self, constraint, sortby=None, typenames=None,
-        maxrecords=10, startposition=0):
-        ''' Query records from underlying repository '''
+        maxrecords=10, startposition=0, stream=False, columns=None,
+        keyset=False, after=None):
+        ''' Query records from underlying repository
+
+        With stream=True, records are returned as an iterable which fetches
+        them from the database cursor in batches, rather than as a list
+
+        With columns, only the named columns are loaded; others are loaded
+        on first access
+
+        With keyset=True, records are ordered by the sortby column, if any,
+        and then by identifier, and a page is located by seeking past the
+        key of the record before startposition instead of skipping rows.
+        That key is either passed as after or remembered from the page
+        which ended at startposition; the offset is used when it is not
+        known, or when the remembered key no longer follows startposition
+        records because the repository changed since.  The key of the last
+        record returned is set as last_key.  Keys which are not a list of
+        one value per ordering column, such as malformed client tokens, are
+        ignored in favour of the offset
+        '''
+
+        self.last_key = None
 
         # run the raw query and get total
         if 'where' in constraint:  # GetRecords with constraint
@@ -259,17 +479,21 @@ class Repository(object):
             LOGGER.debug('No constraint detected')
             query = self.session.query(self.dataset)
 
-        total = self._get_repo_filter(query).count()
+        total = self.count(constraint)
 
-        if util.ranking_pass:  #apply spatial ranking
-            #TODO: Check here for dbtype so to extract wkt from postgis native to wkt
+        ranking = constraint.get('ranking')
+        if ranking is not None:  #apply spatial ranking
             LOGGER.debug('spatial ranking detected')
-            LOGGER.debug('Target WKT: %s', getattr(self.dataset, self.context.md_core_model['mappings']['pycsw:BoundingBox']))
-            LOGGER.debug('Query WKT: %s', util.ranking_query_geometry)
-            query = query.order_by(func.get_spatial_overlay_rank(getattr(self.dataset, self.context.md_core_model['mappings']['pycsw:BoundingBox']), util.ranking_query_geometry).desc())
-            #trying to make this wsgi safe
-            util.ranking_pass = False
-            util.ranking_query_geometry = ''
+            LOGGER.debug('Query WKT: %s', ranking)
+            keyset = False
+
+            if self.dbtype.startswith('postgresql+postgis'):
+                # rank in PostGIS over the stored geometries
+                query = query.order_by(self._get_spatial_rank(ranking).desc())
+                ranking = None
+            elif sortby is not None:
+                query = query.order_by(cast(func.get_spatial_overlay_rank(getattr(self.dataset, self.context.md_core_model['mappings']['pycsw:BoundingBox']), ranking), Float).desc())
+                ranking = None
 
         if sortby is not None:  # apply sorting
             LOGGER.debug('sorting detected')
@@ -287,17 +511,377 @@ class Repository(object):
                 else:  # aspatial sort
                     query = query.order_by(sortby_column)
 
+            if 'spatial' in sortby and sortby['spatial']:
+                keyset = False
+
+        if keyset:  # apply keyset pagination
+            key_columns = self._get_keyset_columns(sortby)
+            query = query.order_by(getattr(self.dataset, key_columns[-1]))
+
+            position = self._get_keyset_position(constraint, sortby,
+                                                 startposition)
+            if after is not None and not self._is_keyset_valid(sortby, after):
+                LOGGER.debug('Ignoring invalid key %r', after)
+                after = None
+            if after is None:
+                after, stamp = self._keysets.get(position, (None, None))
+                if (after is not None and not self._is_keyset_current(
+                        constraint, sortby, after, total, stamp)):
+                    LOGGER.debug('Key of position %d is stale', startposition)
+                    after = None
+            if after is not None:
+                LOGGER.debug('Seeking past %s', after)
+                query = query.filter(self._get_keyset_filter(sortby, after))
+                startposition = 0
+
+        if ranking is not None:  # rank only the top records
+            return [str(total), self._query_ranked(self._get_repo_filter(query),
+            ranking, maxrecords, startposition, columns)]
+
         # always apply limit and offset
-        return [str(total), self._get_repo_filter(query).limit(
-        maxrecords).offset(startposition).all()]
+        query = self._get_repo_filter(query).limit(
+        maxrecords).offset(startposition)
+
+        if columns is not None:  # apply column projection
+            query = query.options(load_only(
+            *[getattr(self.dataset, column) for column in columns]))
+
+        if keyset:
+            results = self._remember_keyset(
+            query.yield_per(STREAM_BATCH_SIZE) if stream else query.all(),
+            key_columns, position, total)
+            if stream:
+                return [str(total), results]
+            return [str(total), list(results)]
+
+        if stream:
+            return [str(total), query.yield_per(STREAM_BATCH_SIZE)]
+        return [str(total), query.all()]
+
+    def _get_spatial_rank(self, geometry):
+        ''' Spatial overlay rank of get_spatial_overlay_rank as a PostGIS
+        expression, computed only for geometries whose bounding box overlaps
+        the query geometry '''
+
+        if self.dbtype == 'postgresql+postgis+native':
+            target = literal_column(self.postgis_geometry_column)
+            query_geometry = func.ST_GeomFromText(geometry, 4326)
+        else:
+            target = func.ST_GeomFromText(getattr(self.dataset,
+            self.context.md_core_model['mappings']['pycsw:BoundingBox']))
+            query_geometry = func.ST_GeomFromText(geometry)
+
+        query_area = QUERY_GEOMETRIES.get(geometry).context.area
+        if query_area == 0.0:
+            LOGGER.warning('Geometry has no area')
+            return literal_column('0')
+
+        target_area = func.ST_Area(target)
+        overlap = func.ST_Area(func.ST_Intersection(target, query_geometry))
+
+        return case([(and_(target.op('&&')(query_geometry), target_area > 0),
+                      overlap * overlap / (target_area * query_area))],
+                    else_=0)
+
+    def _query_ranked(self, query, geometry, maxrecords, startposition,
+                      columns=None):
+        ''' Records of query at startposition by spatial overlay rank, then
+        identifier
+
+        Only the top startposition + maxrecords ranks are kept rather than
+        sorting every record.  With envelope columns, the database orders
+        records by the area their envelope shares with the query geometry's,
+        which bounds their rank, and records are ranked a batch at a time
+        until no further record can reach the top ranks.  Without them,
+        every record is ranked
+        '''
+
+        identifier_column = self.context.md_core_model['mappings']['pycsw:Identifier']
+        identifier = getattr(self.dataset, identifier_column)
+        geometry_column = getattr(self.dataset,
+        self.context.md_core_model['mappings']['pycsw:BoundingBox'])
+        bounds_columns = self._get_bounds_columns()
+        size = startposition + maxrecords
+        query = query.order_by(None)
+
+        try:
+            query_geometry = QUERY_GEOMETRIES.get(geometry).context
+            query_area = query_geometry.area
+        except Exception as err:
+            LOGGER.warning('Cannot derive spatial overlay ranking %s', err)
+            query_area = 0.0
+
+        if query_area == 0:  # no record has a rank
+            top = [(0, _Descending(value)) for value, in
+                   query.with_entities(identifier).order_by(identifier)
+                   .limit(size)]
+        elif bounds_columns is None:
+            ranks = ((_get_spatial_overlay_rank(wkt, geometry),
+                      _Descending(value))
+                     for value, wkt in query.with_entities(identifier,
+                                                           geometry_column))
+            top = heapq.nlargest(size, ranks)
+        else:
+            overlap = self._get_bounds_overlap(bounds_columns,
+                                               query_geometry.bounds)
+            rows = query.with_entities(identifier, overlap,
+                                       geometry_column).order_by(
+                                           overlap.desc(), identifier)
+            top = []
+            for start in itertools.count(0, RANKING_BATCH_SIZE):
+                batch = rows.limit(RANKING_BATCH_SIZE).offset(start).all()
+                for value, area, wkt in batch:
+                    bound = float(area) / query_area
+                    if len(top) == size:
+                        # allow for rounding between envelope and geometry
+                        # areas; records without overlap follow by identifier
+                        if (bound * (1 + 1e-9) < top[0][0] or
+                                bound == 0 and top[0][0] == 0 and
+                                top[0][1] > _Descending(value)):
+                            break
+                    rank = (0, _Descending(value))
+                    if bound > 0:
+                        rank = (_get_spatial_overlay_rank(wkt, geometry),
+                                rank[1])
+                    if len(top) < size:
+                        heapq.heappush(top, rank)
+                    elif rank > top[0]:
+                        heapq.heapreplace(top, rank)
+                else:
+                    if len(batch) == RANKING_BATCH_SIZE:
+                        continue
+                break
+        top.sort(reverse=True)
+
+        identifiers = [rank[1].value for rank in top[startposition:]]
+
+        if not identifiers:
+            return []
+
+        query = query.filter(identifier.in_(identifiers))
+        if columns is not None:  # apply column projection
+            query = query.options(load_only(
+            *[getattr(self.dataset, column) for column in columns]))
+
+        records = dict((getattr(record, identifier_column), record)
+                       for record in query)
+        return [records[value] for value in identifiers]
+
+    def _get_keyset_columns(self, sortby):
+        ''' Columns ordering keyset pages: sortby column and identifier '''
+
+        identifier = self.context.md_core_model['mappings']['pycsw:Identifier']
+        if sortby is None:
+            return [identifier]
+        return [sortby['propertyname'], identifier]
+
+    def _get_keyset_position(self, constraint, sortby, startposition):
+        ''' Key of a page start in the keyset cache '''
+
+        return (str(self.engine.url), self.dataset.__table__.fullname,
+                self.filter, constraint.get('where'),
+                tuple(constraint.get('values', [])),
+                None if sortby is None else sortby['propertyname'],
+                None if sortby is None else sortby['order'], startposition)
+
+    def _get_keyset_filter(self, sortby, after):
+        ''' Filter selecting records ordered after a key '''
+
+        identifier = getattr(self.dataset, self.context.md_core_model['mappings']['pycsw:Identifier'])
+        identifier_after = identifier > after[-1]
+        if sortby is None:
+            return identifier_after
+
+        column = getattr(self.dataset, sortby['propertyname'])
+        value = after[0]
+        descending = sortby['order'] == 'DESC'
+        # PostgreSQL sorts NULLs as larger than any value, others as smaller
+        nulls_last = self.dbtype.startswith('postgresql') != descending
+
+        if value is None:
+            if nulls_last:
+                return and_(column.is_(None), identifier_after)
+            return or_(column.isnot(None), and_(column.is_(None), identifier_after))
+
+        # the leading bound lets the database use an index on column
+        if descending:
+            seek = and_(column <= value, or_(column < value, identifier_after))
+        else:
+            seek = and_(column >= value, or_(column > value, identifier_after))
+        if nulls_last:
+            return or_(seek, column.is_(None))
+        return seek
+
+    def _is_keyset_valid(self, sortby, after):
+        ''' Whether a key has one scalar value per keyset column, and a
+        string identifier '''
+
+        if (not isinstance(after, list) or
+                len(after) != len(self._get_keyset_columns(sortby))):
+            return False
+        for value in after:
+            if value is not None and (
+                    isinstance(value, bool) or not isinstance(
+                    value, six.string_types + six.integer_types + (float,))):
+                return False
+        return isinstance(after[-1], six.string_types)
+
+    def _is_keyset_current(self, constraint, sortby, after, total, stamp):
+        ''' Whether a remembered key is still in place: writes from other
+        processes or tools move record positions.  The number of matching
+        records must be that of when the key was remembered, and the record
+        of the key must still match with the same sort value, a lookup by
+        identifier rather than a count of the records after the key '''
+
+        if total != stamp:
+            return False
+
+        mappings = self.context.md_core_model['mappings']
+        identifier = getattr(self.dataset, mappings['pycsw:Identifier'])
+        query = self.session.query(identifier).filter(identifier == after[-1])
+
+        if sortby is not None:
+            column = getattr(self.dataset, sortby['propertyname'])
+            if after[0] is None:
+                query = query.filter(column.is_(None))
+            else:
+                query = query.filter(column == after[0])
+
+        if 'where' in constraint:
+            query = query.filter(text(constraint['where'])).params(
+            self._create_values(constraint['values']))
+
+        return self._get_repo_filter(query).first() is not None
+
+    def _remember_keyset(self, results, key_columns, position, total):
+        ''' Record the key of the last result for the following page '''
+
+        count = 0
+        for count, result in enumerate(results, 1):
+            yield result
+
+        if count > 0:
+            self.last_key = [getattr(result, column) for column in key_columns]
+            if len(self._keysets) >= KEYSET_CACHE_SIZE:
+                self._keysets.clear()
+            self._keysets[position[:-1] + (position[-1] + count,)] = \
+            (self.last_key, total)
+
+    def _get_rendered_columns(self):
+        ''' Columns of pre-rendered csw:Record elementsets the table has,
+        keyed by elementset '''
+
+        from pycsw.ogc.csw.csw2 import RENDERED_ELEMENTSETS
+
+        mappings = self.context.md_core_model['mappings']
+        columns = {}
+        for elementset, (elname, name) in RENDERED_ELEMENTSETS.items():
+            column = mappings.get(name)
+            if column and hasattr(self.dataset, column):
+                columns[elementset] = column
+        return columns
+
+    def _render_record(self, record):
+        ''' Pre-render the brief and summary csw:Record of a record '''
+
+        from pycsw.ogc.csw.csw2 import render_record
+
+        for elementset, column in self._get_rendered_columns().items():
+            try:
+                value = render_record(record, self.queryables['_all'],
+                                      elementset, self.context)
+            except Exception as err:  # presented from its columns
+                LOGGER.debug('Cannot render %s record: %s', elementset, err)
+                value = None
+            setattr(record, column, value)
+
+    def _render_identifiers(self, identifiers):
+        ''' Pre-render the records of identifiers, within a transaction '''
+
+        column = getattr(self.dataset,
+        self.context.md_core_model['mappings']['pycsw:Identifier'])
+
+        for start in range(0, len(identifiers), RENDER_BATCH_SIZE):
+            batch = identifiers[start:start + RENDER_BATCH_SIZE]
+            for record in self.session.query(self.dataset).filter(
+                    column.in_(batch)):
+                self._render_record(record)
+
+    def render_records(self):
+        ''' Pre-render the brief and summary csw:Record of all records,
+        returning the number of records rendered '''
+
+        if not self._get_rendered_columns():
+            return 0
+
+        column = getattr(self.dataset,
+        self.context.md_core_model['mappings']['pycsw:Identifier'])
+        identifiers = [row[0] for row in
+                       self._get_repo_filter(self.session.query(column))]
+
+        for start in range(0, len(identifiers), RENDER_BATCH_SIZE):
+            try:
+                self.session.begin()
+                self._render_identifiers(
+                    identifiers[start:start + RENDER_BATCH_SIZE])
+                self.session.commit()
+            except Exception as err:
+                self.session.rollback()
+                msg = 'Cannot commit to repository'
+                LOGGER.exception(msg)
+                raise RuntimeError(msg)
+
+        return len(identifiers)
+
+    def update_bounds(self):
+        ''' Set the envelope columns of records with a geometry but no
+        envelope, such as records written by earlier versions or other
+        tools, returning the number of records updated '''
+
+        columns = self._get_bounds_columns()
+        if columns is None:
+            return 0
+
+        mappings = self.context.md_core_model['mappings']
+        identifier = getattr(self.dataset, mappings['pycsw:Identifier'])
+        geometry = getattr(self.dataset, mappings['pycsw:BoundingBox'])
+        identifiers = [row[0] for row in self._get_repo_filter(
+                       self.session.query(identifier).filter(
+                       geometry.isnot(None),
+                       getattr(self.dataset, columns[0]).is_(None)))]
+
+        count = 0
+        for start in range(0, len(identifiers), BOUNDS_BATCH_SIZE):
+            try:
+                self.session.begin()
+                for value, wkt in self.session.query(identifier, geometry).filter(
+                        identifier.in_(identifiers[start:start + BOUNDS_BATCH_SIZE])):
+                    bounds = self._get_bounds_values(wkt)
+                    if None in bounds.values():
+                        continue
+                    self.session.query(self.dataset).filter(
+                        identifier == value).update(
+                        bounds, synchronize_session=False)
+                    count += 1
+                self.session.commit()
+            except Exception as err:
+                self.session.rollback()
+                msg = 'Cannot commit to repository'
+                LOGGER.exception(msg)
+                raise RuntimeError(msg)
+
+        return count
 
     def insert(self, record, source, insert_date):
         ''' Insert a record into the repository '''
 
+        self._render_record(record)
+
         try:
             self.session.begin()
             self.session.add(record)
             self.session.commit()
+            self._keysets.clear()  # record positions have moved
         except Exception as err:
             self.session.rollback()
             msg = 'Cannot commit to repository'
@@ -317,6 +901,7 @@ class Repository(object):
 
         if recprops is None and constraint is None:  # full update
             LOGGER.debug('full update')
+            self._render_record(record)
             update_dict = dict([(getattr(self.dataset, key),
             getattr(record, key)) \
             for key in record.__dict__.keys() if key != '_sa_instance_state'])
@@ -326,6 +911,7 @@ class Repository(object):
                 self._get_repo_filter(self.session.query(self.dataset)).filter_by(
                 identifier=identifier).update(update_dict, synchronize_session='fetch')
                 self.session.commit()
+                self._keysets.clear()
             except Exception as err:
                 self.session.rollback()
                 msg = 'Cannot commit to repository'
@@ -336,6 +922,13 @@ class Repository(object):
             try:
                 rows = rows2 = 0
                 self.session.begin()
+                # records to render again, matched before they change
+                rendered = []
+                if self._get_rendered_columns():
+                    rendered = [row[0] for row in self._get_repo_filter(
+                        self.session.query(getattr(self.dataset,
+                        self.context.md_core_model['mappings']['pycsw:Identifier']))).filter(
+                        text(constraint['where'])).params(self._create_values(constraint['values']))]
                 for rpu in recprops:
                     # update queryable column and XML document via XPath
                     if 'xpath' not in rpu['rp']:
@@ -344,22 +937,29 @@ class Repository(object):
                     if 'dbcol' not in rpu['rp']:
                         self.session.rollback()
                         raise RuntimeError('property not found for XPath %s' % rpu['rp']['name'])
+                    values = {
+                        getattr(self.dataset,
+                        rpu['rp']['dbcol']): rpu['value'],
+                        'xml': func.update_xpath(str(self.context.namespaces),
+                               getattr(self.dataset,
+                               self.context.md_core_model['mappings']['pycsw:XML']),
+                               str(rpu)),
+                    }
+                    if rpu['rp']['dbcol'] == \
+                        self.context.md_core_model['mappings']['pycsw:BoundingBox']:
+                        values.update(self._get_bounds_values(rpu['value']))
                     rows += self._get_repo_filter(self.session.query(self.dataset)).filter(
-                        text(constraint['where'])).params(self._create_values(constraint['values'])).update({
-                            getattr(self.dataset,
-                            rpu['rp']['dbcol']): rpu['value'],
-                            'xml': func.update_xpath(str(self.context.namespaces),
-                                   getattr(self.dataset,
-                                   self.context.md_core_model['mappings']['pycsw:XML']),
-                                   str(rpu)),
-                        }, synchronize_session='fetch')
+                        text(constraint['where'])).params(self._create_values(constraint['values'])).update(
+                            values, synchronize_session='fetch')
                     # then update anytext tokens
                     rows2 += self._get_repo_filter(self.session.query(self.dataset)).filter(
                         text(constraint['where'])).params(self._create_values(constraint['values'])).update({
                             'anytext': func.get_anytext(getattr(
                             self.dataset, self.context.md_core_model['mappings']['pycsw:XML']))
                         }, synchronize_session='fetch')
+                self._render_identifiers(rendered)
                 self.session.commit()
+                self._keysets.clear()
                 return rows
             except Exception as err:
                 self.session.rollback()
@@ -391,6 +991,7 @@ class Repository(object):
                     synchronize_session='fetch')
 
             self.session.commit()
+            self._keysets.clear()
         except Exception as err:
             self.session.rollback()
             msg = 'Cannot commit to repository'
@@ -406,6 +1007,87 @@ class Repository(object):
         return query
 
 
+def _split_table(table):
+    """split a (optionally schema qualified) table name into its parts"""
+
+    schema_name, table_name = table.rpartition(".")[::2]
+    return schema_name or None, table_name
+
+
+def _probe_capabilities(engine, table_name):
+    """detect database support for PostGIS and FTS"""
+
+    capabilities = {
+        'dbtype': engine.name,
+        'postgis_geometry_column': None,
+        'fts': False,
+        'rtree': None
+    }
+
+    if engine.name in ['sqlite', 'sqlite3']:
+        # check if an R*Tree of record envelopes exists
+        rtree = '%s_rtree' % table_name
+        result = engine.execute(
+            "select name from sqlite_master "
+            "where type = 'table' and name = ?", rtree).scalar()
+        if result is not None:
+            capabilities['rtree'] = rtree
+        LOGGER.debug('SQLite R*Tree spatial index: %r', capabilities['rtree'])
+
+        # check if an FTS5 table of anytext exists
+        fts = '%s_fts' % table_name
+        result = engine.execute(
+            "select name from sqlite_master "
+            "where type = 'table' and name = ?", fts).scalar()
+        if result is not None:
+            capabilities['fts'] = fts
+        LOGGER.debug('SQLite FTS5 table: %r', capabilities['fts'])
+        return capabilities
+
+    if engine.name != 'postgresql':
+        return capabilities
+
+    LOGGER.info('probing PostgreSQL capabilities: %s', engine.url)
+    session = create_session(engine)
+
+    # check if PostgreSQL is enabled with PostGIS
+    try:
+        session.execute(select([func.postgis_version()]))
+        capabilities['dbtype'] = 'postgresql+postgis+wkt'
+        LOGGER.debug('PostgreSQL+PostGIS+WKT detected')
+    except Exception as err:
+        LOGGER.debug('PostgreSQL+PostGIS+WKT detection failed: %s', err)
+
+    # check if a native PostGIS geometry column exists
+    try:
+        result = session.execute(
+            "select f_geometry_column "
+            "from geometry_columns "
+            "where f_table_name = '%s' "
+            "and f_geometry_column != 'wkt_geometry' "
+            "limit 1;" % table_name
+        )
+        row = result.fetchone()
+        if row is not None:
+            capabilities['postgis_geometry_column'] = \
+                str(row['f_geometry_column'])
+            capabilities['dbtype'] = 'postgresql+postgis+native'
+            LOGGER.debug('PostgreSQL+PostGIS+Native detected')
+    except Exception as err:
+        LOGGER.debug('PostgreSQL+PostGIS+Native not picked up: %s', err)
+
+    # check if a native PostgreSQL FTS GIN index exists
+    result = session.execute(
+        "select relname from pg_class where relname='fts_gin_idx'").scalar()
+    capabilities['fts'] = bool(result)
+    LOGGER.debug('PostgreSQL FTS enabled: %r', capabilities['fts'])
+
+    session.close()
+
+    LOGGER.debug('%s support detected', capabilities['dbtype'])
+    return capabilities
+
+
 def create_custom_sql_functions(connection):
     """Register custom functions on the database connection."""
     if six.PY2:
@@ -457,30 +1139,31 @@ def query_spatial(bbox_data_wkt, bbox_input_wkt, predicate, distance):
     """
 
     try:
-        bbox1 = loads(bbox_data_wkt.split(';')[-1])
-        bbox2 = loads(bbox_input_wkt)
+        bbox1 = RECORD_GEOMETRIES.get(bbox_data_wkt)
+        bbox2 = QUERY_GEOMETRIES.get(bbox_input_wkt)
+        # bbox2 is prepared: test the converse predicate where needed
         if predicate == 'bbox':
-            result = bbox1.intersects(bbox2)
+            result = bbox2.intersects(bbox1)
         elif predicate == 'beyond':
-            result = bbox1.distance(bbox2) > float(distance)
+            result = bbox1.distance(bbox2.context) > float(distance)
         elif predicate == 'contains':
-            result = bbox1.contains(bbox2)
+            result = bbox2.within(bbox1)
         elif predicate == 'crosses':
-            result = bbox1.crosses(bbox2)
+            result = bbox2.crosses(bbox1)
         elif predicate == 'disjoint':
-            result = bbox1.disjoint(bbox2)
+            result = bbox2.disjoint(bbox1)
         elif predicate == 'dwithin':
-            result = bbox1.distance(bbox2) <= float(distance)
+            result = bbox1.distance(bbox2.context) <= float(distance)
         elif predicate == 'equals':
-            result = bbox1.equals(bbox2)
+            result = bbox1.equals(bbox2.context)
         elif predicate == 'intersects':
-            result = bbox1.intersects(bbox2)
+            result = bbox2.intersects(bbox1)
         elif predicate == 'overlaps':
-            result = bbox1.intersects(bbox2) and not bbox1.touches(bbox2)
+            result = bbox2.intersects(bbox1) and not bbox2.touches(bbox1)
         elif predicate == 'touches':
-            result = bbox1.touches(bbox2)
+            result = bbox2.touches(bbox1)
         elif predicate == 'within':
-            result = bbox1.within(bbox2)
+            result = bbox2.contains(bbox1)
         else:
             raise RuntimeError(
                 'Invalid spatial query predicate: %s' % predicate)
@@ -525,27 +1208,36 @@ def get_spatial_overlay_rank(target_geometry, query_geometry):
     """Derive spatial overlay rank for geospatial search as per Lanfear (2006)
     http://pubs.usgs.gov/of/2006/1279/2006-1279.pdf"""
 
+    return str(_get_spatial_overlay_rank(target_geometry, query_geometry))
+
+
+def _get_spatial_overlay_rank(target_geometry, query_geometry):
+    """Spatial overlay rank of get_spatial_overlay_rank as a number"""
+
     #TODO: Add those parameters to config file
     kt = 1.0
     kq = 1.0
     if target_geometry is not None and query_geometry is not None:
         try:
-            q_geom = loads(query_geometry)
-            t_geom = loads(target_geometry)
+            q_prepared = QUERY_GEOMETRIES.get(query_geometry)
+            q_geom = q_prepared.context
+            t_geom = RECORD_GEOMETRIES.get(target_geometry)
             Q = q_geom.area
             T = t_geom.area
             if any(item == 0.0 for item in [Q, T]):
                 LOGGER.warning('Geometry has no area')
-                return '0'
+                return 0
+            if not q_prepared.intersects(t_geom):
+                return 0
             X = t_geom.intersection(q_geom).area
             if kt == 1.0 and kq == 1.0:
                 LOGGER.debug('Spatial Rank: %s', str((X/Q)*(X/T)))
-                return str((X/Q)*(X/T))
+                return (X/Q)*(X/T)
             else:
                 LOGGER.debug('Spatial Rank: %s', str(((X/Q)**kq)*((X/T)**kt)))
-                return str(((X/Q)**kq)*((X/T)**kt))
+                return ((X/Q)**kq)*((X/T)**kt)
         except Exception as err:
             LOGGER.warning('Cannot derive spatial overlay ranking %s', err)
-            return '0'
-    return '0'
+            return 0
+    return 0
 
@@ -32,8 +32,11 @@
 #
 # =================================================================
 
+from collections import namedtuple, OrderedDict
 import datetime
 import logging
+import re
+import threading
 import time
 
 import six
@@ -46,10 +49,266 @@ from pycsw.core.etree import etree, PARSER
 
 LOGGER = logging.getLogger(__name__)
 
-# Global variables for spatial ranking algorithm
-ranking_enabled = False
-ranking_pass = False
-ranking_query_geometry = ''
+# compiled XML Schema validators, keyed by schema path
+XML_SCHEMAS = {}
+
+# XML declaration of a stored XML document, and its encoding
+XML_DECLARATION = re.compile(br'\s*(<\?xml\s[^>]*\?>)?\s*')
+XML_ENCODING = re.compile(br'encoding\s*=\s*["\']([^"\']*)["\']')
+
+# encodings whose documents can be written as is into a UTF-8 response
+UTF8_ENCODINGS = ['utf-8', 'utf8', 'us-ascii', 'ascii']
+
+# maximum number of expressions held by a QNames table
+QNAMES_CACHE_SIZE = 4096
+
+# maximum number of namespace maps whose QNames tables are kept
+QNAMES_TABLES_SIZE = 64
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class LRUCache(object):
+    """Thread safe least recently used cache which counts its hits and
+    misses, as reported by cache_info() like functools.lru_cache"""
+
+    def __init__(self, size):
+        """Initialize cache; a size of 0 disables caching"""
+
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value cached for key, or None"""
+
+        with self._lock:
+            value = self._items.pop(key, None)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items[key] = value  # most recently used goes last
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Cache value for key, discarding the least recently used values"""
+
+        if self.size <= 0:
+            return
+
+        with self._lock:
+            self._items[key] = value
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        """Discard all cached values and reset the hit and miss counts"""
+
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def cache_info(self):
+        """Return the hits, misses, maximum and current size of the cache"""
+
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.size,
+                             len(self._items))
+
+
+class QNames(dict):
+    """Table of XPath expressions in Clark notation (``{uri}local``),
+    keyed by their prefixed form and computed once per expression from a
+    namespace map (see nspath_eval)"""
+
+    def __init__(self, nsmap):
+        """Initialize table for nsmap"""
+
+        dict.__init__(self)
+        self.nsmap = nsmap
+
+    def __missing__(self, xpath):
+        value = _nspath_eval(xpath, self.nsmap)
+        if len(self) < QNAMES_CACHE_SIZE:
+            self[xpath] = value
+        return value
+
+
+# QNames tables of the namespace maps in use, keyed by their bindings
+QNAMES_TABLES = LRUCache(QNAMES_TABLES_SIZE)
+
+
+def _get_qnames_table(nsmap):
+    """Get the QNames table shared by the namespace maps binding the
+    same prefixes to the same URIs as nsmap"""
+
+    key = frozenset(nsmap.items())
+    qnames = QNAMES_TABLES.get(key)
+    if qnames is None:
+        qnames = QNames(dict(nsmap))
+        QNAMES_TABLES.set(key, qnames)
+    return qnames
+
+
+class Namespaces(dict):
+    """Namespace map, keyed by prefix, with its QNames table
+
+    nspath_eval looks expressions up in the table of the namespace maps
+    it is given; hot serializers and filter parsers can use the table
+    directly.  Maps with the same bindings share a table, which outlives
+    the per-request maps; binding a prefix to another URI switches to the
+    table of the new bindings.
+    """
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.qnames = _get_qnames_table(self)
+
+    def _rebind(self):
+        self.qnames = _get_qnames_table(self)
+
+    def __setitem__(self, prefix, uri):
+        if prefix not in self or dict.__getitem__(self, prefix) != uri:
+            dict.__setitem__(self, prefix, uri)
+            self._rebind()
+
+    def __delitem__(self, prefix):
+        dict.__delitem__(self, prefix)
+        self._rebind()
+
+    def update(self, *args, **kwargs):
+        bindings = dict(*args, **kwargs)
+        for prefix, uri in bindings.items():
+            if prefix not in self or dict.__getitem__(self, prefix) != uri:
+                dict.update(self, bindings)
+                self._rebind()
+                break
+
+    def setdefault(self, prefix, uri=None):
+        if prefix not in self:
+            self[prefix] = uri
+        return dict.__getitem__(self, prefix)
+
+    def pop(self, *args):
+        if args[0] not in self:
+            return dict.pop(self, *args)
+        uri = dict.pop(self, *args)
+        self._rebind()
+        return uri
+
+    def popitem(self):
+        item = dict.popitem(self)
+        self._rebind()
+        return item
+
+    def clear(self):
+        dict.clear(self)
+        self._rebind()
+
+    def copy(self):
+        namespaces = Namespaces.__new__(Namespaces)
+        dict.update(namespaces, self)
+        namespaces.qnames = self.qnames
+        return namespaces
+
+    __copy__ = copy
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+
+class Constraint(dict):
+    """Query constraint whose '_dict' item, the OGC Filter of the
+    constraint as a dictionary, is only built when it is looked up"""
+
+    def __init__(self, *args, **kwargs):
+        """Initialize constraint"""
+
+        dict.__init__(self, *args, **kwargs)
+        self._filter = None
+
+    def set_filter(self, filter_, namespaces):
+        """Set the source of '_dict': the OGC Filter element of the
+        constraint, or a function returning it"""
+
+        self._filter = (filter_, namespaces)
+        self.pop('_dict', None)
+
+    def __missing__(self, key):
+        if key != '_dict' or self._filter is None:
+            raise KeyError(key)
+        from pycsw.core.formats.fmt_json import etree2dict
+        filter_, namespaces = self._filter
+        if callable(filter_):
+            filter_ = filter_()
+        self[key] = etree2dict(filter_, namespaces)
+        return self[key]
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or \
+            (key == '_dict' and self._filter is not None)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+def get_xml_schema(path):
+    """Get a compiled XML Schema, compiling it once per process"""
+
+    schema = XML_SCHEMAS.get(path)
+    if schema is None:
+        LOGGER.debug('Compiling XML Schema %s', path)
+        schema = etree.XMLSchema(file=path)
+        XML_SCHEMAS[path] = schema
+    return schema
+
+
+def check_xml_structure(doc, namespace, localnames):
+    """Check the root element of a parsed XML document
+
+    A fast structural subset of XML Schema validation, used when the
+    server is configured with ``xml_validation=structural``
+    """
+
+    qname = etree.QName(doc)
+    if qname.namespace != namespace or qname.localname not in localnames:
+        raise RuntimeError('Unexpected element %s' % doc.tag)
+
+
+def get_document_root(xml):
+    """Get the root element of a stored XML document as UTF-8 bytes
+
+    Returns None when the document cannot be written as is into a UTF-8
+    response: other encodings, or a DOCTYPE, comment or processing
+    instruction before the root element.
+    """
+
+    if isinstance(xml, six.text_type):
+        xml = xml.encode('utf-8')
+        declared = False  # the declared encoding no longer applies
+    else:
+        declared = True
+        if xml.startswith(b'\xef\xbb\xbf'):  # UTF-8 byte order mark
+            xml = xml[3:]
+
+    prolog = XML_DECLARATION.match(xml)
+    if declared and prolog.group(1) is not None:
+        encoding = XML_ENCODING.search(prolog.group(1))
+        if (encoding is not None and encoding.group(1).decode(
+                'ascii', 'replace').lower() not in UTF8_ENCODINGS):
+            return None
+
+    root = xml[prolog.end():].rstrip()
+    if root[:1] != b'<' or root[1:2] in (b'!', b'?'):
+        return None
+    return root
 
 
 def get_today_and_now():
@@ -144,6 +403,25 @@ def nspath_eval(xpath, nsmap):
 
     """
 
+    qnames = getattr(nsmap, 'qnames', None)
+    if qnames is not None:  # memoized by Namespaces
+        return qnames[xpath]
+    return _nspath_eval(xpath, nsmap)
+
+
+def get_qnames(nsmap):
+    """Get the QNames table of a namespace map, a new one if nsmap is
+    not a Namespaces"""
+
+    qnames = getattr(nsmap, 'qnames', None)
+    if qnames is None:
+        qnames = QNames(nsmap)
+    return qnames
+
+
+def _nspath_eval(xpath, nsmap):
+    """Convert an XPath expression as per nspath_eval, uncached"""
+
     out = []
     for node in xpath.split('/'):
         chunks = node.split(":")
@@ -246,6 +524,8 @@ def getqattr(obj, name):
     result = None
     try:
         item = getattr(obj, name)
+        if item is None or isinstance(item, six.string_types):
+            return item  # plain repository column
         value = item()
         if "link" in name:  # create link format
             links = []
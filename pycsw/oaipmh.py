@@ -28,6 +28,8 @@
 #
 # =================================================================
 
+import base64
+import json
 import logging
 from pycsw.core import util
 from pycsw.core.etree import etree
@@ -41,11 +43,11 @@ class OAIPMH(object):
         LOGGER.debug('Initializing OAI-PMH constants')
         self.oaipmh_version = '2.0'
 
-        self.namespaces = {
+        self.namespaces = util.Namespaces({
             'oai': 'http://www.openarchives.org/OAI/2.0/',
             'oai_dc': 'http://www.openarchives.org/OAI/2.0/oai_dc/',
             'xsi': 'http://www.w3.org/2001/XMLSchema-instance'
-        }
+        })
         self.request_model = {
             'Identify': [],
             'ListSets': ['resumptiontoken'],
@@ -109,6 +111,8 @@ class OAIPMH(object):
             'noRecordsMatch': None,
         }
 
+        self.header_xpaths = {}
+
         self.context = context
         self.context.namespaces.update(self.namespaces)
         self.context.namespaces.update({'gco': 'http://www.isotc211.org/2005/gco'})
@@ -144,10 +148,17 @@ class OAIPMH(object):
                     del kvpout['outputschema']
             elif kvp['verb'] in ['ListRecords', 'ListIdentifiers']:
                 if 'resumptiontoken' in kvp:
-                    kvpout['startposition'] = kvp['resumptiontoken']
-                if ('outputschema' in kvpout and
-                   kvp['verb'] == 'ListIdentifiers'):  # simple output only
-                    pass #del kvpout['outputschema']
+                    kvpout['startposition'], key = \
+                        self._parse_resumption_token(kvp['resumptiontoken'])
+                    if key is not None:
+                        kvpout['resumptionkey'] = key
+                if (kvp['verb'] == 'ListIdentifiers' and
+                    kvp.get('metadataprefix') in self.metadata_formats):
+                    # simple output only: headers need just the identifier
+                    # and datestamp columns, whatever the metadataPrefix
+                    kvpout.pop('outputschema', None)
+                    del kvpout['elementsetname']
+                    kvpout['elementname'] = 'dc:identifier,dct:modified'
                 if ('outputschema' in kvpout and
                     kvp['metadataprefix'] in ['dc', 'oai_dc']):  # just use default DC
                     del kvpout['outputschema']
@@ -242,12 +253,16 @@ class OAIPMH(object):
                     records = response.getchildren()
                 else:  # GetRecords
                     records = response.getchildren()[1].getchildren()
+                if verb == 'ListIdentifiers':  # csw:Record ElementName
+                    metadata_prefix = 'csw-record'
+                else:
+                    metadata_prefix = self.metadata_prefix
                 for child in records:
                     recnode = etree.SubElement(verbnode, util.nspath_eval('oai:record', self.namespaces))
                     header = etree.SubElement(recnode, util.nspath_eval('oai:header', self.namespaces))
-                    self._transform_element(header, response, 'oai:identifier')
-                    self._transform_element(header, response, 'oai:dateStamp')
-                    self._transform_element(header, response, 'oai:setSpec')
+                    for elname in ['oai:identifier', 'oai:dateStamp', 'oai:setSpec']:
+                        self._transform_element(header, child, elname,
+                                                metadata_prefix)
                     if verb in ['GetRecord', 'ListRecords']:
                         metadata = etree.SubElement(recnode, util.nspath_eval('oai:metadata', self.namespaces))
                         if 'metadataprefix' in kvp and kvp['metadataprefix'] == 'oai_dc':
@@ -258,10 +273,32 @@ class OAIPMH(object):
                     next_record = response.xpath('//@nextRecord')[0]
                     cursor = str(int(complete_list_size) - int(next_record) - 1)
 
+                    key = getattr(repository, 'last_key', None)
+                    if next_record != '0' and key is not None:
+                        token = self._get_resumption_token(next_record, key)
+                    else:
+                        token = next_record
+
                     resumption_token = etree.SubElement(verbnode, util.nspath_eval('oai:resumptionToken', self.namespaces),
-                                                        completeListSize=complete_list_size, cursor=cursor).text = next_record
+                                                        completeListSize=complete_list_size, cursor=cursor).text = token
         return node
 
+    def _get_resumption_token(self, next_record, key):
+        """Encode the next record position and keyset as an opaque token"""
+        token = json.dumps([int(next_record), key], separators=(',', ':'))
+        return base64.urlsafe_b64encode(token.encode('utf-8')).decode('ascii')
+
+    def _parse_resumption_token(self, token):
+        """Decode a resumption token into the next record position and keyset
+
+        Bare positions, as issued by earlier versions, have no keyset"""
+        try:
+            position, key = json.loads(
+                base64.urlsafe_b64decode(str(token)).decode('utf-8'))
+            return str(int(position)), key
+        except (TypeError, ValueError):
+            return token, None
+
     def _get_metadata_prefix(self, prefix):
         """Convenience function to return metadataPrefix as CSW outputschema"""
         try:
@@ -270,12 +307,26 @@ class OAIPMH(object):
             outputschema = prefix
         return outputschema
 
-    def _transform_element(self, parent, element, elname):
-        """tests for existence of a given xpath, writes out text if exists"""
+    def _get_header_xpath(self, metadata_prefix, elname):
+        """XPath of a header element, scoped to the record element"""
+
+        key = (metadata_prefix, elname)
+        if key not in self.header_xpaths:
+            xpath = self.metadata_formats[metadata_prefix][elname.split(':')[1]]
+            if xpath.startswith('//'):
+                xpath = etree.XPath('|'.join('.%s' % path for path in
+                                             xpath.split('|')),
+                                    namespaces=self.context.namespaces)
+            self.header_xpaths[key] = xpath
+        return self.header_xpaths[key]
+
+    def _transform_element(self, parent, element, elname, metadata_prefix):
+        """tests for existence of a given xpath within record element,
+        writes out text if exists"""
 
-        xpath = self.metadata_formats[self.metadata_prefix][elname.split(':')[1]]
-        if xpath.startswith('//'):
-            value = element.xpath(xpath, namespaces=self.context.namespaces)
+        xpath = self._get_header_xpath(metadata_prefix, elname)
+        if isinstance(xpath, etree.XPath):
+            value = xpath(element)
             if value:
                 value = value[0].text
         else:  # bare string literal
@@ -29,64 +29,77 @@
 # =================================================================
 
 import logging
+import re
+from collections import namedtuple
 
 from pycsw.core.etree import etree
 from pycsw.core import util
+from pycsw.ogc.fes import fes1
 from pycsw.ogc.fes.fes1 import MODEL as fes1_model
 
 LOGGER = logging.getLogger(__name__)
 
+# CQL tokens: quoted literals and identifiers, operators, punctuation and
+# words (keywords, property names, numbers, unquoted dates)
+TOKENS = re.compile(r"""\s*(?:
+    (?P<string>'(?:[^']|'')*')|
+    (?P<identifier>"[^"]*")|
+    (?P<operator><>|!=|<=|>=|=|<|>)|
+    (?P<punctuation>[(),])|
+    (?P<word>[^\s'"(),<>!=]+))""", re.VERBOSE)
 
-def cql2fes1(cql, namespaces):
-    """transforms Common Query Language (CQL) query into OGC fes1 syntax"""
+COMPARISON_OPERATORS = {
+    '=': 'ogc:PropertyIsEqualTo',
+    '<>': 'ogc:PropertyIsNotEqualTo',
+    '!=': 'ogc:PropertyIsNotEqualTo',
+    '<': 'ogc:PropertyIsLessThan',
+    '<=': 'ogc:PropertyIsLessThanOrEqualTo',
+    '>': 'ogc:PropertyIsGreaterThan',
+    '>=': 'ogc:PropertyIsGreaterThanOrEqualTo',
+}
 
-    filters = []
-    tmp_list = []
-    logical_op = None
+# temporal predicates on an instant, as comparisons
+TEMPORAL_OPERATORS = {
+    'AFTER': 'ogc:PropertyIsGreaterThan',
+    'BEFORE': 'ogc:PropertyIsLessThan',
+    'TEQUALS': 'ogc:PropertyIsEqualTo',
+}
 
-    LOGGER.debug('CQL: %s', cql)
+SPATIAL_OPERATORS = dict((name.upper(), name) for name in
+                         fes1_model['SpatialOperators']['values'])
 
-    if ' or ' in cql:
-        logical_op = etree.Element(util.nspath_eval('ogc:Or', namespaces))
-        tmp_list = cql.split(' or ')
-    elif ' OR ' in cql:
-        logical_op = etree.Element(util.nspath_eval('ogc:Or', namespaces))
-        tmp_list = cql.split(' OR ')
-    elif ' and ' in cql:
-        logical_op = etree.Element(util.nspath_eval('ogc:And', namespaces))
-        tmp_list = cql.split(' and ')
-    elif ' AND ' in cql:
-        logical_op = etree.Element(util.nspath_eval('ogc:And', namespaces))
-        tmp_list = cql.split(' AND ')
-
-    if tmp_list:
-        LOGGER.debug('Logical operator found (AND/OR)')
-    else:
-        tmp_list.append(cql)
+# CQL coordinates are in x/y (longitude/latitude) order
+CQL_SRS = 'urn:ogc:def:crs:OGC:1.3:CRS84'
 
-    for t in tmp_list:
-        filters.append(_parse_condition(t))
+# CQL syntax tree
+Logical = namedtuple('Logical', 'operator operands')
+Not = namedtuple('Not', 'operand')
+Comparison = namedtuple('Comparison',
+                        'operator property function values matchcase')
+Spatial = namedtuple('Spatial', 'operator property geometry distance units')
+Geometry = namedtuple('Geometry', 'type wkt coordinates')
 
-    root = etree.Element(util.nspath_eval('ogc:Filter', namespaces))
 
-    if logical_op is not None:
-        root.append(logical_op)
+def parse(cql, queryables, dbtype, orm='sqlalchemy', language='english',
+          fts=False, spatial_index=None, constraint=None):
+    """Common Query Language (CQL) support
 
-    for flt in filters:
-        condition = etree.Element(util.nspath_eval(flt[0], namespaces))
+    Returns the where clause and values of fes1.parse for the OGC Filter
+    of the query, compiled straight from the CQL syntax tree"""
 
-        etree.SubElement(
-            condition,
-            util.nspath_eval('ogc:PropertyName', namespaces)).text = flt[1]
+    LOGGER.debug('CQL: %s', cql)
 
-        etree.SubElement(
-            condition,
-            util.nspath_eval('ogc:Literal', namespaces)).text = flt[2]
+    return _compile(_Parser(cql).parse(), queryables, dbtype, orm, language,
+                    fts, spatial_index, constraint)
 
-        if logical_op is not None:
-            logical_op.append(condition)
-        else:
-            root.append(condition)
+
+def cql2fes1(cql, namespaces):
+    """transforms Common Query Language (CQL) query into OGC fes1 syntax"""
+
+    LOGGER.debug('CQL: %s', cql)
+
+    root = etree.Element(util.nspath_eval('ogc:Filter', namespaces))
+    root.append(_get_element(_Parser(cql).parse(), namespaces))
 
     LOGGER.debug('Resulting OGC Filter: %s',
                  etree.tostring(root, pretty_print=1))
@@ -94,22 +107,448 @@ def cql2fes1(cql, namespaces):
     return root
 
 
-def _parse_condition(condition):
-    """parses a single condition"""
+def _tokenize(cql):
+    """return the (kind, text) tokens of a CQL query"""
+
+    tokens = []
+    position = 0
+    end = len(cql.rstrip())
+
+    while position < end:
+        match = TOKENS.match(cql, position)
+        if match is None:
+            raise RuntimeError('Invalid CQL at position %d: %s' %
+                               (position, cql))
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+        position = match.end()
+
+    return tokens
+
+
+class _Parser(object):
+    """recursive descent parser of CQL queries, as per:
+
+    or := and (OR and)*
+    and := not (AND not)*
+    not := NOT not | '(' or ')' | predicate"""
+
+    def __init__(self, cql):
+        """initialize parser"""
+
+        self.cql = cql
+        self.tokens = _tokenize(cql)
+        self.position = 0
+
+    def parse(self):
+        """return the syntax tree of the query"""
+
+        node = self._parse_or()
+        if self.position < len(self.tokens):
+            self._fail('Unexpected %s' % self.tokens[self.position][1])
+        return node
+
+    def _fail(self, message):
+        raise RuntimeError('%s in CQL: %s' % (message, self.cql))
+
+    def _peek(self, offset=0):
+        if self.position + offset < len(self.tokens):
+            return self.tokens[self.position + offset]
+        return None, None
+
+    def _next(self):
+        token = self._peek()
+        if token[0] is None:
+            self._fail('Unexpected end')
+        self.position += 1
+        return token
+
+    def _accept(self, keyword):
+        """consume the next token if it is the keyword or punctuation"""
+
+        kind, text = self._peek()
+        if kind in ['word', 'punctuation'] and text.upper() == keyword:
+            self.position += 1
+            return True
+        return False
+
+    def _expect(self, keyword):
+        if not self._accept(keyword):
+            self._fail('Missing %s' % keyword)
+
+    def _parse_or(self):
+        operands = [self._parse_and()]
+        while self._accept('OR'):
+            operands.append(self._parse_and())
+        return operands[0] if len(operands) == 1 else \
+            Logical('or', operands)
+
+    def _parse_and(self):
+        operands = [self._parse_not()]
+        while self._accept('AND'):
+            operands.append(self._parse_not())
+        return operands[0] if len(operands) == 1 else \
+            Logical('and', operands)
+
+    def _parse_not(self):
+        if self._accept('NOT'):
+            return Not(self._parse_not())
+        if self._accept('('):
+            node = self._parse_or()
+            self._expect(')')
+            return node
+        return self._parse_predicate()
+
+    def _parse_predicate(self):
+        function = None
+        kind, text = self._peek()
+
+        if kind == 'word' and self._peek(1)[1] == '(':
+            self.position += 2
+            if text.upper() in SPATIAL_OPERATORS:
+                return self._parse_spatial(SPATIAL_OPERATORS[text.upper()])
+            function = text.lower()
+            if function not in fes1_model['Functions']:
+                raise RuntimeError('Invalid ogc:Function: %s' % text)
+            property_name = self._parse_property()
+            self._expect(')')
+        else:
+            property_name = self._parse_property()
+
+        negate = self._accept('NOT')
+        kind, text = self._next()
+        keyword = text.upper()
+        matchcase = None
+
+        if kind == 'operator' and not negate:
+            operator = COMPARISON_OPERATORS[text]
+            values = (self._parse_literal(),)
+        elif keyword in ['LIKE', 'ILIKE']:
+            operator = 'ogc:PropertyIsLike'
+            values = (self._parse_literal(),)
+            if keyword == 'ILIKE':
+                matchcase = 'false'
+        elif keyword == 'BETWEEN':
+            operator = 'ogc:PropertyIsBetween'
+            lower = self._parse_literal()
+            self._expect('AND')
+            values = (lower, self._parse_literal())
+        elif keyword == 'IS' and not negate:
+            operator = 'ogc:PropertyIsNull'
+            values = ()
+            negate = self._accept('NOT')
+            self._expect('NULL')
+        elif keyword in TEMPORAL_OPERATORS and not negate:
+            operator = TEMPORAL_OPERATORS[keyword]
+            values = (self._parse_literal(),)
+        elif keyword == 'DURING' and not negate:
+            operator = 'ogc:PropertyIsBetween'
+            values = tuple(self._parse_literal().split('/'))
+            if len(values) != 2:
+                self._fail('Invalid period')
+        else:
+            self._fail('Invalid operator %s' % text)
+
+        node = Comparison(operator, property_name, function, values,
+                          matchcase)
+        return Not(node) if negate else node
+
+    def _parse_property(self):
+        kind, text = self._next()
+        if kind == 'identifier':
+            return text[1:-1]
+        if kind != 'word':
+            self._fail('Invalid property name %s' % text)
+        return text
+
+    def _parse_literal(self):
+        kind, text = self._next()
+        if kind == 'string':
+            return text[1:-1].replace("''", "'")
+        if kind == 'identifier':  # leniently taken as a literal
+            return text[1:-1]
+        if kind != 'word':
+            self._fail('Invalid literal %s' % text)
+        return text
+
+    def _parse_number(self):
+        kind, text = self._next()
+        try:
+            float(text)
+        except ValueError:
+            self._fail('Invalid number %s' % text)
+        return text
+
+    def _parse_coordinates(self):
+        coordinates = [(self._parse_number(), self._parse_number())]
+        while self._accept(','):
+            coordinates.append((self._parse_number(), self._parse_number()))
+        return coordinates
 
-    LOGGER.debug('condition: %s', condition)
+    def _parse_geometry(self):
+        """return the geometry of a WKT literal, its WKT formatted as per
+        pycsw.ogc.gml.gml3"""
 
-    # split at the most 2 times to take into account literals with
-    # spaces in them
-    property_name, operator, literal = condition.split(None, 2)
+        kind, text = self._next()
+        geometry_type = text.upper()
+        self._expect('(')
 
-    literal = literal.replace('"', '').replace('\'', '')
+        if geometry_type == 'ENVELOPE':  # minx, maxx, maxy, miny
+            minx = self._parse_number()
+            self._expect(',')
+            maxx = self._parse_number()
+            self._expect(',')
+            maxy = self._parse_number()
+            self._expect(',')
+            miny = self._parse_number()
+            self._expect(')')
+            return _get_envelope(minx, miny, maxx, maxy)
 
-    for k, v in fes1_model['ComparisonOperators'].items():
-        if v['opvalue'] == operator:
-            fes1_predicate = k
+        if geometry_type == 'POLYGON':
+            self._expect('(')
+            coordinates = self._parse_coordinates()
+            self._expect(')')
+            if self._peek()[1] == ',':
+                self._fail('Unsupported polygon interior ring')
+            wkt = 'POLYGON((%s))'
+            geometry_type = 'Polygon'
+        elif geometry_type == 'LINESTRING':
+            coordinates = self._parse_coordinates()
+            wkt = 'LINESTRING(%s)'
+            geometry_type = 'LineString'
+        elif geometry_type == 'POINT':
+            coordinates = [(self._parse_number(), self._parse_number())]
+            wkt = 'POINT(%s)'
+            geometry_type = 'Point'
+        else:
+            self._fail('Unsupported geometry type %s' % text)
+
+        self._expect(')')
+        return Geometry(geometry_type, wkt % ', '.join(
+            '%s %s' % xy for xy in coordinates), coordinates)
+
+    def _parse_spatial(self, operator):
+        distance = units = None
+        property_name = self._parse_property()
+        self._expect(',')
+
+        if operator == 'BBOX':  # minx, miny, maxx, maxy
+            bbox = [self._parse_number()]
+            for i in range(3):
+                self._expect(',')
+                bbox.append(self._parse_number())
+            geometry = _get_envelope(*bbox)
+        else:
+            geometry = self._parse_geometry()
+
+        if operator in ['DWithin', 'Beyond']:
+            self._expect(',')
+            distance = self._parse_number()
+            self._expect(',')
+            units = self._parse_property()
+
+        self._expect(')')
+        return Spatial(operator, property_name, geometry, distance, units)
+
+
+def _get_envelope(minx, miny, maxx, maxy):
+    """return the geometry of an envelope"""
+
+    return Geometry('Envelope', util.bbox2wktpolygon(
+        '%s,%s,%s,%s' % (minx, miny, maxx, maxy)),
+        [(minx, miny), (maxx, maxy)])
+
+
+def _compile(node, queryables, dbtype, orm, language, fts, spatial_index,
+             constraint):
+    """return the where clause and values of a CQL syntax tree, as
+    compiled by fes1.parse for its OGC Filter"""
+
+    is_pg = dbtype.startswith('postgresql')
+    # on SQLite, fts is the name of the FTS5 table indexing anytext
+    sqlite_fts = fts if dbtype in ['sqlite', 'sqlite3'] and fts else None
+    anytext = queryables['csw:AnyText']['dbcol']
+
+    boolean_true = '\'true\''
+    boolean_false = '\'false\''
+    if dbtype == 'mysql':
+        boolean_true = 'true'
+        boolean_false = 'false'
+
+    values = []
+
+    def bind(value):
+        values.append(value)
+        if orm == 'django':
+            return '%s'
+        return ':pvalue%d' % (len(values) - 1)
+
+    def get_spatial_operator(spatial, spatial_index=None):
+        if (spatial.property.find('BoundingBox') == -1 and
+                spatial.property.find('Envelope') == -1):
+            raise RuntimeError('Invalid ogc:PropertyName in spatial filter: %s'
+                               % spatial.property)
+
+        spatial_predicate = spatial.operator.lower()
+        distance = 'false' if spatial.distance is None else spatial.distance
+        parameters = fes1._get_spatial_parameters(
+            spatial.geometry.wkt, spatial_predicate, distance)
+
+        #make decision to apply spatial ranking to results
+        if constraint is not None:
+            fes1.set_spatial_ranking(spatial.geometry, constraint)
+
+        return fes1._get_spatial_expression(
+            queryables['pycsw:BoundingBox'], spatial_predicate, distance,
+            dbtype, lambda name: bind(parameters[name]),
+            spatial_index=spatial_index)
+
+    def get_pname(comparison):
+        try:
+            return queryables[comparison.property]['dbcol']
+        except Exception as err:
+            raise RuntimeError('Invalid PropertyName: %s.  %s' %
+                               (comparison.property, str(err)))
+
+    def get_comparison_expression(comparison, nullable=False):
+        """return the SQL expression of a comparison, negated with the
+        null test of ogc:Not filters if nullable"""
 
-    LOGGER.debug('parsed condition: %s %s %s', property_name, fes1_predicate,
-                 literal)
+        pname = get_pname(comparison)
+
+        if comparison.operator == 'ogc:PropertyIsNull':
+            return '%s is null' % pname
+
+        com_op = fes1_model['ComparisonOperators'][comparison.operator][
+            'opvalue']
+        if comparison.matchcase == 'false' or pname == anytext:
+            com_op = 'ilike' if is_pg else 'like'
+
+        if comparison.operator == 'ogc:PropertyIsBetween':
+            expression = '%s between %s and %s' % \
+                (pname, bind(comparison.values[0]), bind(comparison.values[1]))
+        else:
+            pval = comparison.values[0]
+            fts_phrase = None
+            if pname == anytext and sqlite_fts and comparison.function is None:
+                fts_phrase = fes1._get_fts_phrase(pval, '%', '_')
+
+            if pname == anytext and is_pg and fts:
+                kind = 'literal'
+            elif fts_phrase is not None:
+                kind = 'fts'
+            elif pname == anytext:
+                kind = 'anytext'
+            else:
+                kind = 'wildcard'
+            param = bind(fes1._get_parameter_value(pval, kind, '%', '_'))
+
+            if comparison.function is not None:
+                expression = '%s(%s) %s %s' % \
+                    (comparison.function, pname, com_op, param)
+            elif pname == anytext and is_pg and fts:
+                expression = ("plainto_tsquery('%s', %s) @@ anytext_tsvector" %
+                              (language, param))
+            elif fts_phrase is not None:
+                expression = ('rowid in (select rowid from %s where %s match %s)' %
+                              (sqlite_fts, sqlite_fts, param))
+            else:
+                expression = '%s %s %s' % (pname, com_op, param)
+
+        if nullable:
+            return '%s is null or not %s' % (pname, expression)
+        return expression
+
+    def get_expression(node, top=False):
+        if isinstance(node, Logical):
+            where = (' %s ' % node.operator).join(
+                get_expression(operand) for operand in node.operands)
+            return where if top else '(%s)' % where
+
+        if isinstance(node, Not):
+            operand = node.operand
+            if isinstance(operand, Spatial):
+                expression = '%s = %s' % (get_spatial_operator(operand),
+                                          boolean_false)
+                # for ogc:Not spatial queries in PostGIS we must explictly
+                # test that pycsw:BoundingBox is null as well
+                if top and dbtype == 'postgresql+postgis+wkt':
+                    expression = '%s or %s is null' % \
+                        (expression, queryables['pycsw:BoundingBox'])
+                return expression
+            if isinstance(operand, Comparison):
+                if operand.operator == 'ogc:PropertyIsNull':
+                    return '%s is not null' % get_pname(operand)
+                if top:
+                    return get_comparison_expression(operand, nullable=True)
+                return 'not %s' % get_comparison_expression(operand)
+            return 'not %s' % get_expression(operand)
+
+        if isinstance(node, Spatial):
+            return '%s = %s' % (get_spatial_operator(node, spatial_index),
+                                boolean_true)
+
+        return get_comparison_expression(node)
+
+    return get_expression(node, top=True), values
+
+
+def _get_element(node, namespaces):
+    """return the OGC Filter element of a CQL syntax tree"""
+
+    def subelement(parent, tag, text=None, **attrib):
+        element = etree.SubElement(parent, util.nspath_eval(tag, namespaces),
+                                   **attrib)
+        element.text = text
+        return element
+
+    if isinstance(node, Logical):
+        element = etree.Element(util.nspath_eval(
+            'ogc:%s' % node.operator.capitalize(), namespaces))
+        for operand in node.operands:
+            element.append(_get_element(operand, namespaces))
+
+    elif isinstance(node, Not):
+        element = etree.Element(util.nspath_eval('ogc:Not', namespaces))
+        element.append(_get_element(node.operand, namespaces))
+
+    elif isinstance(node, Spatial):
+        element = etree.Element(util.nspath_eval('ogc:%s' % node.operator,
+                                                 namespaces))
+        subelement(element, 'ogc:PropertyName', node.property)
+        geometry = subelement(element, 'gml:%s' % node.geometry.type,
+                              srsName=CQL_SRS)
+        coordinates = node.geometry.coordinates
+        poslist = ' '.join('%s %s' % xy for xy in coordinates)
+        if node.geometry.type == 'Envelope':
+            subelement(geometry, 'gml:lowerCorner', '%s %s' % coordinates[0])
+            subelement(geometry, 'gml:upperCorner', '%s %s' % coordinates[1])
+        elif node.geometry.type == 'Polygon':
+            ring = subelement(subelement(geometry, 'gml:exterior'),
+                              'gml:LinearRing')
+            subelement(ring, 'gml:posList', poslist)
+        elif node.geometry.type == 'LineString':
+            subelement(geometry, 'gml:posList', poslist)
+        else:
+            subelement(geometry, 'gml:pos', poslist)
+        if node.distance is not None:
+            subelement(element, 'ogc:Distance', node.distance,
+                       units=node.units)
+
+    else:
+        element = etree.Element(util.nspath_eval(node.operator, namespaces))
+        if node.matchcase is not None:
+            element.set('matchCase', node.matchcase)
+        if node.function is not None:
+            function = subelement(element, 'ogc:Function', name=node.function)
+            subelement(function, 'ogc:PropertyName', node.property)
+        else:
+            subelement(element, 'ogc:PropertyName', node.property)
+        if node.operator == 'ogc:PropertyIsBetween':
+            subelement(subelement(element, 'ogc:LowerBoundary'),
+                       'ogc:Literal', node.values[0])
+            subelement(subelement(element, 'ogc:UpperBoundary'),
+                       'ogc:Literal', node.values[1])
+        elif node.values:
+            subelement(element, 'ogc:Literal', node.values[0])
 
-    return (fes1_predicate, property_name, literal)
+    return element
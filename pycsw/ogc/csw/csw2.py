@@ -30,6 +30,7 @@
 #
 # =================================================================
 
+import functools
 import os
 import sys
 import cgi
@@ -38,16 +39,32 @@ from six import StringIO
 from six.moves.configparser import SafeConfigParser
 from pycsw.core.etree import etree
 from pycsw import oaipmh, opensearch, sru
-from pycsw.ogc.csw.cql import cql2fes1
+from pycsw.ogc.csw import cql
 from pycsw.plugins.profiles import profile as pprofile
 import pycsw.plugins.outputschemas
 from pycsw.core import config, log, metadata, util
-from pycsw.core.formats.fmt_json import xml2dict
 from pycsw.ogc.fes import fes1
 import logging
 
 LOGGER = logging.getLogger(__name__)
 
+# request elements accepted by structural (xml_validation=structural) checks
+REQUEST_ELEMENTS = ['GetCapabilities', 'DescribeRecord', 'GetDomain',
+                    'GetRecords', 'GetRecordById', 'Transaction', 'Harvest']
+
+# csw:Record elementsets pre-rendered at ingest: element name, and the
+# mapping of the column holding them
+RENDERED_ELEMENTSETS = {
+    'brief': ('BriefRecord', 'pycsw:BriefXML'),
+    'summary': ('SummaryRecord', 'pycsw:SummaryXML'),
+}
+
+# mappings of the columns pre-rendered csw:Record elementsets are built from
+RENDERED_SOURCES = ['pycsw:Identifier', 'pycsw:Title', 'pycsw:Type',
+                    'pycsw:Keywords', 'pycsw:TopicCategory', 'pycsw:Format',
+                    'pycsw:Links', 'pycsw:Relation', 'pycsw:Modified',
+                    'pycsw:Abstract', 'pycsw:BoundingBox']
+
 
 class Csw2(object):
     ''' CSW 2.x server '''
@@ -56,6 +73,7 @@ class Csw2(object):
 
         self.parent = server_csw
         self.version = '2.0.2'
+        self.record_writers = {}
 
     def getcapabilities(self):
         ''' Handle GetCapabilities request '''
@@ -735,15 +753,18 @@ class Csw2(object):
                 if self.parent.kvp['constraintlanguage'] == 'CQL_TEXT':
                     tmp = self.parent.kvp['constraint']
                     try:
-                        LOGGER.info('Transforming CQL into fes1')
+                        LOGGER.info('Compiling CQL')
                         LOGGER.debug('CQL: %s', tmp)
-                        self.parent.kvp['constraint'] = {}
+                        self.parent.kvp['constraint'] = util.Constraint()
                         self.parent.kvp['constraint']['type'] = 'filter'
-                        cql = cql2fes1(tmp, self.parent.context.namespaces)
-                        self.parent.kvp['constraint']['where'], self.parent.kvp['constraint']['values'] = fes1.parse(cql,
+                        self.parent.kvp['constraint']['where'], self.parent.kvp['constraint']['values'] = cql.parse(tmp,
                         self.parent.repository.queryables['_all'], self.parent.repository.dbtype,
-                        self.parent.context.namespaces, self.parent.orm, self.parent.language['text'], self.parent.repository.fts)
-                        self.parent.kvp['constraint']['_dict'] = xml2dict(etree.tostring(cql), self.parent.context.namespaces)
+                        self.parent.orm, self.parent.language['text'], self.parent.repository.fts,
+                        getattr(self.parent.repository, 'spatial_index', None),
+                        constraint=self.parent.kvp['constraint'] if self.parent.spatial_ranking else None)
+                        self.parent.kvp['constraint'].set_filter(
+                        functools.partial(cql.cql2fes1, tmp, self.parent.context.namespaces),
+                        self.parent.context.namespaces)
                     except Exception as err:
                         LOGGER.exception('Invalid CQL query %s', tmp)
                         return self.exceptionreport('InvalidParameterValue',
@@ -754,18 +775,27 @@ class Csw2(object):
                         schema = os.path.join(self.parent.config.get('server', 'home'),
                         'core', 'schemas', 'ogc', 'filter', '1.1.0', 'filter.xsd')
                         LOGGER.info('Validating Filter %s', self.parent.kvp['constraint'])
-                        schema = etree.XMLSchema(file=schema)
-                        parser = etree.XMLParser(schema=schema, resolve_entities=False)
-                        doc = etree.fromstring(self.parent.kvp['constraint'], parser)
+                        if self.parent.xml_validation == 'structural':
+                            doc = etree.fromstring(self.parent.kvp['constraint'],
+                                                   self.parent.context.parser)
+                            util.check_xml_structure(
+                                doc, self.parent.context.namespaces['ogc'],
+                                ['Filter'])
+                        else:
+                            schema = util.get_xml_schema(schema)
+                            parser = etree.XMLParser(schema=schema, resolve_entities=False)
+                            doc = etree.fromstring(self.parent.kvp['constraint'], parser)
                         LOGGER.debug('Filter is valid XML')
-                        self.parent.kvp['constraint'] = {}
+                        self.parent.kvp['constraint'] = util.Constraint()
                         self.parent.kvp['constraint']['type'] = 'filter'
                         self.parent.kvp['constraint']['where'], self.parent.kvp['constraint']['values'] = \
                         fes1.parse(doc,
                         self.parent.repository.queryables['_all'],
                         self.parent.repository.dbtype,
-                        self.parent.context.namespaces, self.parent.orm, self.parent.language['text'], self.parent.repository.fts)
-                        self.parent.kvp['constraint']['_dict'] = xml2dict(etree.tostring(doc), self.parent.context.namespaces)
+                        self.parent.context.namespaces, self.parent.orm, self.parent.language['text'], self.parent.repository.fts,
+                        getattr(self.parent.repository, 'spatial_index', None),
+                        constraint=self.parent.kvp['constraint'] if self.parent.spatial_ranking else None)
+                        self.parent.kvp['constraint'].set_filter(doc, self.parent.context.namespaces)
                     except Exception as err:
                         errortext = \
                         'Exception: document not valid.\nError: %s.' % str(err)
@@ -811,18 +841,43 @@ class Csw2(object):
         if 'startposition' not in self.parent.kvp:
             self.parent.kvp['startposition'] = 1
 
+        stream = self.parent._can_stream()
+
         # query repository
         LOGGER.debug('Querying repository with constraint: %s,\
         sortby: %s, typenames: %s, maxrecords: %s, startposition: %s',
         self.parent.kvp['constraint'], self.parent.kvp['sortby'], self.parent.kvp['typenames'],
         self.parent.kvp['maxrecords'], self.parent.kvp['startposition'])
 
+        # no records are presented, only count them
+        hits = (self.parent.kvp['resulttype'] == 'hits' or
+                ('where' not in self.parent.kvp['constraint'] and
+                 self.parent.kvp['resulttype'] is None))
+
+        query_args = {}
+        if self.parent.orm == 'sqlalchemy':
+            query_args['stream'] = stream
+            query_args['columns'] = self.parent._get_result_columns()
+            # page with a keyset over a stable order
+            if self.parent.mode == 'oaipmh':
+                query_args['keyset'] = True
+                query_args['after'] = self.parent.kvp.get('resumptionkey')
+            else:
+                query_args['keyset'] = self.parent.kvp['sortby'] is not None
+
         try:
-            matched, results = self.parent.repository.query(
-            constraint=self.parent.kvp['constraint'],
-            sortby=self.parent.kvp['sortby'], typenames=self.parent.kvp['typenames'],
-            maxrecords=self.parent.kvp['maxrecords'],
-            startposition=int(self.parent.kvp['startposition'])-1)
+            if hits and hasattr(self.parent.repository, 'count'):
+                LOGGER.debug('Counting records')
+                matched = str(self.parent.repository.count(
+                constraint=self.parent.kvp['constraint']))
+                results = None
+            else:
+                matched, results = self.parent.repository.query(
+                constraint=self.parent.kvp['constraint'],
+                sortby=self.parent.kvp['sortby'], typenames=self.parent.kvp['typenames'],
+                maxrecords=self.parent.kvp['maxrecords'],
+                startposition=int(self.parent.kvp['startposition'])-1,
+                **query_args)
         except Exception as err:
             LOGGER.exception('Invalid query syntax.  Query: %s', self.parent.kvp['constraint'])
             LOGGER.exception('Invalid query syntax.  Result: %s', err)
@@ -929,7 +984,12 @@ class Csw2(object):
             return node
 
 
-        if results is not None:
+        if results is not None and stream:
+            LOGGER.info('Streaming records from %s',
+            self.parent.kvp['startposition'])
+            self.parent.stream = (searchresults,
+                                  self._stream_searchresults(results))
+        elif results is not None:
             if len(results) < int(self.parent.kvp['maxrecords']):
                 max1 = len(results)
             else:
@@ -939,40 +999,7 @@ class Csw2(object):
 
             for res in results:
                 try:
-                    if (self.parent.kvp['outputschema'] ==
-                        'http://www.opengis.net/cat/csw/2.0.2' and
-                        'csw:Record' in self.parent.kvp['typenames']):
-                        # serialize csw:Record inline
-                        searchresults.append(self._write_record(
-                        res, self.parent.repository.queryables['_all']))
-                    elif (self.parent.kvp['outputschema'] ==
-                        'http://www.opengis.net/cat/csw/2.0.2' and
-                        'csw:Record' not in self.parent.kvp['typenames']):
-                        # serialize into csw:Record model
-
-                        for prof in self.parent.profiles['loaded']:
-                            # find source typename
-                            if self.parent.profiles['loaded'][prof].typename in \
-                            self.parent.kvp['typenames']:
-                                typename = self.parent.profiles['loaded'][prof].typename
-                                break
-
-                        util.transform_mappings(
-                            self.parent.repository.queryables['_all'],
-                            self.parent.context.model['typenames'][typename][
-                                'mappings']['csw:Record']
-                        )
-
-                        searchresults.append(self._write_record(
-                        res, self.parent.repository.queryables['_all']))
-                    elif self.parent.kvp['outputschema'] in self.parent.outputschemas.keys():  # use outputschema serializer
-                        searchresults.append(self.parent.outputschemas[self.parent.kvp['outputschema']].write_record(res, self.parent.kvp['elementsetname'], self.parent.context, self.parent.config.get('server', 'url')))
-                    else:  # use profile serializer
-                        searchresults.append(
-                        self.parent.profiles['loaded'][self.parent.kvp['outputschema']].\
-                        write_record(res, self.parent.kvp['elementsetname'],
-                        self.parent.kvp['outputschema'],
-                        self.parent.repository.queryables['_all']))
+                    searchresults.append(self._write_searchresult(res))
                 except Exception as err:
                     self.parent.response = self.exceptionreport(
                     'NoApplicableCode', 'service',
@@ -992,6 +1019,84 @@ class Csw2(object):
         else:
             return node
 
+    def _write_searchresult(self, res):
+        ''' Serialize a GetRecords result as per outputSchema '''
+
+        if self.parent._can_pass_through():
+            stored = self._pass_through_record(res)
+            if stored is not None:
+                return stored
+
+        if (self.parent.kvp['outputschema'] ==
+            'http://www.opengis.net/cat/csw/2.0.2' and
+            'csw:Record' in self.parent.kvp['typenames']):
+            # serialize csw:Record inline
+            return self._write_record(
+            res, self.parent.repository.queryables['_all'])
+        elif (self.parent.kvp['outputschema'] ==
+            'http://www.opengis.net/cat/csw/2.0.2' and
+            'csw:Record' not in self.parent.kvp['typenames']):
+            # serialize into csw:Record model
+
+            for prof in self.parent.profiles['loaded']:
+                # find source typename
+                if self.parent.profiles['loaded'][prof].typename in \
+                self.parent.kvp['typenames']:
+                    typename = self.parent.profiles['loaded'][prof].typename
+                    break
+
+            util.transform_mappings(
+                self.parent.repository.queryables['_all'],
+                self.parent.context.model['typenames'][typename][
+                    'mappings']['csw:Record']
+            )
+
+            return self._write_record(
+            res, self.parent.repository.queryables['_all'])
+        elif self.parent.kvp['outputschema'] in self.parent.outputschemas.keys():  # use outputschema serializer
+            return self.parent.outputschemas[self.parent.kvp['outputschema']].write_record(res, self.parent.kvp['elementsetname'], self.parent.context, self.parent.config.get('server', 'url'))
+        else:  # use profile serializer
+            return self._get_profile_writer()(res)
+
+    def _pass_through_record(self, res):
+        ''' Placeholder for a GetRecords result presented as is, written
+        into the response without parsing its stored XML document '''
+
+        if (self.parent.kvp.get('elementsetname') != 'full' or
+                self.parent.kvp.get('elementname')):
+            return None
+
+        mappings = self.parent.context.md_core_model['mappings']
+        typename = util.getqattr(res, mappings['pycsw:Typename'])
+        outputschema = self.parent.kvp['outputschema']
+
+        if outputschema == self.parent.context.namespaces['csw']:
+            if ('csw:Record' not in self.parent.kvp['typenames'] or
+                    typename != 'csw:Record' or
+                    util.getqattr(res, mappings['pycsw:Schema']) != outputschema or
+                    util.getqattr(res, mappings['pycsw:Type']) == 'service'):
+                return None
+        elif outputschema in self.parent.outputschemas:
+            if typename != getattr(self.parent.outputschemas[outputschema],
+                                   'TYPENAME', None):
+                return None
+        elif typename != self.parent.profiles['loaded'][outputschema].typename:
+            return None
+
+        return self.parent._pass_through(
+            util.getqattr(res, mappings['pycsw:XML']))
+
+    def _stream_searchresults(self, results):
+        ''' Serialize GetRecords results one at a time '''
+
+        for res in results:
+            try:
+                yield self._write_searchresult(res)
+            except Exception as err:
+                # the response is already being sent: flag and carry on
+                LOGGER.exception('Record serialization failed: %s', err)
+                yield etree.Comment(' Record serialization failed ')
+
     def getrecordbyid(self, raw=False):
         ''' Handle GetRecordById request '''
 
@@ -1080,10 +1185,7 @@ class Csw2(object):
             elif self.parent.kvp['outputschema'] in self.parent.outputschemas.keys():  # use outputschema serializer
                 node.append(self.parent.outputschemas[self.parent.kvp['outputschema']].write_record(result, self.parent.kvp['elementsetname'], self.parent.context, self.parent.config.get('server', 'url')))
             else:  # it's a profile output
-                node.append(
-                self.parent.profiles['loaded'][self.parent.kvp['outputschema']].write_record(
-                result, self.parent.kvp['elementsetname'],
-                self.parent.kvp['outputschema'], self.parent.repository.queryables['_all']))
+                node.append(self._get_profile_writer()(result))
 
         if raw and len(results) == 0:
             return None
@@ -1435,25 +1537,20 @@ class Csw2(object):
         else:
             elname = 'Record'
 
+        if not self.parent.kvp.get('elementname'):
+            rendered = get_rendered_record(recobj,
+                       self.parent.kvp['elementsetname'], self.parent.context)
+            if rendered is not None:  # pre-rendered at ingest
+                # parsing these small fragments costs about as much as
+                # splicing them, and keeps the response namespaces tidy
+                return etree.fromstring(rendered, self.parent.context.parser)
+
         record = etree.Element(util.nspath_eval('csw:%s' % elname,
                  self.parent.context.namespaces))
 
         if ('elementname' in self.parent.kvp and
             len(self.parent.kvp['elementname']) > 0):
-            for elemname in self.parent.kvp['elementname']:
-                if (elemname.find('BoundingBox') != -1 or
-                    elemname.find('Envelope') != -1):
-                    bboxel = write_boundingbox(util.getqattr(recobj,
-                    self.parent.context.md_core_model['mappings']['pycsw:BoundingBox']),
-                    self.parent.context.namespaces)
-                    if bboxel is not None:
-                        record.append(bboxel)
-                else:
-                    value = util.getqattr(recobj, queryables[elemname]['dbcol'])
-                    if value:
-                        etree.SubElement(record,
-                        util.nspath_eval(elemname,
-                        self.parent.context.namespaces)).text = value
+            self._get_record_writer(queryables)(record, recobj)
         elif 'elementsetname' in self.parent.kvp:
             if (self.parent.kvp['elementsetname'] == 'full' and
             util.getqattr(recobj, self.parent.context.md_core_model['mappings']\
@@ -1466,84 +1563,72 @@ class Csw2(object):
                 return etree.fromstring(util.getqattr(recobj,
                 self.parent.context.md_core_model['mappings']['pycsw:XML']), self.parent.context.parser)
 
-            etree.SubElement(record,
-            util.nspath_eval('dc:identifier', self.parent.context.namespaces)).text = \
-            util.getqattr(recobj,
-            self.parent.context.md_core_model['mappings']['pycsw:Identifier'])
-
-            for i in ['dc:title', 'dc:type']:
-                val = util.getqattr(recobj, queryables[i]['dbcol'])
-                if not val:
-                    val = ''
-                etree.SubElement(record, util.nspath_eval(i,
-                self.parent.context.namespaces)).text = val
-
-            if self.parent.kvp['elementsetname'] in ['summary', 'full']:
-                # add summary elements
-                keywords = util.getqattr(recobj, queryables['dc:subject']['dbcol'])
-                if keywords is not None:
-                    for keyword in keywords.split(','):
-                        etree.SubElement(record,
-                        util.nspath_eval('dc:subject',
-                        self.parent.context.namespaces)).text = keyword
-
-                val = util.getqattr(recobj, self.parent.context.md_core_model['mappings']['pycsw:TopicCategory'])
-                if val:
-                    etree.SubElement(record,
-                    util.nspath_eval('dc:subject',
-                    self.parent.context.namespaces), scheme='http://www.isotc211.org/2005/resources/Codelist/gmxCodelists.xml#MD_TopicCategoryCode').text = val
-
-                val = util.getqattr(recobj, queryables['dc:format']['dbcol'])
-                if val:
-                    etree.SubElement(record,
-                    util.nspath_eval('dc:format',
-                    self.parent.context.namespaces)).text = val
-
-                # links
-                rlinks = util.getqattr(recobj,
-                self.parent.context.md_core_model['mappings']['pycsw:Links'])
-
-                if rlinks:
-                    links = rlinks.split('^')
-                    for link in links:
-                        linkset = link.split(',')
-                        etree.SubElement(record,
-                        util.nspath_eval('dct:references',
-                        self.parent.context.namespaces),
-                        scheme=linkset[2]).text = linkset[-1]
-
-                for i in ['dc:relation', 'dct:modified', 'dct:abstract']:
-                    val = util.getqattr(recobj, queryables[i]['dbcol'])
-                    if val is not None:
-                        etree.SubElement(record,
-                        util.nspath_eval(i, self.parent.context.namespaces)).text = val
-
-            if self.parent.kvp['elementsetname'] == 'full':  # add full elements
-                for i in ['dc:date', 'dc:creator', \
-                'dc:publisher', 'dc:contributor', 'dc:source', \
-                'dc:language', 'dc:rights', 'dct:alternative']:
-                    val = util.getqattr(recobj, queryables[i]['dbcol'])
-                    if val:
-                        etree.SubElement(record,
-                        util.nspath_eval(i, self.parent.context.namespaces)).text = val
-                val = util.getqattr(recobj, queryables['dct:spatial']['dbcol'])
-                if val:
-                    etree.SubElement(record,
-                    util.nspath_eval('dct:spatial', self.parent.context.namespaces), scheme='http://www.opengis.net/def/crs').text = val
-
-            # always write out ows:BoundingBox
-            bboxel = write_boundingbox(getattr(recobj,
-            self.parent.context.md_core_model['mappings']['pycsw:BoundingBox']),
-            self.parent.context.namespaces)
-
-            if bboxel is not None:
-                record.append(bboxel)
+            self._get_record_writer(queryables)(record, recobj)
         return record
 
+    def _get_record_writer(self, queryables):
+        ''' Compiled writer of the csw:Record elements requested by
+        ElementName or ElementSetName, kept for the request '''
+
+        elementname = tuple(self.parent.kvp.get('elementname') or ())
+        key = (id(queryables), self.parent.kvp.get('elementsetname'),
+               elementname)
+        writer = self.record_writers.get(key)
+        if writer is None:
+            if elementname:
+                writer = self._compile_elementname_writer(queryables,
+                                                          elementname)
+            else:
+                writer = compile_record_writer(queryables,
+                         self.parent.kvp['elementsetname'],
+                         self.parent.context)
+            self.record_writers[key] = writer
+        return writer
+
+    def _get_profile_writer(self):
+        ''' Compiled writer of the records of the profile of OutputSchema,
+        kept for the request '''
+
+        outputschema = self.parent.kvp['outputschema']
+        key = (outputschema, self.parent.kvp['elementsetname'])
+        writer = self.record_writers.get(key)
+        if writer is None:
+            writer = self.parent.profiles['loaded'][outputschema].\
+            compile_record_writer(self.parent.kvp['elementsetname'],
+            outputschema, self.parent.repository.queryables['_all'])
+            self.record_writers[key] = writer
+        return writer
+
+    def _compile_elementname_writer(self, queryables, elementname):
+        ''' Compile the writer of the csw:Record elements of ElementName '''
+
+        namespaces = self.parent.context.namespaces
+        qnames = util.get_qnames(namespaces)
+        fields = []
+        for elemname in elementname:
+            if (elemname.find('BoundingBox') != -1 or
+                elemname.find('Envelope') != -1):
+                fields.append((None, self.parent.context.md_core_model[
+                               'mappings']['pycsw:BoundingBox']))
+            else:
+                fields.append((qnames[elemname],
+                               queryables[elemname]['dbcol']))
+
+        def writer(record, recobj):
+            for tag, column in fields:
+                value = util.getqattr(recobj, column)
+                if tag is None:
+                    bboxel = write_boundingbox(value, namespaces)
+                    if bboxel is not None:
+                        record.append(bboxel)
+                elif value:
+                    etree.SubElement(record, tag).text = value
+        return writer
+
     def _parse_constraint(self, element):
         ''' Parse csw:Constraint '''
 
-        query = {}
+        query = util.Constraint()
 
         tmp = element.find(util.nspath_eval('ogc:Filter', self.parent.context.namespaces))
         if tmp is not None:
@@ -1552,8 +1637,10 @@ class Csw2(object):
                 query['type'] = 'filter'
                 query['where'], query['values'] = fes1.parse(tmp,
                 self.parent.repository.queryables['_all'], self.parent.repository.dbtype,
-                self.parent.context.namespaces, self.parent.orm, self.parent.language['text'], self.parent.repository.fts)
-                query['_dict'] = xml2dict(etree.tostring(tmp), self.parent.context.namespaces)
+                self.parent.context.namespaces, self.parent.orm, self.parent.language['text'], self.parent.repository.fts,
+                getattr(self.parent.repository, 'spatial_index', None),
+                constraint=query if self.parent.spatial_ranking else None)
+                query.set_filter(tmp, self.parent.context.namespaces)
             except Exception as err:
                 return 'Invalid Filter request: %s' % err
 
@@ -1561,13 +1648,16 @@ class Csw2(object):
         if tmp is not None:
             LOGGER.debug('CQL specified: %s.', tmp.text)
             try:
-                LOGGER.info('Transforming CQL into OGC Filter')
+                LOGGER.info('Compiling CQL')
                 query['type'] = 'filter'
-                cql = cql2fes1(tmp.text, self.parent.context.namespaces)
-                query['where'], query['values'] = fes1.parse(cql,
+                query['where'], query['values'] = cql.parse(tmp.text,
                 self.parent.repository.queryables['_all'], self.parent.repository.dbtype,
-                self.parent.context.namespaces, self.parent.orm, self.parent.language['text'], self.parent.repository.fts)
-                query['_dict'] = xml2dict(etree.tostring(cql), self.parent.context.namespaces)
+                self.parent.orm, self.parent.language['text'], self.parent.repository.fts,
+                getattr(self.parent.repository, 'spatial_index', None),
+                constraint=query if self.parent.spatial_ranking else None)
+                query.set_filter(
+                functools.partial(cql.cql2fes1, tmp.text, self.parent.context.namespaces),
+                self.parent.context.namespaces)
             except Exception as err:
                 LOGGER.exception('Invalid CQL request: %s', tmp.text)
                 LOGGER.exception('Error message: %s', err)
@@ -1617,14 +1707,20 @@ class Csw2(object):
             len(doc.xpath('//csw:Update/child::*',
             namespaces=self.parent.context.namespaces)) == 0:
 
-                LOGGER.info('Validating %s', postdata)
-                schema = etree.XMLSchema(file=schema)
-                parser = etree.XMLParser(schema=schema, resolve_entities=False)
-                if hasattr(self.parent, 'soap') and self.parent.soap:
-                # validate the body of the SOAP request
-                    doc = etree.fromstring(etree.tostring(doc), parser)
-                else:  # validate the request normally
-                    doc = etree.fromstring(postdata, parser)
+                if self.parent.xml_validation == 'structural':
+                    LOGGER.info('Checking structure of %s', postdata)
+                    util.check_xml_structure(
+                        doc, self.parent.context.namespaces['csw'],
+                        REQUEST_ELEMENTS)
+                else:
+                    LOGGER.info('Validating %s', postdata)
+                    schema = util.get_xml_schema(schema)
+                    parser = etree.XMLParser(schema=schema, resolve_entities=False)
+                    if hasattr(self.parent, 'soap') and self.parent.soap:
+                    # validate the body of the SOAP request
+                        doc = etree.fromstring(etree.tostring(doc), parser)
+                    else:  # validate the request normally
+                        doc = etree.fromstring(postdata, parser)
                 LOGGER.debug('Request is valid XML.')
             else:  # parse Transaction without validation
                 doc = etree.fromstring(postdata, self.parent.context.parser)
@@ -1994,6 +2090,124 @@ class Csw2(object):
 
         return node
 
+def compile_record_writer(queryables, elementsetname, context,
+                          bbox_writer=None):
+    ''' Compile the writer of the elements of a csw:Record elementset
+
+    Columns and tag names are resolved once, into a function of
+    (record, recobj) adding the elements of repository record recobj to
+    record element record.
+    '''
+
+    if bbox_writer is None:
+        bbox_writer = write_boundingbox
+
+    mappings = context.md_core_model['mappings']
+    qnames = util.get_qnames(context.namespaces)
+    steps = []
+
+    def column(name):
+        return queryables[name]['dbcol']
+
+    def required(tag, column, default=None):
+        def step(record, recobj):
+            value = util.getqattr(recobj, column)
+            if default is not None and not value:
+                value = default
+            etree.SubElement(record, tag).text = value
+        steps.append(step)
+
+    def optional(tag, column, attrib=None, test=bool):
+        def step(record, recobj):
+            value = util.getqattr(recobj, column)
+            if test(value):
+                etree.SubElement(record, tag, attrib).text = value
+        steps.append(step)
+
+    def is_not_none(value):
+        return value is not None
+
+    required(qnames['dc:identifier'], mappings['pycsw:Identifier'])
+    for name in ['dc:title', 'dc:type']:
+        required(qnames[name], column(name), '')
+
+    if elementsetname in ['summary', 'full']:
+        # add summary elements
+        subject, keywords = qnames['dc:subject'], column('dc:subject')
+
+        def write_keywords(record, recobj):
+            value = util.getqattr(recobj, keywords)
+            if value is not None:
+                for keyword in value.split(','):
+                    etree.SubElement(record, subject).text = keyword
+        steps.append(write_keywords)
+
+        optional(subject, mappings['pycsw:TopicCategory'], {'scheme':
+                 'http://www.isotc211.org/2005/resources/Codelist/gmxCodelists.xml#MD_TopicCategoryCode'})
+        optional(qnames['dc:format'], column('dc:format'))
+
+        # links
+        references, links = qnames['dct:references'], mappings['pycsw:Links']
+
+        def write_links(record, recobj):
+            value = util.getqattr(recobj, links)
+            if value:
+                for link in value.split('^'):
+                    linkset = link.split(',')
+                    etree.SubElement(record, references,
+                    scheme=linkset[2]).text = linkset[-1]
+        steps.append(write_links)
+
+        for name in ['dc:relation', 'dct:modified', 'dct:abstract']:
+            optional(qnames[name], column(name), test=is_not_none)
+
+    if elementsetname == 'full':  # add full elements
+        for name in ['dc:date', 'dc:creator', \
+        'dc:publisher', 'dc:contributor', 'dc:source', \
+        'dc:language', 'dc:rights', 'dct:alternative']:
+            optional(qnames[name], column(name))
+        optional(qnames['dct:spatial'], column('dct:spatial'),
+                 {'scheme': 'http://www.opengis.net/def/crs'})
+
+    # always write out ows:BoundingBox
+    bbox = mappings['pycsw:BoundingBox']
+
+    def write_bbox(record, recobj):
+        bboxel = bbox_writer(getattr(recobj, bbox), context.namespaces)
+        if bboxel is not None:
+            record.append(bboxel)
+    steps.append(write_bbox)
+
+    def writer(record, recobj):
+        for step in steps:
+            step(record, recobj)
+    return writer
+
+
+def render_record(recobj, queryables, elementsetname, context):
+    ''' Serialize a brief or summary csw:Record, to be stored with the
+    record and spliced into responses by get_rendered_record '''
+
+    record = etree.Element(util.nspath_eval('csw:%s' %
+             RENDERED_ELEMENTSETS[elementsetname][0], context.namespaces),
+             nsmap=dict((prefix, context.namespaces[prefix]) for prefix in
+                        ['csw', 'dc', 'dct', 'ows']))
+    compile_record_writer(queryables, elementsetname, context)(record, recobj)
+    return etree.tostring(record).decode('utf-8')
+
+
+def get_rendered_record(recobj, elementsetname, context):
+    ''' Pre-rendered csw:Record of an elementset, if any '''
+
+    if elementsetname not in RENDERED_ELEMENTSETS:
+        return None
+    column = context.md_core_model['mappings'].get(
+        RENDERED_ELEMENTSETS[elementsetname][1])
+    if column is None:
+        return None
+    return getattr(recobj, column, None)
+
+
 def write_boundingbox(bbox, nsmap):
     ''' Generate ows:BoundingBox '''
 
@@ -28,6 +28,7 @@
 #
 # =================================================================
 
+import functools
 import os
 import sys
 import cgi
@@ -36,17 +37,21 @@ from six.moves.urllib.parse import quote, unquote
 from six import StringIO
 from six.moves.configparser import SafeConfigParser
 from pycsw.core.etree import etree
-from pycsw.ogc.csw.cql import cql2fes1
+from pycsw.ogc.csw import cql
+from pycsw.ogc.csw.csw2 import compile_record_writer
 from pycsw import oaipmh, opensearch, sru
 from pycsw.plugins.profiles import profile as pprofile
 import pycsw.plugins.outputschemas
 from pycsw.core import config, log, metadata, util
-from pycsw.core.formats.fmt_json import xml2dict
 from pycsw.ogc.fes import fes2
 import logging
 
 LOGGER = logging.getLogger(__name__)
 
+# request elements accepted by structural (xml_validation=structural) checks
+REQUEST_ELEMENTS = ['GetCapabilities', 'GetDomain', 'GetRecords',
+                    'GetRecordById', 'Transaction', 'Harvest', 'UnHarvest']
+
 
 class Csw3(object):
     ''' CSW 3.x server '''
@@ -55,6 +60,7 @@ class Csw3(object):
 
         self.parent = server_csw
         self.version = '3.0.0'
+        self.record_writers = {}
 
     def getcapabilities(self):
         ''' Handle GetCapabilities request '''
@@ -763,15 +769,18 @@ class Csw3(object):
                 if self.parent.kvp['constraintlanguage'] == 'CQL_TEXT':
                     tmp = self.parent.kvp['constraint']
                     try:
-                        LOGGER.info('Transforming CQL into fes1')
+                        LOGGER.info('Compiling CQL')
                         LOGGER.debug('CQL: %s', tmp)
-                        self.parent.kvp['constraint'] = {}
+                        self.parent.kvp['constraint'] = util.Constraint()
                         self.parent.kvp['constraint']['type'] = 'filter'
-                        cql = cql2fes1(tmp, self.parent.context.namespaces)
-                        self.parent.kvp['constraint']['where'], self.parent.kvp['constraint']['values'] = fes1.parse(cql,
+                        self.parent.kvp['constraint']['where'], self.parent.kvp['constraint']['values'] = cql.parse(tmp,
                         self.parent.repository.queryables['_all'], self.parent.repository.dbtype,
-                        self.parent.context.namespaces, self.parent.orm, self.parent.language['text'], self.parent.repository.fts)
-                        self.parent.kvp['constraint']['_dict'] = xml2dict(etree.tostring(cql), self.parent.context.namespaces)
+                        self.parent.orm, self.parent.language['text'], self.parent.repository.fts,
+                        getattr(self.parent.repository, 'spatial_index', None),
+                        constraint=self.parent.kvp['constraint'] if self.parent.spatial_ranking else None)
+                        self.parent.kvp['constraint'].set_filter(
+                        functools.partial(cql.cql2fes1, tmp, self.parent.context.namespaces),
+                        self.parent.context.namespaces)
                     except Exception as err:
                         LOGGER.exception('Invalid CQL query %s', tmp)
                         return self.exceptionreport('InvalidParameterValue',
@@ -782,18 +791,27 @@ class Csw3(object):
                         schema = os.path.join(self.parent.config.get('server', 'home'),
                         'core', 'schemas', 'ogc', 'filter', '1.1.0', 'filter.xsd')
                         LOGGER.info('Validating Filter %s.', self.parent.kvp['constraint'])
-                        schema = etree.XMLSchema(file=schema)
-                        parser = etree.XMLParser(schema=schema, resolve_entities=False)
-                        doc = etree.fromstring(self.parent.kvp['constraint'], parser)
+                        if self.parent.xml_validation == 'structural':
+                            doc = etree.fromstring(self.parent.kvp['constraint'],
+                                                   self.parent.context.parser)
+                            util.check_xml_structure(
+                                doc, self.parent.context.namespaces['ogc'],
+                                ['Filter'])
+                        else:
+                            schema = util.get_xml_schema(schema)
+                            parser = etree.XMLParser(schema=schema, resolve_entities=False)
+                            doc = etree.fromstring(self.parent.kvp['constraint'], parser)
                         LOGGER.debug('Filter is valid XML.')
-                        self.parent.kvp['constraint'] = {}
+                        self.parent.kvp['constraint'] = util.Constraint()
                         self.parent.kvp['constraint']['type'] = 'filter'
                         self.parent.kvp['constraint']['where'], self.parent.kvp['constraint']['values'] = \
                         fes2.parse(doc,
                         self.parent.repository.queryables['_all'],
                         self.parent.repository.dbtype,
-                        self.parent.context.namespaces, self.parent.orm, self.parent.language['text'], self.parent.repository.fts)
-                        self.parent.kvp['constraint']['_dict'] = xml2dict(etree.tostring(doc), self.parent.context.namespaces)
+                        self.parent.context.namespaces, self.parent.orm, self.parent.language['text'], self.parent.repository.fts,
+                        getattr(self.parent.repository, 'spatial_index', None),
+                        constraint=self.parent.kvp['constraint'] if self.parent.spatial_ranking else None)
+                        self.parent.kvp['constraint'].set_filter(doc, self.parent.context.namespaces)
                     except Exception as err:
                         errortext = \
                         'Exception: document not valid.\nError: %s' % str(err)
@@ -840,6 +858,13 @@ class Csw3(object):
         if 'startposition' not in self.parent.kvp:
             self.parent.kvp['startposition'] = 1
 
+        stream = self.parent._can_stream()
+
+        # CSW 3 requests hits only with maxRecords=0; resultType=hits
+        # is honoured for clients written against CSW 2
+        hits = (self.parent.kvp.get('resulttype') == 'hits' or
+                str(self.parent.kvp['maxrecords']) == '0')
+
         if 'recordids' in self.parent.kvp and self.parent.kvp['recordids'] != '':
             # query repository
             LOGGER.info('Querying repository with RECORD ids: %s', self.parent.kvp['recordids'])
@@ -855,12 +880,26 @@ class Csw3(object):
             self.parent.kvp['constraint'], self.parent.kvp['sortby'], self.parent.kvp['typenames'],
             self.parent.kvp['maxrecords'], self.parent.kvp['startposition'])
 
+            query_args = {}
+            if self.parent.orm == 'sqlalchemy':
+                query_args['stream'] = stream
+                query_args['columns'] = self.parent._get_result_columns()
+                # page with a keyset over a stable order
+                query_args['keyset'] = self.parent.kvp['sortby'] is not None
+
             try:
-                matched, results = self.parent.repository.query(
-                constraint=self.parent.kvp['constraint'],
-                sortby=self.parent.kvp['sortby'], typenames=self.parent.kvp['typenames'],
-                maxrecords=self.parent.kvp['maxrecords'],
-                startposition=int(self.parent.kvp['startposition'])-1)
+                if hits and hasattr(self.parent.repository, 'count'):
+                    LOGGER.debug('Counting records')
+                    matched = str(self.parent.repository.count(
+                    constraint=self.parent.kvp['constraint']))
+                    results = None
+                else:
+                    matched, results = self.parent.repository.query(
+                    constraint=self.parent.kvp['constraint'],
+                    sortby=self.parent.kvp['sortby'], typenames=self.parent.kvp['typenames'],
+                    maxrecords=self.parent.kvp['maxrecords'],
+                    startposition=int(self.parent.kvp['startposition'])-1,
+                    **query_args)
             except Exception as err:
                 LOGGER.exception('Invalid query syntax.  Query: %s', self.parent.kvp['constraint'])
                 LOGGER.exception('Invalid query syntax.  Result: %s', err)
@@ -881,6 +920,11 @@ class Csw3(object):
                     nextrecord = str(int(self.parent.kvp['startposition']) + \
                     int(self.parent.kvp['maxrecords']))
 
+        if hits:
+            LOGGER.debug('Hits only result set returned')
+            returned = '0'
+            results = None
+
         LOGGER.debug('Results: matched: %s, returned: %s, next: %s',
         matched, returned, nextrecord)
 
@@ -918,7 +962,12 @@ class Csw3(object):
         #    LOGGER.debug('Empty result set returned')
         #    return node
 
-        if results is not None:
+        if results is not None and stream:
+            LOGGER.info('Streaming records from %s',
+            self.parent.kvp['startposition'])
+            self.parent.stream = (searchresults,
+                                  self._stream_searchresults(results))
+        elif results is not None:
             if len(results) < int(self.parent.kvp['maxrecords']):
                 max1 = len(results)
             else:
@@ -928,40 +977,7 @@ class Csw3(object):
 
             for res in results:
                 try:
-                    if (self.parent.kvp['outputschema'] ==
-                        'http://www.opengis.net/cat/csw/3.0' and
-                        'csw:Record' in self.parent.kvp['typenames']):
-                        # serialize csw:Record inline
-                        searchresults.append(self._write_record(
-                        res, self.parent.repository.queryables['_all']))
-                    elif (self.parent.kvp['outputschema'] ==
-                        'http://www.opengis.net/cat/csw/3.0' and
-                        'csw:Record' not in self.parent.kvp['typenames']):
-                        # serialize into csw:Record model
-
-                        for prof in self.parent.profiles['loaded']:
-                            # find source typename
-                            if self.parent.profiles['loaded'][prof].typename in \
-                            self.parent.kvp['typenames']:
-                                typename = self.parent.profiles['loaded'][prof].typename
-                                break
-
-                        util.transform_mappings(
-                            self.parent.repository.queryables['_all'],
-                            self.parent.context.model['typenames'][typename][
-                                'mappings']['csw:Record']
-                        )
-
-                        searchresults.append(self._write_record(
-                        res, self.parent.repository.queryables['_all']))
-                    elif self.parent.kvp['outputschema'] in self.parent.outputschemas:  # use outputschema serializer
-                        searchresults.append(self.parent.outputschemas[self.parent.kvp['outputschema']].write_record(res, self.parent.kvp['elementsetname'], self.parent.context, self.parent.config.get('server', 'url')))
-                    else:  # use profile serializer
-                        searchresults.append(
-                        self.parent.profiles['loaded'][self.parent.kvp['outputschema']].\
-                        write_record(res, self.parent.kvp['elementsetname'],
-                        self.parent.kvp['outputschema'],
-                        self.parent.repository.queryables['_all']))
+                    searchresults.append(self._write_searchresult(res))
                 except Exception as err:
                     self.parent.response = self.exceptionreport(
                     'NoApplicableCode', 'service',
@@ -1037,6 +1053,84 @@ class Csw3(object):
         else:
             return node
 
+    def _write_searchresult(self, res):
+        ''' Serialize a GetRecords result as per outputSchema '''
+
+        if self.parent._can_pass_through():
+            stored = self._pass_through_record(res)
+            if stored is not None:
+                return stored
+
+        if (self.parent.kvp['outputschema'] ==
+            'http://www.opengis.net/cat/csw/3.0' and
+            'csw:Record' in self.parent.kvp['typenames']):
+            # serialize csw:Record inline
+            return self._write_record(
+            res, self.parent.repository.queryables['_all'])
+        elif (self.parent.kvp['outputschema'] ==
+            'http://www.opengis.net/cat/csw/3.0' and
+            'csw:Record' not in self.parent.kvp['typenames']):
+            # serialize into csw:Record model
+
+            for prof in self.parent.profiles['loaded']:
+                # find source typename
+                if self.parent.profiles['loaded'][prof].typename in \
+                self.parent.kvp['typenames']:
+                    typename = self.parent.profiles['loaded'][prof].typename
+                    break
+
+            util.transform_mappings(
+                self.parent.repository.queryables['_all'],
+                self.parent.context.model['typenames'][typename][
+                    'mappings']['csw:Record']
+            )
+
+            return self._write_record(
+            res, self.parent.repository.queryables['_all'])
+        elif self.parent.kvp['outputschema'] in self.parent.outputschemas:  # use outputschema serializer
+            return self.parent.outputschemas[self.parent.kvp['outputschema']].write_record(res, self.parent.kvp['elementsetname'], self.parent.context, self.parent.config.get('server', 'url'))
+        else:  # use profile serializer
+            return self._get_profile_writer()(res)
+
+    def _pass_through_record(self, res):
+        ''' Placeholder for a GetRecords result presented as is, written
+        into the response without parsing its stored XML document '''
+
+        if (self.parent.kvp.get('elementsetname') != 'full' or
+                self.parent.kvp.get('elementname')):
+            return None
+
+        mappings = self.parent.context.md_core_model['mappings']
+        typename = util.getqattr(res, mappings['pycsw:Typename'])
+        outputschema = self.parent.kvp['outputschema']
+
+        if outputschema == self.parent.context.namespaces['csw30']:
+            if ('csw:Record' not in self.parent.kvp['typenames'] or
+                    typename != 'csw:Record' or
+                    util.getqattr(res, mappings['pycsw:Schema']) != outputschema or
+                    util.getqattr(res, mappings['pycsw:Type']) == 'service'):
+                return None
+        elif outputschema in self.parent.outputschemas:
+            if typename != getattr(self.parent.outputschemas[outputschema],
+                                   'TYPENAME', None):
+                return None
+        elif typename != self.parent.profiles['loaded'][outputschema].typename:
+            return None
+
+        return self.parent._pass_through(
+            util.getqattr(res, mappings['pycsw:XML']))
+
+    def _stream_searchresults(self, results):
+        ''' Serialize GetRecords results one at a time '''
+
+        for res in results:
+            try:
+                yield self._write_searchresult(res)
+            except Exception as err:
+                # the response is already being sent: flag and carry on
+                LOGGER.exception('Record serialization failed: %s', err)
+                yield etree.Comment(' Record serialization failed ')
+
     def getrecordbyid(self, raw=False):
         ''' Handle GetRecordById request '''
 
@@ -1140,9 +1234,7 @@ class Csw3(object):
             elif self.parent.kvp['outputschema'] in self.parent.outputschemas:  # use outputschema serializer
                 node = self.parent.outputschemas[self.parent.kvp['outputschema']].write_record(result, self.parent.kvp['elementsetname'], self.parent.context, self.parent.config.get('server', 'url'))
             else:  # it's a profile output
-                node = self.parent.profiles['loaded'][self.parent.kvp['outputschema']].write_record(
-                result, self.parent.kvp['elementsetname'],
-                self.parent.kvp['outputschema'], self.parent.repository.queryables['_all'])
+                node = self._get_profile_writer()(result)
 
         if raw and len(results) == 0:
             return None
@@ -1504,27 +1596,7 @@ class Csw3(object):
 
         if ('elementname' in self.parent.kvp and
             len(self.parent.kvp['elementname']) > 0):
-            for req_term in ['dc:identifier', 'dc:title']:
-                if req_term not in self.parent.kvp['elementname']:
-                    value = util.getqattr(recobj, queryables[req_term]['dbcol'])
-                    etree.SubElement(record,
-                    util.nspath_eval(req_term,
-                    self.parent.context.namespaces)).text = value
-            for elemname in self.parent.kvp['elementname']:
-                if (elemname.find('BoundingBox') != -1 or
-                    elemname.find('Envelope') != -1):
-                    bboxel = write_boundingbox(util.getqattr(recobj,
-                    self.parent.context.md_core_model['mappings']['pycsw:BoundingBox']),
-                    self.parent.context.namespaces)
-                    if bboxel is not None:
-                        record.append(bboxel)
-                else:
-                    value = util.getqattr(recobj, queryables[elemname]['dbcol'])
-                    elem = etree.SubElement(record,
-                           util.nspath_eval(elemname,
-                           self.parent.context.namespaces))
-                    if value:
-                        elem.text = value
+            self._get_record_writer(queryables)(record, recobj)
         elif 'elementsetname' in self.parent.kvp:
             if (self.parent.kvp['elementsetname'] == 'full' and
             util.getqattr(recobj, self.parent.context.md_core_model['mappings']\
@@ -1537,78 +1609,8 @@ class Csw3(object):
                 return etree.fromstring(util.getqattr(recobj,
                 self.parent.context.md_core_model['mappings']['pycsw:XML']), self.parent.context.parser)
 
-            etree.SubElement(record,
-            util.nspath_eval('dc:identifier', self.parent.context.namespaces)).text = \
-            util.getqattr(recobj,
-            self.parent.context.md_core_model['mappings']['pycsw:Identifier'])
-
-            for i in ['dc:title', 'dc:type']:
-                val = util.getqattr(recobj, queryables[i]['dbcol'])
-                if not val:
-                    val = ''
-                etree.SubElement(record, util.nspath_eval(i,
-                self.parent.context.namespaces)).text = val
-
-            if self.parent.kvp['elementsetname'] in ['summary', 'full']:
-                # add summary elements
-                keywords = util.getqattr(recobj, queryables['dc:subject']['dbcol'])
-                if keywords is not None:
-                    for keyword in keywords.split(','):
-                        etree.SubElement(record,
-                        util.nspath_eval('dc:subject',
-                        self.parent.context.namespaces)).text = keyword
-
-                val = util.getqattr(recobj, self.parent.context.md_core_model['mappings']['pycsw:TopicCategory'])
-                if val:
-                    etree.SubElement(record,
-                    util.nspath_eval('dc:subject',
-                    self.parent.context.namespaces), scheme='http://www.isotc211.org/2005/resources/Codelist/gmxCodelists.xml#MD_TopicCategoryCode').text = val
-
-                val = util.getqattr(recobj, queryables['dc:format']['dbcol'])
-                if val:
-                    etree.SubElement(record,
-                    util.nspath_eval('dc:format',
-                    self.parent.context.namespaces)).text = val
-
-                # links
-                rlinks = util.getqattr(recobj,
-                self.parent.context.md_core_model['mappings']['pycsw:Links'])
-
-                if rlinks:
-                    links = rlinks.split('^')
-                    for link in links:
-                        linkset = link.split(',')
-                        etree.SubElement(record,
-                        util.nspath_eval('dct:references',
-                        self.parent.context.namespaces),
-                        scheme=linkset[2]).text = linkset[-1]
-
-                for i in ['dc:relation', 'dct:modified', 'dct:abstract']:
-                    val = util.getqattr(recobj, queryables[i]['dbcol'])
-                    if val is not None:
-                        etree.SubElement(record,
-                        util.nspath_eval(i, self.parent.context.namespaces)).text = val
-
-            if self.parent.kvp['elementsetname'] == 'full':  # add full elements
-                for i in ['dc:date', 'dc:creator', \
-                'dc:publisher', 'dc:contributor', 'dc:source', \
-                'dc:language', 'dc:rights', 'dct:alternative']:
-                    val = util.getqattr(recobj, queryables[i]['dbcol'])
-                    if val:
-                        etree.SubElement(record,
-                        util.nspath_eval(i, self.parent.context.namespaces)).text = val
-                val = util.getqattr(recobj, queryables['dct:spatial']['dbcol'])
-                if val:
-                    etree.SubElement(record,
-                    util.nspath_eval('dct:spatial', self.parent.context.namespaces), scheme='http://www.opengis.net/def/crs').text = val
-
-            # always write out ows:BoundingBox
-            bboxel = write_boundingbox(getattr(recobj,
-            self.parent.context.md_core_model['mappings']['pycsw:BoundingBox']),
-            self.parent.context.namespaces)
-
-            if bboxel is not None:
-                record.append(bboxel)
+            # pre-rendered csw:Record elementsets are CSW 2.0.2 documents
+            self._get_record_writer(queryables)(record, recobj)
 
             if self.parent.kvp['elementsetname'] != 'brief':  # add temporal extent
                 begin = util.getqattr(record, self.parent.context.md_core_model['mappings']['pycsw:TempExtent_begin'])
@@ -1623,10 +1625,75 @@ class Csw3(object):
 
         return record
 
+    def _get_record_writer(self, queryables):
+        ''' Compiled writer of the csw30:Record elements requested by
+        ElementName or ElementSetName, kept for the request '''
+
+        elementname = tuple(self.parent.kvp.get('elementname') or ())
+        key = (id(queryables), self.parent.kvp.get('elementsetname'),
+               elementname)
+        writer = self.record_writers.get(key)
+        if writer is None:
+            if elementname:
+                writer = self._compile_elementname_writer(queryables,
+                                                          elementname)
+            else:
+                writer = compile_record_writer(queryables,
+                         self.parent.kvp['elementsetname'],
+                         self.parent.context, write_boundingbox)
+            self.record_writers[key] = writer
+        return writer
+
+    def _get_profile_writer(self):
+        ''' Compiled writer of the records of the profile of OutputSchema,
+        kept for the request '''
+
+        outputschema = self.parent.kvp['outputschema']
+        key = (outputschema, self.parent.kvp['elementsetname'])
+        writer = self.record_writers.get(key)
+        if writer is None:
+            writer = self.parent.profiles['loaded'][outputschema].\
+            compile_record_writer(self.parent.kvp['elementsetname'],
+            outputschema, self.parent.repository.queryables['_all'])
+            self.record_writers[key] = writer
+        return writer
+
+    def _compile_elementname_writer(self, queryables, elementname):
+        ''' Compile the writer of the csw30:Record elements of ElementName '''
+
+        namespaces = self.parent.context.namespaces
+        qnames = util.get_qnames(namespaces)
+        fields = []
+        for req_term in ['dc:identifier', 'dc:title']:
+            if req_term not in elementname:
+                fields.append((qnames[req_term], queryables[req_term]['dbcol'],
+                               True))
+        for elemname in elementname:
+            if (elemname.find('BoundingBox') != -1 or
+                elemname.find('Envelope') != -1):
+                fields.append((None, self.parent.context.md_core_model[
+                               'mappings']['pycsw:BoundingBox'], False))
+            else:
+                fields.append((qnames[elemname],
+                               queryables[elemname]['dbcol'], False))
+
+        def writer(record, recobj):
+            for tag, column, required in fields:
+                value = util.getqattr(recobj, column)
+                if tag is None:
+                    bboxel = write_boundingbox(value, namespaces)
+                    if bboxel is not None:
+                        record.append(bboxel)
+                elif required or value:
+                    etree.SubElement(record, tag).text = value
+                else:
+                    etree.SubElement(record, tag)
+        return writer
+
     def _parse_constraint(self, element):
         ''' Parse csw:Constraint '''
 
-        query = {}
+        query = util.Constraint()
 
         tmp = element.find(util.nspath_eval('fes20:Filter', self.parent.context.namespaces))
         if tmp is not None:
@@ -1635,8 +1702,10 @@ class Csw3(object):
                 query['type'] = 'filter'
                 query['where'], query['values'] = fes2.parse(tmp,
                 self.parent.repository.queryables['_all'], self.parent.repository.dbtype,
-                self.parent.context.namespaces, self.parent.orm, self.parent.language['text'], self.parent.repository.fts)
-                query['_dict'] = xml2dict(etree.tostring(tmp), self.parent.context.namespaces)
+                self.parent.context.namespaces, self.parent.orm, self.parent.language['text'], self.parent.repository.fts,
+                getattr(self.parent.repository, 'spatial_index', None),
+                constraint=query if self.parent.spatial_ranking else None)
+                query.set_filter(tmp, self.parent.context.namespaces)
             except Exception as err:
                 return 'Invalid Filter request: %s' % err
 
@@ -1644,13 +1713,16 @@ class Csw3(object):
         if tmp is not None:
             LOGGER.debug('CQL specified: %s.', tmp.text)
             try:
-                LOGGER.info('Transforming CQL into OGC Filter')
+                LOGGER.info('Compiling CQL')
                 query['type'] = 'filter'
-                cql = cql2fes1(tmp.text, self.parent.context.namespaces)
-                query['where'], query['values'] = fes1.parse(cql,
+                query['where'], query['values'] = cql.parse(tmp.text,
                 self.parent.repository.queryables['_all'], self.parent.repository.dbtype,
-                self.parent.context.namespaces, self.parent.orm, self.parent.language['text'], self.parent.repository.fts)
-                query['_dict'] = xml2dict(etree.tostring(cql), self.parent.context.namespaces)
+                self.parent.orm, self.parent.language['text'], self.parent.repository.fts,
+                getattr(self.parent.repository, 'spatial_index', None),
+                constraint=query if self.parent.spatial_ranking else None)
+                query.set_filter(
+                functools.partial(cql.cql2fes1, tmp.text, self.parent.context.namespaces),
+                self.parent.context.namespaces)
             except Exception as err:
                 LOGGER.exception('Invalid CQL request: %s', tmp.text)
                 LOGGER.exception('Error message: %s', err)
@@ -1695,14 +1767,20 @@ class Csw3(object):
             len(doc.xpath('//csw30:Update/child::*',
             namespaces=self.parent.context.namespaces)) == 0:
 
-                LOGGER.info('Validating %s', postdata)
-                schema = etree.XMLSchema(file=schema)
-                parser = etree.XMLParser(schema=schema, resolve_entities=False)
-                if hasattr(self.parent, 'soap') and self.parent.soap:
-                # validate the body of the SOAP request
-                    doc = etree.fromstring(etree.tostring(doc), parser)
-                else:  # validate the request normally
-                    doc = etree.fromstring(postdata, parser)
+                if self.parent.xml_validation == 'structural':
+                    LOGGER.info('Checking structure of %s', postdata)
+                    util.check_xml_structure(
+                        doc, self.parent.context.namespaces['csw30'],
+                        REQUEST_ELEMENTS)
+                else:
+                    LOGGER.info('Validating %s', postdata)
+                    schema = util.get_xml_schema(schema)
+                    parser = etree.XMLParser(schema=schema, resolve_entities=False)
+                    if hasattr(self.parent, 'soap') and self.parent.soap:
+                    # validate the body of the SOAP request
+                        doc = etree.fromstring(etree.tostring(doc), parser)
+                    else:  # validate the request normally
+                        doc = etree.fromstring(postdata, parser)
                 LOGGER.debug('Request is valid XML')
             else:  # parse Transaction without validation
                 doc = etree.fromstring(postdata, self.parent.context.parser)
@@ -38,6 +38,12 @@ from pycsw.ogc.gml import gml3
 
 LOGGER = logging.getLogger(__name__)
 
+# number of compiled filters remembered, keyed by their shape
+FILTER_CACHE_SIZE = 256
+
+# compiled filters: where clause, parameter slots and ranking geometry
+COMPILED_FILTERS = util.LRUCache(FILTER_CACHE_SIZE)
+
 MODEL = {
     'GeometryOperands': {
         'values': gml3.TYPES
@@ -73,11 +79,59 @@ MODEL = {
 }
 
 
-def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='english', fts=False):
-    """OGC Filter object support"""
+def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='english', fts=False, spatial_index=None, constraint=None):
+    """OGC Filter object support
+
+    With constraint, the geometry of a spatial filter by which to rank
+    results is set in the constraint dict as 'ranking'
+
+    Filters are compiled once per shape into COMPILED_FILTERS: the
+    literals are left out of the key, and bound to the parameter slots
+    of the compiled filter"""
+
+    literals = []
+    positions = {}
+    signature = _get_filter_signature(element, queryables, nsmap, literals,
+                                      positions)
+    key = (signature, dbtype, orm, language, fts, repr(spatial_index))
+
+    compiled = COMPILED_FILTERS.get(key)
+    if compiled is None:
+        compiled = _compile_filter(element, queryables, dbtype, nsmap, orm,
+                                   language, fts, spatial_index, positions)
+        COMPILED_FILTERS.set(key, compiled)
+    LOGGER.debug('Compiled filters: %s', COMPILED_FILTERS.cache_info())
+
+    where, slots = compiled
+
+    spatial = {}  # geometry and parameter values of each spatial operator
+    for position, kind, args in slots:
+        if kind == 'spatial' and position not in spatial:
+            spatial[position] = _get_spatial_values(literals[position], nsmap)
+
+    #make decision to apply spatial ranking to results
+    if constraint is not None:
+        for position in sorted(spatial):
+            set_spatial_ranking(spatial[position][0], constraint)
+
+    values = [spatial[position][1][args[0]] if kind == 'spatial' else
+              _get_parameter_value(literals[position], kind, *args)
+              for position, kind, args in slots]
+
+    return where, values
+
+
+def _compile_filter(element, queryables, dbtype, nsmap, orm, language, fts,
+                    spatial_index, positions):
+    """return the where clause of a filter and its parameter slots: the
+    position of the literal bound to each parameter and how its value is
+    derived, as per _get_parameter_value, or the name of its value for
+    spatial operators, as per _get_spatial_values"""
 
     boq = None
     is_pg = dbtype.startswith('postgresql')
+    # on SQLite, fts is the name of the FTS5 table indexing anytext
+    sqlite_fts = fts if dbtype in ['sqlite', 'sqlite3'] and fts else None
 
     tmp = element.xpath('ogc:And|ogc:Or|ogc:Not', namespaces=nsmap)
     if len(tmp) > 0:  # this is binary logic query
@@ -96,6 +150,16 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
         pvalue_serial[0] += 1
         return param
 
+    def get_spatial_operator(elem, spatial_index=None):
+        """return the spatial predicate of elem, with its geometry and
+        distance bound as parameters"""
+        def bind(name):
+            slots.append((positions[elem], 'spatial', (name,)))
+            return assign_param()
+        return _get_spatial_operator(queryables['pycsw:BoundingBox'], elem,
+                                     dbtype, nsmap, bind,
+                                     spatial_index=spatial_index)
+
     def _get_comparison_expression(elem):
         """return the SQL expression based on Filter query"""
         fname = None
@@ -144,9 +208,10 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
                     boolean_true = 'true'
                     boolean_false = 'false'
 
-                return "%s = %s" % (_get_spatial_operator(queryables['pycsw:BoundingBox'], elem, dbtype, nsmap), boolean_true)
+                return "%s = %s" % (get_spatial_operator(elem, spatial_index=spatial_index), boolean_true)
             else:
-                pval = elem.find(util.nspath_eval('ogc:Literal', nsmap)).text
+                literal = elem.find(util.nspath_eval('ogc:Literal', nsmap))
+                pval = literal.text
 
         com_op = _get_comparison_operator(elem)
         LOGGER.debug('Comparison operator: %s', com_op)
@@ -165,32 +230,34 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
             com_op = 'between'
             lower_boundary = elem.find(
                 util.nspath_eval('ogc:LowerBoundary/ogc:Literal',
-                                 nsmap)).text
+                                 nsmap))
             upper_boundary = elem.find(
                 util.nspath_eval('ogc:UpperBoundary/ogc:Literal',
-                                 nsmap)).text
+                                 nsmap))
             expression = "%s %s %s and %s" % \
                            (pname, com_op, assign_param(), assign_param())
-            values.append(lower_boundary)
-            values.append(upper_boundary)
+            slots.append((positions[lower_boundary], 'literal', ()))
+            slots.append((positions[upper_boundary], 'literal', ()))
         else:
+            fts_phrase = None
+            if pname == anytext and sqlite_fts and fname is None:
+                fts_phrase = _get_fts_phrase(pval, wildcard, singlechar)
+
             if pname == anytext and is_pg and fts:
                 LOGGER.debug('PostgreSQL FTS specific search')
                 # do nothing, let FTS do conversion (#212)
-                pvalue = pval
+                kind = 'literal'
+            elif fts_phrase is not None:
+                LOGGER.debug('SQLite FTS specific search')
+                kind = 'fts'
+            elif pname == anytext:  # pad anytext with wildcards
+                LOGGER.debug('PostgreSQL non-FTS specific anytext search')
+                kind = 'anytext'
             else:
                 LOGGER.debug('PostgreSQL non-FTS specific search')
-                pvalue = pval.replace(wildcard, '%').replace(singlechar, '_')
-
-                if pname == anytext:  # pad anytext with wildcards
-                    LOGGER.debug('PostgreSQL non-FTS specific anytext search')
-                    LOGGER.debug('old value: %s', pval)
-
-                    pvalue = '%%%s%%' % pvalue.rstrip('%').lstrip('%')
+                kind = 'wildcard'
 
-                    LOGGER.debug('new value: %s', pvalue)
-
-            values.append(pvalue)
+            slots.append((positions[literal], kind, (wildcard, singlechar)))
 
             if boq == ' not ':
                 if fname is not None:
@@ -200,6 +267,10 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
                     LOGGER.debug('PostgreSQL FTS specific search')
                     expression = ("%s is null or not plainto_tsquery('%s', %s) @@ anytext_tsvector" %
                                   (anytext, language, assign_param()))
+                elif fts_phrase is not None:
+                    LOGGER.debug('SQLite FTS specific search')
+                    expression = ("%s is null or not rowid in (select rowid from %s where %s match %s)" %
+                                  (anytext, sqlite_fts, sqlite_fts, assign_param()))
                 else:
                     LOGGER.debug('PostgreSQL non-FTS specific search')
                     expression = "%s is null or not %s %s %s" % \
@@ -212,6 +283,10 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
                     LOGGER.debug('PostgreSQL FTS specific search')
                     expression = ("plainto_tsquery('%s', %s) @@ anytext_tsvector" %
                                   (language, assign_param()))
+                elif fts_phrase is not None:
+                    LOGGER.debug('SQLite FTS specific search')
+                    expression = ("rowid in (select rowid from %s where %s match %s)" %
+                                  (sqlite_fts, sqlite_fts, assign_param()))
                 else:
                     LOGGER.debug('PostgreSQL non-FTS specific search')
                     expression = "%s %s %s" % (pname, com_op, assign_param())
@@ -220,7 +295,7 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
 
     queries = []
     queries_nested = []
-    values = []
+    slots = []
 
     LOGGER.debug('Scanning children elements')
     for child in tmp.xpath('child::*'):
@@ -240,9 +315,8 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
                     MODEL['SpatialOperators']['values']]:
                 LOGGER.debug('ogc:Not / spatial operator detected: %s', child.tag)
                 queries.append("%s = %s" %
-                               (_get_spatial_operator(
-                                   queryables['pycsw:BoundingBox'],
-                                   child.xpath('child::*')[0], dbtype, nsmap),
+                               (get_spatial_operator(
+                                   child.xpath('child::*')[0]),
                                    boolean_false))
             else:
                 LOGGER.debug('ogc:Not / comparison operator detected: %s', child.tag)
@@ -259,25 +333,23 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
                 if dbtype == 'postgresql+postgis+wkt':
                     LOGGER.debug('Setting bbox is null test in PostgreSQL')
                     queries.append("%s = %s or %s is null" %
-                                   (_get_spatial_operator(
-                                       queryables['pycsw:BoundingBox'],
-                                       child, dbtype, nsmap), boolean_false,
-                                       queryables['pycsw:BoundingBox']))
+                                   (get_spatial_operator(child),
+                                    boolean_false,
+                                    queryables['pycsw:BoundingBox']))
                 else:
                     queries.append("%s = %s" %
-                                   (_get_spatial_operator(
-                                       queryables['pycsw:BoundingBox'],
-                                       child, dbtype, nsmap), boolean_false))
+                                   (get_spatial_operator(child),
+                                    boolean_false))
             else:
                 queries.append("%s = %s" %
-                               (_get_spatial_operator(
-                                   queryables['pycsw:BoundingBox'],
-                                   child, dbtype, nsmap), boolean_true))
+                               (get_spatial_operator(
+                                   child, spatial_index=spatial_index),
+                                   boolean_true))
 
         elif child.tag == util.nspath_eval('ogc:FeatureId', nsmap):
             LOGGER.debug('ogc:FeatureId filter detected')
             queries.append("%s = %s" % (queryables['pycsw:Identifier'], assign_param()))
-            values.append(child.attrib.get('fid'))
+            slots.append((positions[child], 'literal', ()))
         else:  # comparison operator
             LOGGER.debug('Comparison operator processing')
             child_tag_name = etree.QName(child).localname
@@ -293,11 +365,18 @@ def parse(element, queryables, dbtype, nsmap, orm='sqlalchemy', language='englis
     where = boq.join(queries) if (boq is not None and boq != ' not ') \
         else queries[0]
 
-    return where, values
+    return where, slots
+
 
+def _get_spatial_operator(geomattr, element, dbtype, nsmap, bind, postgis_geometry_column='wkb_geometry', spatial_index=None):
+    """return the spatial predicate function
 
-def _get_spatial_operator(geomattr, element, dbtype, nsmap, postgis_geometry_column='wkb_geometry'):
-    """return the spatial predicate function"""
+    The query geometry, distance and envelope are not written into the
+    expression: bind(name) returns the parameter bound to the value name
+    of the operator, as per _get_spatial_values
+
+    With a spatial_index, the expression is only valid for matching
+    (= true) comparisons, as records outside the envelope are left out"""
     property_name = element.find(util.nspath_eval('ogc:PropertyName', nsmap))
     distance = element.find(util.nspath_eval('ogc:Distance', nsmap))
 
@@ -312,15 +391,25 @@ def _get_spatial_operator(geomattr, element, dbtype, nsmap, postgis_geometry_col
         raise RuntimeError('Invalid ogc:PropertyName in spatial filter: %s' %
                            property_name.text)
 
-    geometry = gml3.Geometry(element, nsmap)
-
-    #make decision to apply spatial ranking to results
-    set_spatial_ranking(geometry)
-
     spatial_predicate = etree.QName(element).localname.lower()
 
     LOGGER.debug('Spatial predicate: %s', spatial_predicate)
 
+    return _get_spatial_expression(geomattr, spatial_predicate, distance,
+                                   dbtype, bind, postgis_geometry_column,
+                                   spatial_index)
+
+
+def _get_spatial_expression(geomattr, spatial_predicate, distance, dbtype,
+                            bind, postgis_geometry_column='wkb_geometry',
+                            spatial_index=None):
+    """return the SQL of a spatial predicate (lower case operator name),
+    with its values bound as parameters by bind(name)"""
+
+    # bound first, as the indexed envelope test leads the expression
+    index_query = _get_spatial_index_query(spatial_index, spatial_predicate,
+                                           distance, bind)
+
     if dbtype == 'mysql':  # adjust spatial query for MySQL
         LOGGER.debug('Adjusting spatial query for MySQL')
         if spatial_predicate == 'bbox':
@@ -328,16 +417,16 @@ def _get_spatial_operator(geomattr, element, dbtype, nsmap, postgis_geometry_col
 
         if spatial_predicate == 'beyond':
             spatial_query = "ifnull(distance(geomfromtext(%s), \
-            geomfromtext('%s')) > convert(%s, signed),false)" % \
-                (geomattr, geometry.wkt, distance)
+            geomfromtext(%s)) > convert(%s, signed),false)" % \
+                (geomattr, bind('wkt'), bind('distance'))
         elif spatial_predicate == 'dwithin':
             spatial_query = "ifnull(distance(geomfromtext(%s), \
-            geomfromtext('%s')) <= convert(%s, signed),false)" % \
-                (geomattr, geometry.wkt, distance)
+            geomfromtext(%s)) <= convert(%s, signed),false)" % \
+                (geomattr, bind('wkt'), bind('distance'))
         else:
             spatial_query = "ifnull(%s(geomfromtext(%s), \
-            geomfromtext('%s')),false)" % \
-                (spatial_predicate, geomattr, geometry.wkt)
+            geomfromtext(%s)),false)" % \
+                (spatial_predicate, geomattr, bind('wkt'))
 
     elif dbtype == 'postgresql+postgis+wkt':  # adjust spatial query for PostGIS with WKT geometry column
         LOGGER.debug('Adjusting spatial query for PostgreSQL+PostGIS+WKT')
@@ -346,16 +435,16 @@ def _get_spatial_operator(geomattr, element, dbtype, nsmap, postgis_geometry_col
 
         if spatial_predicate == 'beyond':
             spatial_query = "not st_dwithin(st_geomfromtext(%s), \
-            st_geomfromtext('%s'), %f)" % \
-                (geomattr, geometry.wkt, float(distance))
+            st_geomfromtext(%s), %s)" % \
+                (geomattr, bind('wkt'), _bind_distance(distance, bind))
         elif spatial_predicate == 'dwithin':
             spatial_query = "st_dwithin(st_geomfromtext(%s), \
-            st_geomfromtext('%s'), %f)" % \
-                (geomattr, geometry.wkt, float(distance))
+            st_geomfromtext(%s), %s)" % \
+                (geomattr, bind('wkt'), _bind_distance(distance, bind))
         else:
             spatial_query = "st_%s(st_geomfromtext(%s), \
-            st_geomfromtext('%s'))" % \
-                (spatial_predicate, geomattr, geometry.wkt)
+            st_geomfromtext(%s))" % \
+                (spatial_predicate, geomattr, bind('wkt'))
 
     elif dbtype == 'postgresql+postgis+native':  # adjust spatial query for PostGIS with native geometry
         LOGGER.debug('Adjusting spatial query for PostgreSQL+PostGIS+native')
@@ -364,53 +453,235 @@ def _get_spatial_operator(geomattr, element, dbtype, nsmap, postgis_geometry_col
 
         if spatial_predicate == 'beyond':
             spatial_query = "not st_dwithin(%s, \
-            st_geomfromtext('%s',4326), %f)" % \
-                (postgis_geometry_column, geometry.wkt, float(distance))
+            st_geomfromtext(%s,4326), %s)" % \
+                (postgis_geometry_column, bind('wkt'),
+                 _bind_distance(distance, bind))
         elif spatial_predicate == 'dwithin':
             spatial_query = "st_dwithin(%s, \
-            st_geomfromtext('%s',4326), %f)" % \
-                (postgis_geometry_column, geometry.wkt, float(distance))
+            st_geomfromtext(%s,4326), %s)" % \
+                (postgis_geometry_column, bind('wkt'),
+                 _bind_distance(distance, bind))
         else:
             spatial_query = "st_%s(%s, \
-            st_geomfromtext('%s',4326))" % \
-                (spatial_predicate, postgis_geometry_column, geometry.wkt)
+            st_geomfromtext(%s,4326))" % \
+                (spatial_predicate, postgis_geometry_column, bind('wkt'))
 
     else:
         LOGGER.debug('Adjusting spatial query')
-        spatial_query = "query_spatial(%s,'%s','%s','%s')" % \
-                        (geomattr, geometry.wkt, spatial_predicate, distance)
+        spatial_query = "query_spatial(%s,%s,'%s',%s)" % \
+                        (geomattr, bind('wkt'), spatial_predicate,
+                         bind('distance'))
+
+    if index_query is not None:
+        # lead with the indexed envelope test, so that the exact predicate
+        # only runs on candidate rows
+        spatial_query = '%s and %s' % (index_query, spatial_query)
 
     return spatial_query
 
 
+def _bind_distance(distance, bind):
+    """return the parameter bound to a numeric distance"""
+
+    try:
+        float(distance)
+    except (TypeError, ValueError):
+        raise RuntimeError('Invalid ogc:Distance: %s' % distance)
+    return bind('distance_value')
+
+
+def _get_spatial_index_query(spatial_index, spatial_predicate, distance,
+                             bind):
+    """return the indexed test of rows whose envelope may satisfy the
+    spatial predicate, or None if the index cannot narrow the query"""
+
+    if spatial_index is None or spatial_predicate in ['beyond', 'disjoint']:
+        return None
+
+    if spatial_predicate == 'dwithin':
+        try:
+            float(distance)
+        except (TypeError, ValueError) as err:
+            LOGGER.debug('Spatial index not used: %s', err)
+            return None
+
+    if spatial_index['type'] == 'rtree':
+        return "rowid in (select id from %s where minx <= %s and \
+        maxx >= %s and miny <= %s and maxy >= %s)" % \
+            (spatial_index['table'], bind('maxx'), bind('minx'), bind('maxy'),
+             bind('miny'))
+
+    # records whose envelope is not filled in are left to the exact predicate
+    columns = spatial_index['columns']
+    return "(%s is null or %s <= %s and %s >= %s and %s <= %s and %s >= %s)" \
+        % (columns[0], columns[0], bind('maxx'), columns[2], bind('minx'),
+           columns[1], bind('maxy'), columns[3], bind('miny'))
+
+
+def _get_spatial_values(element, nsmap):
+    """return the geometry of a spatial operator, and the values of the
+    parameters bound to it: its WKT, distance (also as a number, if any)
+    and envelope, grown by the distance of ogc:DWithin"""
+
+    geometry = gml3.Geometry(element, nsmap)
+    distance = element.find(util.nspath_eval('ogc:Distance', nsmap))
+    distance = 'false' if distance is None else distance.text
+
+    return geometry, _get_spatial_parameters(
+        geometry.wkt, etree.QName(element).localname.lower(), distance)
+
+
+def _get_spatial_parameters(wkt, spatial_predicate, distance):
+    """return the values of the parameters bound to a spatial predicate"""
+
+    try:
+        distance_value = float(distance)
+    except (TypeError, ValueError):
+        distance_value = None
+
+    minx, miny, maxx, maxy = util.wkt2geom(wkt)
+    if distance_value is not None and spatial_predicate == 'dwithin':
+        minx, miny = minx - distance_value, miny - distance_value
+        maxx, maxy = maxx + distance_value, maxy + distance_value
+
+    return {
+        'wkt': wkt,
+        'distance': distance,
+        'distance_value': distance_value,
+        'minx': minx,
+        'miny': miny,
+        'maxx': maxx,
+        'maxy': maxy
+    }
+
+
+def _get_fts_phrase(pval, wildcard, singlechar):
+    """return the SQLite FTS5 (trigram) phrase matching a csw:AnyText
+    value anywhere in the text, or None if the value has inner wildcards
+    or is too short to be looked up in the index"""
+
+    if pval is None:
+        return None
+
+    literal = pval.replace(wildcard, '%').replace(singlechar, '_').strip('%')
+    if len(literal) < 3 or '%' in literal or '_' in literal:
+        return None
+
+    return '"%s"' % literal.replace('"', '""')
+
+
+def _get_parameter_value(pval, kind, wildcard=None, singlechar=None):
+    """return the value of a query parameter bound to a filter literal"""
+
+    if kind == 'fts':
+        return _get_fts_phrase(pval, wildcard, singlechar)
+
+    if kind in ['wildcard', 'anytext']:
+        pvalue = pval.replace(wildcard, '%').replace(singlechar, '_')
+        if kind == 'anytext':
+            pvalue = '%%%s%%' % pvalue.rstrip('%').lstrip('%')
+        return pvalue
+
+    return pval
+
+
+def _get_filter_signature(element, queryables, nsmap, literals, positions):
+    """return the signature of a filter's shape, without its literals
+
+    Literals, and the elements of spatial operators, are appended to
+    literals in document order, and their elements mapped to their
+    position in positions.  The signature keeps whether a literal can be
+    looked up in the SQLite FTS index, whether a distance is a number,
+    and the columns of the queryables the filter uses"""
+
+    literal_tag = util.nspath_eval('ogc:Literal', nsmap)
+    featureid_tag = util.nspath_eval('ogc:FeatureId', nsmap)
+    propertyname_tag = util.nspath_eval('ogc:PropertyName', nsmap)
+    distance_tag = util.nspath_eval('ogc:Distance', nsmap)
+    spatial_tags = [util.nspath_eval('ogc:%s' % n, nsmap) for n in
+                    MODEL['SpatialOperators']['values']]
+
+    def get_dbcol(name):
+        queryable = queryables.get(name)
+        if isinstance(queryable, dict):
+            return queryable.get('dbcol')
+        return queryable
+
+    anytext = get_dbcol('csw:AnyText')
+
+    def is_number(text):
+        try:
+            float(text)
+        except (TypeError, ValueError):
+            return False
+        return True
+
+    def get_signature(elem, spatial=False):
+        attrib = sorted(elem.attrib.items())
+        if elem.tag in spatial_tags:
+            positions[elem] = len(literals)
+            literals.append(elem)
+            spatial = True
+            text = None
+        elif elem.tag == literal_tag:
+            pval = elem.text
+            positions[elem] = len(literals)
+            literals.append(pval)
+            text = 'null' if pval is None else 'literal'
+            parent = elem.getparent()
+            if pval is not None and parent is not None and \
+               anytext is not None and \
+               get_dbcol(parent.findtext(propertyname_tag)) == anytext:
+                wildcard = parent.get('wildCard')
+                singlechar = parent.get('singleChar')
+                if _get_fts_phrase(pval, '%' if wildcard is None else wildcard,
+                                   '_' if singlechar is None else singlechar):
+                    text = 'fts'
+        elif elem.tag == featureid_tag:
+            attrib = [item for item in attrib if item[0] != 'fid']
+            positions[elem] = len(literals)
+            literals.append(elem.get('fid'))
+            text = None
+        elif elem.tag == propertyname_tag:
+            text = (elem.text, get_dbcol(elem.text))
+        elif elem.tag == distance_tag:
+            text = is_number(elem.text)
+        elif spatial:  # coordinates are bound as parameters
+            text = None
+        else:
+            text = (elem.text or '').strip()
+        return (elem.tag, tuple(attrib), text,
+                tuple(get_signature(child, spatial)
+                      for child in elem.iterchildren('*')))
+
+    return (get_signature(element), anytext,
+            get_dbcol('pycsw:BoundingBox'), get_dbcol('pycsw:Identifier'))
+
+
 def _get_comparison_operator(element):
     """return the SQL operator based on Filter query"""
 
     element_name = etree.QName(element).localname
     return MODEL['ComparisonOperators']['ogc:%s' % element_name]['opvalue']
 
-def set_spatial_ranking(geometry):
+def set_spatial_ranking(geometry, constraint):
     """Given that we have a spatial query in ogc:Filter we check the type of geometry
-    and set the ranking variables"""
-
-    if util.ranking_enabled:
-        if geometry.type in ['Polygon', 'Envelope']:
-            util.ranking_pass = True
-            util.ranking_query_geometry = geometry.wkt
-        elif geometry.type in ['LineString', 'Point']:
-            from shapely.geometry.base import BaseGeometry
-            from shapely.geometry import box
-            from shapely.wkt import loads,dumps
-            ls = loads(geometry.wkt)
-            b = ls.bounds
-            if geometry.type == 'LineString':
-                tmp_box = box(b[0],b[1],b[2],b[3])
-                tmp_wkt = dumps(tmp_box)
-                if tmp_box.area > 0:
-                    util.ranking_pass = True
-                    util.ranking_query_geometry = tmp_wkt
-            elif geometry.type == 'Point':
-                tmp_box = box((float(b[0])-1.0),(float(b[1])-1.0),(float(b[2])+1.0),(float(b[3])+1.0))
-                tmp_wkt = dumps(tmp_box)
-                util.ranking_pass = True
-                util.ranking_query_geometry = tmp_wkt
+    and set the ranking geometry of the constraint"""
+
+    if geometry.type in ['Polygon', 'Envelope']:
+        constraint['ranking'] = geometry.wkt
+    elif geometry.type in ['LineString', 'Point']:
+        from shapely.geometry.base import BaseGeometry
+        from shapely.geometry import box
+        from shapely.wkt import loads,dumps
+        ls = loads(geometry.wkt)
+        b = ls.bounds
+        if geometry.type == 'LineString':
+            tmp_box = box(b[0],b[1],b[2],b[3])
+            tmp_wkt = dumps(tmp_box)
+            if tmp_box.area > 0:
+                constraint['ranking'] = tmp_wkt
+        elif geometry.type == 'Point':
+            tmp_box = box((float(b[0])-1.0),(float(b[1])-1.0),(float(b[2])+1.0),(float(b[3])+1.0))
+            tmp_wkt = dumps(tmp_box)
+            constraint['ranking'] = tmp_wkt
@@ -43,12 +43,12 @@ class OpenSearch(object):
     def __init__(self, context):
         """initialize"""
 
-        self.namespaces = {
+        self.namespaces = util.Namespaces({
             'atom': 'http://www.w3.org/2005/Atom',
             'geo': 'http://a9.com/-/opensearch/extensions/geo/1.0/',
             'os': 'http://a9.com/-/spec/opensearch/1.1/',
             'time': 'http://a9.com/-/opensearch/extensions/time/1.0/'
-        }
+        })
 
         self.context = context
         self.context.namespaces.update(self.namespaces)
@@ -33,7 +33,10 @@ from pycsw.core import util
 from pycsw.core.etree import etree
 
 NAMESPACE = 'http://www.w3.org/2005/Atom'
-NAMESPACES = {'atom': NAMESPACE, 'georss': 'http://www.georss.org/georss'}
+NAMESPACES = util.Namespaces({'atom': NAMESPACE, 'georss': 'http://www.georss.org/georss'})
+
+# typename of the records presented as is
+TYPENAME = 'atom:entry'
 
 XPATH_MAPPINGS = {
     'pycsw:Identifier': 'atom:id',
@@ -53,7 +56,7 @@ def write_record(result, esn, context, url=None):
 
     typename = util.getqattr(result, context.md_core_model['mappings']['pycsw:Typename'])
 
-    if esn == 'full' and typename == 'atom:entry':
+    if esn == 'full' and typename == TYPENAME:
         # dump record as is and exit
         return etree.fromstring(util.getqattr(result, context.md_core_model['mappings']['pycsw:XML']), context.parser)
 
@@ -32,7 +32,10 @@ from pycsw.core import util
 from pycsw.core.etree import etree
 
 NAMESPACE = 'http://gcmd.gsfc.nasa.gov/Aboutus/xml/dif/'
-NAMESPACES = {'dif': NAMESPACE}
+NAMESPACES = util.Namespaces({'dif': NAMESPACE})
+
+# typename of the records presented as is
+TYPENAME = 'dif:DIF'
 
 XPATH_MAPPINGS = {
     'pycsw:Title': 'dif:Entry_Title',
@@ -56,7 +59,7 @@ def write_record(result, esn, context, url=None):
 
     typename = util.getqattr(result, context.md_core_model['mappings']['pycsw:Typename'])
 
-    if esn == 'full' and typename == 'dif:DIF':
+    if esn == 'full' and typename == TYPENAME:
         # dump record as is and exit
         return etree.fromstring(util.getqattr(result, context.md_core_model['mappings']['pycsw:XML']), context.parser)
 
@@ -33,7 +33,10 @@ from pycsw.core.etree import etree
 
 #NAMESPACE = 'http://www.fgdc.gov/metadata/csdgm'
 NAMESPACE = 'http://www.opengis.net/cat/csw/csdgm'
-NAMESPACES = {'fgdc': NAMESPACE}
+NAMESPACES = util.Namespaces({'fgdc': NAMESPACE})
+
+# typename of the records presented as is
+TYPENAME = 'fgdc:metadata'
 
 XPATH_MAPPINGS = {
     'pycsw:Identifier': 'idinfo/datasetid',
@@ -57,7 +60,7 @@ XPATH_MAPPINGS = {
 def write_record(recobj, esn, context, url=None):
     ''' Return csw:SearchResults child as lxml.etree.Element '''
     typename = util.getqattr(recobj, context.md_core_model['mappings']['pycsw:Typename'])
-    if esn == 'full' and typename == 'fgdc:metadata':
+    if esn == 'full' and typename == TYPENAME:
         # dump record as is and exit
         return etree.fromstring(util.getqattr(recobj, context.md_core_model['mappings']['pycsw:XML']), context.parser)
 
@@ -32,7 +32,10 @@ from pycsw.core import util
 from pycsw.core.etree import etree
 
 NAMESPACE = 'http://www.interlis.ch/INTERLIS2.3'
-NAMESPACES = {'gm03': NAMESPACE}
+NAMESPACES = util.Namespaces({'gm03': NAMESPACE})
+
+# typename of the records presented as is
+TYPENAME = 'gm03:TRANSFER'
 
 XPATH_MAPPINGS = {}
 
@@ -41,7 +44,7 @@ def write_record(result, esn, context, url=None):
 
     typename = util.getqattr(result, context.md_core_model['mappings']['pycsw:Typename'])
 
-    if typename == 'gm03:TRANSFER':
+    if typename == TYPENAME:
         # dump record as is and exit
         # TODO: provide brief and summary elementsetname's
         return etree.fromstring(util.getqattr(result, context.md_core_model['mappings']['pycsw:XML']), context.parser)
@@ -43,13 +43,13 @@ class APISO(profile.Profile):
     def __init__(self, model, namespaces, context):
         self.context = context
 
-        self.namespaces = {
+        self.namespaces = util.Namespaces({
             'apiso': 'http://www.opengis.net/cat/csw/apiso/1.0',
             'gco': 'http://www.isotc211.org/2005/gco',
             'gmd': 'http://www.isotc211.org/2005/gmd',
             'srv': 'http://www.isotc211.org/2005/srv',
             'xlink': 'http://www.w3.org/1999/xlink'
-        }
+        })
 
         self.inspire_namespaces = {
             'inspire_ds': 'http://inspire.ec.europa.eu/schemas/inspire_ds/1.0',
@@ -382,308 +382,366 @@ class APISO(profile.Profile):
 
     def write_record(self, result, esn, outputschema, queryables, caps=None):
         ''' Return csw:SearchResults child as lxml.etree.Element '''
-        typename = util.getqattr(result, self.context.md_core_model['mappings']['pycsw:Typename'])
-        is_iso_anyway = False
-
-        xml_blob = util.getqattr(result, self.context.md_core_model['mappings']['pycsw:XML'])
-        if caps is None and xml_blob is not None and xml_blob.startswith(b'<gmd:MD_Metadata'):
-            is_iso_anyway = True
-
-        if (esn == 'full' and (typename == 'gmd:MD_Metadata' or is_iso_anyway)):
-            # dump record as is and exit
-            return etree.fromstring(xml_blob, self.context.parser)
-
-        node = etree.Element(util.nspath_eval('gmd:MD_Metadata', self.namespaces))
-        node.attrib[util.nspath_eval('xsi:schemaLocation', self.context.namespaces)] = \
-        '%s %s/csw/2.0.2/profiles/apiso/1.0.0/apiso.xsd' % (self.namespace, self.ogc_schemas_base)
-
-        # identifier
-        idval = util.getqattr(result, self.context.md_core_model['mappings']['pycsw:Identifier'])
-
-        identifier = etree.SubElement(node, util.nspath_eval('gmd:fileIdentifier', self.namespaces))
-        etree.SubElement(identifier, util.nspath_eval('gco:CharacterString', self.namespaces)).text = idval
-
-        if esn in ['summary', 'full']:
-            # language
-            val = util.getqattr(result, queryables['apiso:Language']['dbcol'])
-
-            lang = etree.SubElement(node, util.nspath_eval('gmd:language', self.namespaces))
-            etree.SubElement(lang, util.nspath_eval('gco:CharacterString', self.namespaces)).text = val
-
-        # hierarchyLevel
-        mtype = util.getqattr(result, queryables['apiso:Type']['dbcol']) or None
-
-        if mtype is not None:
-            if mtype == 'http://purl.org/dc/dcmitype/Dataset':
-                mtype = 'dataset'
-            hierarchy = etree.SubElement(node, util.nspath_eval('gmd:hierarchyLevel', self.namespaces))
-            hierarchy.append(_write_codelist_element('gmd:MD_ScopeCode', mtype, self.namespaces))
-
-        if esn in ['summary', 'full']:
-            # contact
-            contact = etree.SubElement(node, util.nspath_eval('gmd:contact', self.namespaces))
-            if caps is not None:
-                CI_resp = etree.SubElement(contact, util.nspath_eval('gmd:CI_ResponsibleParty', self.namespaces))
-                if hasattr(caps.provider.contact, 'name'):
-                    ind_name = etree.SubElement(CI_resp, util.nspath_eval('gmd:individualName', self.namespaces))
-                    etree.SubElement(ind_name, util.nspath_eval('gco:CharacterString', self.namespaces)).text = caps.provider.contact.name
-                if hasattr(caps.provider.contact, 'organization'):
-                    if caps.provider.contact.organization is not None:
-                        org_val = caps.provider.contact.organization
-                    else:
-                        org_val = caps.provider.name
-                    org_name = etree.SubElement(CI_resp, util.nspath_eval('gmd:organisationName', self.namespaces))
-                    etree.SubElement(org_name, util.nspath_eval('gco:CharacterString', self.namespaces)).text = org_val
-                if hasattr(caps.provider.contact, 'position'):
-                    pos_name = etree.SubElement(CI_resp, util.nspath_eval('gmd:positionName', self.namespaces))
-                    etree.SubElement(pos_name, util.nspath_eval('gco:CharacterString', self.namespaces)).text = caps.provider.contact.position
-                contact_info = etree.SubElement(CI_resp, util.nspath_eval('gmd:contactInfo', self.namespaces))
-                ci_contact = etree.SubElement(contact_info, util.nspath_eval('gmd:CI_Contact', self.namespaces))
-                if hasattr(caps.provider.contact, 'phone'):
-                    phone = etree.SubElement(ci_contact, util.nspath_eval('gmd:phone', self.namespaces))
-                    ci_phone = etree.SubElement(phone, util.nspath_eval('gmd:CI_Telephone', self.namespaces))
-                    voice = etree.SubElement(ci_phone, util.nspath_eval('gmd:voice', self.namespaces))
-                    etree.SubElement(voice, util.nspath_eval('gco:CharacterString', self.namespaces)).text = caps.provider.contact.phone
-                    if hasattr(caps.provider.contact, 'fax'):
-                        fax = etree.SubElement(ci_phone, util.nspath_eval('gmd:facsimile', self.namespaces))
-                        etree.SubElement(fax, util.nspath_eval('gco:CharacterString', self.namespaces)).text = caps.provider.contact.fax
-                address = etree.SubElement(ci_contact, util.nspath_eval('gmd:address', self.namespaces))
-                ci_address = etree.SubElement(address, util.nspath_eval('gmd:CI_Address', self.namespaces))
-                if hasattr(caps.provider.contact, 'address'):
-                    delivery_point = etree.SubElement(ci_address, util.nspath_eval('gmd:deliveryPoint', self.namespaces))
-                    etree.SubElement(delivery_point, util.nspath_eval('gco:CharacterString', self.namespaces)).text = caps.provider.contact.address
-                if hasattr(caps.provider.contact, 'city'):
-                    city = etree.SubElement(ci_address, util.nspath_eval('gmd:city', self.namespaces))
-                    etree.SubElement(city, util.nspath_eval('gco:CharacterString', self.namespaces)).text = caps.provider.contact.city
-                if hasattr(caps.provider.contact, 'region'):
-                    admin_area = etree.SubElement(ci_address, util.nspath_eval('gmd:administrativeArea', self.namespaces))
-                    etree.SubElement(admin_area, util.nspath_eval('gco:CharacterString', self.namespaces)).text = caps.provider.contact.region
-                if hasattr(caps.provider.contact, 'postcode'):
-                    postal_code = etree.SubElement(ci_address, util.nspath_eval('gmd:postalCode', self.namespaces))
-                    etree.SubElement(postal_code, util.nspath_eval('gco:CharacterString', self.namespaces)).text = caps.provider.contact.postcode
-                if hasattr(caps.provider.contact, 'country'):
-                    country = etree.SubElement(ci_address, util.nspath_eval('gmd:country', self.namespaces))
-                    etree.SubElement(country, util.nspath_eval('gco:CharacterString', self.namespaces)).text = caps.provider.contact.country
-                if hasattr(caps.provider.contact, 'email'):
-                    email = etree.SubElement(ci_address, util.nspath_eval('gmd:electronicMailAddress', self.namespaces))
-                    etree.SubElement(email, util.nspath_eval('gco:CharacterString', self.namespaces)).text = caps.provider.contact.email
-
-                contact_url = None
-                if hasattr(caps.provider, 'url'):
-                    contact_url = caps.provider.url
-                if hasattr(caps.provider.contact, 'url') and caps.provider.contact.url is not None:
-                    contact_url = caps.provider.contact.url
-
-                if contact_url is not None:
-                    online_resource = etree.SubElement(ci_contact, util.nspath_eval('gmd:onlineResource', self.namespaces))
-                    gmd_linkage = etree.SubElement(online_resource, util.nspath_eval('gmd:linkage', self.namespaces))
-                    etree.SubElement(gmd_linkage, util.nspath_eval('gmd:URL', self.namespaces)).text = contact_url
-
-                if hasattr(caps.provider.contact, 'role'):
-                    role = etree.SubElement(CI_resp, util.nspath_eval('gmd:role', self.namespaces))
-                    role_val = caps.provider.contact.role
-                    if role_val is None:
-                        role_val = 'pointOfContact'
-                    etree.SubElement(role, util.nspath_eval('gmd:CI_RoleCode', self.namespaces), codeListValue=role_val, codeList='%s#CI_RoleCode' % CODELIST).text = role_val
-            else:
-                val = util.getqattr(result, queryables['apiso:OrganisationName']['dbcol'])
+        return self.compile_record_writer(esn, outputschema, queryables,
+                                          caps)(result)
+
+    def compile_record_writer(self, esn, outputschema, queryables, caps=None):
+        ''' Compile the writer of gmd:MD_Metadata records of an elementset
+
+        Columns, tag names and elementset branches are resolved once, into
+        a function of repository record result returning the record
+        element, as write_record does.
+        '''
+
+        qnames = self.namespaces.qnames
+        mappings = self.context.md_core_model['mappings']
+        summary = esn in ['summary', 'full']
+
+        def column(name):
+            return queryables[name]['dbcol']
+
+        typename_col = mappings['pycsw:Typename']
+        xml_col = mappings['pycsw:XML']
+        identifier_col = mappings['pycsw:Identifier']
+        source_col = mappings['pycsw:Source']
+        links_col = mappings['pycsw:Links']
+        (language_col, type_col, organisation_col, modified_col, title_col,
+         creation_col, publication_col, revision_col, abstract_col,
+         subject_col, denominator_col, resource_language_col,
+         topic_category_col, bbox_col, service_type_col,
+         service_type_version_col, coupling_type_col, operates_on_col,
+         operation_col) = [column('apiso:%s' % name) for name in [
+            'Language', 'Type', 'OrganisationName', 'Modified', 'Title',
+            'CreationDate', 'PublicationDate', 'RevisionDate', 'Abstract',
+            'Subject', 'Denominator', 'ResourceLanguage', 'TopicCategory',
+            'BoundingBox', 'ServiceType', 'ServiceTypeVersion',
+            'CouplingType', 'OperatesOn', 'Operation']]
+
+        schema_location_tag = util.nspath_eval('xsi:schemaLocation',
+                                               self.context.namespaces)
+        schema_location = '%s %s/csw/2.0.2/profiles/apiso/1.0.0/apiso.xsd' % (
+            self.namespace, self.ogc_schemas_base)
+        string_tag = qnames['gco:CharacterString']
+        metadata_tag = qnames['gmd:MD_Metadata']
+        (file_identifier_tag, language_tag, hierarchy_level_tag, contact_tag,
+         responsible_party_tag, organisation_name_tag, date_stamp_tag,
+         standard_name_tag, standard_version_tag, identification_tag,
+         citation_tag, ci_citation_tag, title_tag, abstract_tag,
+         keywords_tag, spatial_resolution_tag, resolution_tag,
+         equivalent_scale_tag, fraction_tag, denominator_tag,
+         topic_category_tag, topic_category_code_tag, distribution_tag,
+         md_distribution_tag, transfer_options_tag, digital_transfer_tag,
+         online_tag, online_resource_tag, linkage_tag, url_tag, protocol_tag,
+         name_tag, description_tag) = [qnames['gmd:%s' % name] for name in [
+            'fileIdentifier', 'language', 'hierarchyLevel', 'contact',
+            'CI_ResponsibleParty', 'organisationName', 'dateStamp',
+            'metadataStandardName', 'metadataStandardVersion',
+            'identificationInfo', 'citation', 'CI_Citation', 'title',
+            'abstract', 'descriptiveKeywords', 'spatialResolution',
+            'MD_Resolution', 'equivalentScale', 'MD_RepresentativeFraction',
+            'denominator', 'topicCategory', 'MD_TopicCategoryCode',
+            'distributionInfo', 'MD_Distribution', 'transferOptions',
+            'MD_DigitalTransferOptions', 'onLine', 'CI_OnlineResource',
+            'linkage', 'URL', 'protocol', 'name', 'description']]
+        (service_type_tag, service_type_version_tag, service_keywords_tag,
+         service_extent_tag, coupling_type_tag, sv_coupling_type_tag,
+         coupled_resource_tag, sv_coupled_resource_tag, operation_name_tag,
+         service_identifier_tag, contains_operations_tag,
+         operation_metadata_tag, dcp_tag, dcp_list_tag, connect_point_tag,
+         operates_on_tag) = [qnames['srv:%s' % name] for name in [
+            'serviceType', 'serviceTypeVersion', 'keywords', 'extent',
+            'couplingType', 'SV_CouplingType', 'coupledResource',
+            'SV_CoupledResource', 'operationName', 'identifier',
+            'containsOperations', 'SV_OperationMetadata', 'DCP', 'DCPList',
+            'connectPoint', 'operatesOn']]
+        datetime_tag, date_tag = qnames['gco:DateTime'], qnames['gco:Date']
+        local_name_tag, integer_tag = (qnames['gco:LocalName'],
+                                       qnames['gco:Integer'])
+        resident_tags = {True: qnames['srv:SV_ServiceIdentification'],
+                         False: qnames['gmd:MD_DataIdentification']}
+        href_tag = qnames['xlink:href']
+        href = ('%sservice=CSW&version=2.0.2&request=GetRecordById'
+                '&outputschema=http://www.isotc211.org/2005/gmd&id=%%s-%%s' %
+                util.bind_url(self.url))
+        coupling_type_codelist = '%s#SV_CouplingType' % CODELIST
+        dcp_list_codelist = '%s#DCPList' % CODELIST
+        namespaces = self.namespaces
+        getqattr = util.getqattr
+        SubElement = etree.SubElement
+
+        def add_string(parent, tag, value):
+            SubElement(SubElement(parent, tag), string_tag).text = value
+
+        if caps is not None:
+            def write_contact(contact, result):
+                _write_caps_contact(contact, caps, qnames)
+        else:
+            def write_contact(contact, result):
+                val = getqattr(result, organisation_col)
                 if val:
-                    CI_resp = etree.SubElement(contact, util.nspath_eval('gmd:CI_ResponsibleParty', self.namespaces))
-                    org_name = etree.SubElement(CI_resp, util.nspath_eval('gmd:organisationName', self.namespaces))
-                    etree.SubElement(org_name, util.nspath_eval('gco:CharacterString', self.namespaces)).text = val
-
-            # date
-            val = util.getqattr(result, queryables['apiso:Modified']['dbcol'])
-            date = etree.SubElement(node, util.nspath_eval('gmd:dateStamp', self.namespaces))
-            if val and val.find('T') != -1:
-                dateel = 'gco:DateTime'
-            else:
-                dateel = 'gco:Date'
-            etree.SubElement(date, util.nspath_eval(dateel, self.namespaces)).text = val
-
-            metadatastandardname = 'ISO19115'
-            metadatastandardversion = '2003/Cor.1:2006'
-
-            if mtype == 'service':
-                metadatastandardname = 'ISO19119'
-                metadatastandardversion = '2005/PDAM 1'
-
-            # metadata standard name
-            standard = etree.SubElement(node, util.nspath_eval('gmd:metadataStandardName', self.namespaces))
-            etree.SubElement(standard, util.nspath_eval('gco:CharacterString', self.namespaces)).text = metadatastandardname
-
-            # metadata standard version
-            standardver = etree.SubElement(node, util.nspath_eval('gmd:metadataStandardVersion', self.namespaces))
-            etree.SubElement(standardver, util.nspath_eval('gco:CharacterString', self.namespaces)).text = metadatastandardversion
+                    CI_resp = SubElement(contact, responsible_party_tag)
+                    add_string(CI_resp, organisation_name_tag, val)
+
+        def write(result):
+            if esn == 'full':  # the XML blob is only presented as is
+                xml_blob = getqattr(result, xml_col)
+                if (getqattr(result, typename_col) == 'gmd:MD_Metadata' or
+                        caps is None and xml_blob is not None and
+                        xml_blob.startswith(b'<gmd:MD_Metadata')):
+                    # dump record as is and exit
+                    return etree.fromstring(xml_blob, self.context.parser)
+
+            node = etree.Element(metadata_tag)
+            node.attrib[schema_location_tag] = schema_location
+
+            # identifier
+            idval = getqattr(result, identifier_col)
+            add_string(node, file_identifier_tag, idval)
+
+            if summary:
+                # language
+                add_string(node, language_tag,
+                           getqattr(result, language_col))
+
+            # hierarchyLevel
+            mtype = getqattr(result, type_col) or None
+
+            if mtype is not None:
+                if mtype == 'http://purl.org/dc/dcmitype/Dataset':
+                    mtype = 'dataset'
+                hierarchy = SubElement(node, hierarchy_level_tag)
+                hierarchy.append(_write_codelist_element('gmd:MD_ScopeCode', mtype, namespaces))
+            service = mtype == 'service'
+
+            if summary:
+                # contact
+                write_contact(SubElement(node, contact_tag), result)
+
+                # date
+                val = getqattr(result, modified_col)
+                date = SubElement(node, date_stamp_tag)
+                if val and val.find('T') != -1:
+                    SubElement(date, datetime_tag).text = val
+                else:
+                    SubElement(date, date_tag).text = val
 
-        # title
-        val = util.getqattr(result, queryables['apiso:Title']['dbcol']) or ''
-        identification = etree.SubElement(node, util.nspath_eval('gmd:identificationInfo', self.namespaces))
+                if service:
+                    metadatastandardname = 'ISO19119'
+                    metadatastandardversion = '2005/PDAM 1'
+                else:
+                    metadatastandardname = 'ISO19115'
+                    metadatastandardversion = '2003/Cor.1:2006'
+
+                # metadata standard name and version
+                add_string(node, standard_name_tag, metadatastandardname)
+                add_string(node, standard_version_tag, metadatastandardversion)
+
+            # title
+            identification = SubElement(node, identification_tag)
+            resident = SubElement(identification, resident_tags[service], id=idval)
+            ci_citation = SubElement(SubElement(resident, citation_tag), ci_citation_tag)
+            add_string(ci_citation, title_tag, getqattr(result, title_col) or '')
+
+            # creation, publication and revision dates
+            for date_col, datetype in [(creation_col, 'creation'),
+                                       (publication_col, 'publication'),
+                                       (revision_col, 'revision')]:
+                val = getqattr(result, date_col)
+                if val is not None:
+                    ci_citation.append(_write_date(val, datetype, namespaces))
+
+            if summary:
+                # abstract
+                add_string(resident, abstract_tag,
+                           getqattr(result, abstract_col) or '')
+
+                # keywords
+                kw = getqattr(result, subject_col)
+                if kw is not None:
+                    md_keywords = SubElement(resident, keywords_tag)
+                    md_keywords.append(write_keywords(kw, namespaces))
+
+                # spatial resolution
+                val = getqattr(result, denominator_col)
+                if val:
+                    tmp = SubElement(SubElement(SubElement(SubElement(
+                          resident, spatial_resolution_tag), resolution_tag),
+                          equivalent_scale_tag), fraction_tag)
+                    SubElement(SubElement(tmp, denominator_tag),
+                               integer_tag).text = str(val)
+
+                # resource language
+                add_string(resident, language_tag,
+                           getqattr(result, resource_language_col))
+
+                # topic category
+                val = getqattr(result, topic_category_col)
+                if val:
+                    for v in val.split(','):
+                        tmp = SubElement(resident, topic_category_tag)
+                        SubElement(tmp, topic_category_code_tag).text = val
 
-        if mtype == 'service':
-           restagname = 'srv:SV_ServiceIdentification'
-        else:
-           restagname = 'gmd:MD_DataIdentification'
-
-        resident = etree.SubElement(identification, util.nspath_eval(restagname, self.namespaces), id=idval)
-        tmp2 = etree.SubElement(resident, util.nspath_eval('gmd:citation', self.namespaces))
-        tmp3 = etree.SubElement(tmp2, util.nspath_eval('gmd:CI_Citation', self.namespaces))
-        tmp4 = etree.SubElement(tmp3, util.nspath_eval('gmd:title', self.namespaces))
-        etree.SubElement(tmp4, util.nspath_eval('gco:CharacterString', self.namespaces)).text = val
-
-        # creation date
-        val = util.getqattr(result, queryables['apiso:CreationDate']['dbcol'])
-        if val is not None:
-            tmp3.append(_write_date(val, 'creation', self.namespaces))
-        # publication date
-        val = util.getqattr(result, queryables['apiso:PublicationDate']['dbcol'])
-        if val is not None:
-            tmp3.append(_write_date(val, 'publication', self.namespaces))
-        # revision date
-        val = util.getqattr(result, queryables['apiso:RevisionDate']['dbcol'])
-        if val is not None:
-            tmp3.append(_write_date(val, 'revision', self.namespaces))
-
-        if esn in ['summary', 'full']:
-            # abstract
-            val = util.getqattr(result, queryables['apiso:Abstract']['dbcol']) or ''
-            tmp = etree.SubElement(resident, util.nspath_eval('gmd:abstract', self.namespaces))
-            etree.SubElement(tmp, util.nspath_eval('gco:CharacterString', self.namespaces)).text = val
-
-            # keywords
-            kw = util.getqattr(result, queryables['apiso:Subject']['dbcol'])
-            if kw is not None:
-                md_keywords = etree.SubElement(resident, util.nspath_eval('gmd:descriptiveKeywords', self.namespaces))
-                md_keywords.append(write_keywords(kw, self.namespaces))
-
-            # spatial resolution
-            val = util.getqattr(result, queryables['apiso:Denominator']['dbcol'])
-            if val:
-                tmp = etree.SubElement(resident, util.nspath_eval('gmd:spatialResolution', self.namespaces))
-                tmp2 = etree.SubElement(tmp, util.nspath_eval('gmd:MD_Resolution', self.namespaces))
-                tmp3 = etree.SubElement(tmp2, util.nspath_eval('gmd:equivalentScale', self.namespaces))
-                tmp4 = etree.SubElement(tmp3, util.nspath_eval('gmd:MD_RepresentativeFraction', self.namespaces))
-                tmp5 = etree.SubElement(tmp4, util.nspath_eval('gmd:denominator', self.namespaces))
-                etree.SubElement(tmp5, util.nspath_eval('gco:Integer', self.namespaces)).text = str(val)
-
-            # resource language
-            val = util.getqattr(result, queryables['apiso:ResourceLanguage']['dbcol'])
-            tmp = etree.SubElement(resident, util.nspath_eval('gmd:language', self.namespaces))
-            etree.SubElement(tmp, util.nspath_eval('gco:CharacterString', self.namespaces)).text = val
-
-            # topic category
-            val = util.getqattr(result, queryables['apiso:TopicCategory']['dbcol'])
-            if val:
-                for v in val.split(','):
-                    tmp = etree.SubElement(resident, util.nspath_eval('gmd:topicCategory', self.namespaces))
-                    etree.SubElement(tmp, util.nspath_eval('gmd:MD_TopicCategoryCode', self.namespaces)).text = val
-
-        # bbox extent
-        val = util.getqattr(result, queryables['apiso:BoundingBox']['dbcol'])
-        bboxel = write_extent(val, self.namespaces)
-        if bboxel is not None and mtype != 'service':
-            resident.append(bboxel)
-
-        # service identification
-
-        if mtype == 'service':
-            # service type
-            # service type version
-            val = util.getqattr(result, queryables['apiso:ServiceType']['dbcol'])
-            val2 = util.getqattr(result, queryables['apiso:ServiceTypeVersion']['dbcol'])
-            if val is not None:
-                tmp = etree.SubElement(resident, util.nspath_eval('srv:serviceType', self.namespaces))
-                etree.SubElement(tmp, util.nspath_eval('gco:LocalName', self.namespaces)).text = val
-                tmp = etree.SubElement(resident, util.nspath_eval('srv:serviceTypeVersion', self.namespaces))
-                etree.SubElement(tmp, util.nspath_eval('gco:CharacterString', self.namespaces)).text = val2
-
-            kw = util.getqattr(result, queryables['apiso:Subject']['dbcol'])
-            if kw is not None:
-                srv_keywords = etree.SubElement(resident, util.nspath_eval('srv:keywords', self.namespaces))
-                srv_keywords.append(write_keywords(kw, self.namespaces))
-
-            if bboxel is not None:
-                bboxel.tag = util.nspath_eval('srv:extent', self.namespaces)
+            # bbox extent
+            bboxel = write_extent(getqattr(result, bbox_col), namespaces)
+            if bboxel is not None and not service:
                 resident.append(bboxel)
 
-            val = util.getqattr(result, queryables['apiso:CouplingType']['dbcol'])
-            if val is not None:
-                couplingtype = etree.SubElement(resident, util.nspath_eval('srv:couplingType', self.namespaces))
-                etree.SubElement(couplingtype, util.nspath_eval('srv:SV_CouplingType', self.namespaces), codeListValue=val, codeList='%s#SV_CouplingType' % CODELIST).text = val
-
-            if esn in ['summary', 'full']:
-                # all service resources as coupled resources
-                coupledresources = util.getqattr(result, queryables['apiso:OperatesOn']['dbcol'])
-                operations = util.getqattr(result, queryables['apiso:Operation']['dbcol'])
-
-                if coupledresources:
-                    for val2 in coupledresources.split(','):
-                        coupledres = etree.SubElement(resident, util.nspath_eval('srv:coupledResource', self.namespaces))
-                        svcoupledres = etree.SubElement(coupledres, util.nspath_eval('srv:SV_CoupledResource', self.namespaces))
-                        opname = etree.SubElement(svcoupledres, util.nspath_eval('srv:operationName', self.namespaces))
-                        etree.SubElement(opname, util.nspath_eval('gco:CharacterString', self.namespaces)).text = _get_resource_opname(operations)
-                        sid = etree.SubElement(svcoupledres, util.nspath_eval('srv:identifier', self.namespaces))
-                        etree.SubElement(sid, util.nspath_eval('gco:CharacterString', self.namespaces)).text = val2
-
-                # service operations
-                if operations:
-                    for i in operations.split(','):
-                        oper = etree.SubElement(resident, util.nspath_eval('srv:containsOperations', self.namespaces))
-                        tmp = etree.SubElement(oper, util.nspath_eval('srv:SV_OperationMetadata', self.namespaces))
-
-                        tmp2 = etree.SubElement(tmp, util.nspath_eval('srv:operationName', self.namespaces))
-                        etree.SubElement(tmp2, util.nspath_eval('gco:CharacterString', self.namespaces)).text = i
-
-                        tmp3 = etree.SubElement(tmp, util.nspath_eval('srv:DCP', self.namespaces))
-                        etree.SubElement(tmp3, util.nspath_eval('srv:DCPList', self.namespaces), codeList='%s#DCPList' % CODELIST, codeListValue='HTTPGet').text = 'HTTPGet'
-
-                        tmp4 = etree.SubElement(tmp, util.nspath_eval('srv:DCP', self.namespaces))
-                        etree.SubElement(tmp4, util.nspath_eval('srv:DCPList', self.namespaces), codeList='%s#DCPList' % CODELIST, codeListValue='HTTPPost').text = 'HTTPPost'
-
-                        connectpoint = etree.SubElement(tmp, util.nspath_eval('srv:connectPoint', self.namespaces))
-                        onlineres = etree.SubElement(connectpoint, util.nspath_eval('gmd:CI_OnlineResource', self.namespaces))
-                        linkage = etree.SubElement(onlineres, util.nspath_eval('gmd:linkage', self.namespaces))
-                        etree.SubElement(linkage, util.nspath_eval('gmd:URL', self.namespaces)).text = util.getqattr(result, self.context.md_core_model['mappings']['pycsw:Source'])
-
-                # operates on resource(s)
-                if coupledresources:
-                    for i in coupledresources.split(','):
-                        operates_on = etree.SubElement(resident, util.nspath_eval('srv:operatesOn', self.namespaces), uuidref=i)
-                        operates_on.attrib[util.nspath_eval('xlink:href', self.namespaces)] = '%sservice=CSW&version=2.0.2&request=GetRecordById&outputschema=http://www.isotc211.org/2005/gmd&id=%s-%s' % (util.bind_url(self.url), idval, i)
-
-        rlinks = util.getqattr(result, self.context.md_core_model['mappings']['pycsw:Links'])
-
-        if rlinks:
-            distinfo = etree.SubElement(node, util.nspath_eval('gmd:distributionInfo', self.namespaces))
-            distinfo2 = etree.SubElement(distinfo, util.nspath_eval('gmd:MD_Distribution', self.namespaces))
-            transopts = etree.SubElement(distinfo2, util.nspath_eval('gmd:transferOptions', self.namespaces))
-            dtransopts = etree.SubElement(transopts, util.nspath_eval('gmd:MD_DigitalTransferOptions', self.namespaces))
-
-            for link in rlinks.split('^'):
-                linkset = link.split(',')
-                online = etree.SubElement(dtransopts, util.nspath_eval('gmd:onLine', self.namespaces))
-                online2 = etree.SubElement(online, util.nspath_eval('gmd:CI_OnlineResource', self.namespaces))
-
-                linkage = etree.SubElement(online2, util.nspath_eval('gmd:linkage', self.namespaces))
-                etree.SubElement(linkage, util.nspath_eval('gmd:URL', self.namespaces)).text = linkset[-1]
-
-                protocol = etree.SubElement(online2, util.nspath_eval('gmd:protocol', self.namespaces))
-                etree.SubElement(protocol, util.nspath_eval('gco:CharacterString', self.namespaces)).text = linkset[2]
-
-                name = etree.SubElement(online2, util.nspath_eval('gmd:name', self.namespaces))
-                etree.SubElement(name, util.nspath_eval('gco:CharacterString', self.namespaces)).text = linkset[0]
-
-                desc = etree.SubElement(online2, util.nspath_eval('gmd:description', self.namespaces))
-                etree.SubElement(desc, util.nspath_eval('gco:CharacterString', self.namespaces)).text = linkset[1]
-
-        return node
+            # service identification
+
+            if service:
+                # service type
+                # service type version
+                val = getqattr(result, service_type_col)
+                val2 = getqattr(result, service_type_version_col)
+                if val is not None:
+                    tmp = SubElement(resident, service_type_tag)
+                    SubElement(tmp, local_name_tag).text = val
+                    add_string(resident, service_type_version_tag, val2)
+
+                kw = getqattr(result, subject_col)
+                if kw is not None:
+                    srv_keywords = SubElement(resident, service_keywords_tag)
+                    srv_keywords.append(write_keywords(kw, namespaces))
+
+                if bboxel is not None:
+                    bboxel.tag = service_extent_tag
+                    resident.append(bboxel)
+
+                val = getqattr(result, coupling_type_col)
+                if val is not None:
+                    couplingtype = SubElement(resident, coupling_type_tag)
+                    SubElement(couplingtype, sv_coupling_type_tag, codeListValue=val, codeList=coupling_type_codelist).text = val
+
+                if summary:
+                    # all service resources as coupled resources
+                    coupledresources = getqattr(result, operates_on_col)
+                    operations = getqattr(result, operation_col)
+
+                    if coupledresources:
+                        for val2 in coupledresources.split(','):
+                            coupledres = SubElement(resident, coupled_resource_tag)
+                            svcoupledres = SubElement(coupledres, sv_coupled_resource_tag)
+                            add_string(svcoupledres, operation_name_tag, _get_resource_opname(operations))
+                            add_string(svcoupledres, service_identifier_tag, val2)
+
+                    # service operations
+                    if operations:
+                        for i in operations.split(','):
+                            oper = SubElement(resident, contains_operations_tag)
+                            tmp = SubElement(oper, operation_metadata_tag)
+
+                            add_string(tmp, operation_name_tag, i)
+
+                            for dcp in ['HTTPGet', 'HTTPPost']:
+                                SubElement(SubElement(tmp, dcp_tag), dcp_list_tag, codeList=dcp_list_codelist, codeListValue=dcp).text = dcp
+
+                            connectpoint = SubElement(tmp, connect_point_tag)
+                            onlineres = SubElement(connectpoint, online_resource_tag)
+                            linkage = SubElement(onlineres, linkage_tag)
+                            SubElement(linkage, url_tag).text = getqattr(result, source_col)
+
+                    # operates on resource(s)
+                    if coupledresources:
+                        for i in coupledresources.split(','):
+                            operates_on = SubElement(resident, operates_on_tag, uuidref=i)
+                            operates_on.attrib[href_tag] = href % (idval, i)
+
+            rlinks = getqattr(result, links_col)
+
+            if rlinks:
+                distinfo = SubElement(node, distribution_tag)
+                distinfo2 = SubElement(distinfo, md_distribution_tag)
+                transopts = SubElement(distinfo2, transfer_options_tag)
+                dtransopts = SubElement(transopts, digital_transfer_tag)
+
+                for link in rlinks.split('^'):
+                    linkset = link.split(',')
+                    online = SubElement(dtransopts, online_tag)
+                    online2 = SubElement(online, online_resource_tag)
+
+                    linkage = SubElement(online2, linkage_tag)
+                    SubElement(linkage, url_tag).text = linkset[-1]
+
+                    add_string(online2, protocol_tag, linkset[2])
+                    add_string(online2, name_tag, linkset[0])
+                    add_string(online2, description_tag, linkset[1])
+
+            return node
+
+        return write
+
+def _write_caps_contact(contact, caps, qnames):
+    ''' Write service metadata as the gmd:CI_ResponsibleParty of contact '''
+    CI_resp = etree.SubElement(contact, qnames['gmd:CI_ResponsibleParty'])
+    if hasattr(caps.provider.contact, 'name'):
+        ind_name = etree.SubElement(CI_resp, qnames['gmd:individualName'])
+        etree.SubElement(ind_name, qnames['gco:CharacterString']).text = caps.provider.contact.name
+    if hasattr(caps.provider.contact, 'organization'):
+        if caps.provider.contact.organization is not None:
+            org_val = caps.provider.contact.organization
+        else:
+            org_val = caps.provider.name
+        org_name = etree.SubElement(CI_resp, qnames['gmd:organisationName'])
+        etree.SubElement(org_name, qnames['gco:CharacterString']).text = org_val
+    if hasattr(caps.provider.contact, 'position'):
+        pos_name = etree.SubElement(CI_resp, qnames['gmd:positionName'])
+        etree.SubElement(pos_name, qnames['gco:CharacterString']).text = caps.provider.contact.position
+    contact_info = etree.SubElement(CI_resp, qnames['gmd:contactInfo'])
+    ci_contact = etree.SubElement(contact_info, qnames['gmd:CI_Contact'])
+    if hasattr(caps.provider.contact, 'phone'):
+        phone = etree.SubElement(ci_contact, qnames['gmd:phone'])
+        ci_phone = etree.SubElement(phone, qnames['gmd:CI_Telephone'])
+        voice = etree.SubElement(ci_phone, qnames['gmd:voice'])
+        etree.SubElement(voice, qnames['gco:CharacterString']).text = caps.provider.contact.phone
+        if hasattr(caps.provider.contact, 'fax'):
+            fax = etree.SubElement(ci_phone, qnames['gmd:facsimile'])
+            etree.SubElement(fax, qnames['gco:CharacterString']).text = caps.provider.contact.fax
+    address = etree.SubElement(ci_contact, qnames['gmd:address'])
+    ci_address = etree.SubElement(address, qnames['gmd:CI_Address'])
+    if hasattr(caps.provider.contact, 'address'):
+        delivery_point = etree.SubElement(ci_address, qnames['gmd:deliveryPoint'])
+        etree.SubElement(delivery_point, qnames['gco:CharacterString']).text = caps.provider.contact.address
+    if hasattr(caps.provider.contact, 'city'):
+        city = etree.SubElement(ci_address, qnames['gmd:city'])
+        etree.SubElement(city, qnames['gco:CharacterString']).text = caps.provider.contact.city
+    if hasattr(caps.provider.contact, 'region'):
+        admin_area = etree.SubElement(ci_address, qnames['gmd:administrativeArea'])
+        etree.SubElement(admin_area, qnames['gco:CharacterString']).text = caps.provider.contact.region
+    if hasattr(caps.provider.contact, 'postcode'):
+        postal_code = etree.SubElement(ci_address, qnames['gmd:postalCode'])
+        etree.SubElement(postal_code, qnames['gco:CharacterString']).text = caps.provider.contact.postcode
+    if hasattr(caps.provider.contact, 'country'):
+        country = etree.SubElement(ci_address, qnames['gmd:country'])
+        etree.SubElement(country, qnames['gco:CharacterString']).text = caps.provider.contact.country
+    if hasattr(caps.provider.contact, 'email'):
+        email = etree.SubElement(ci_address, qnames['gmd:electronicMailAddress'])
+        etree.SubElement(email, qnames['gco:CharacterString']).text = caps.provider.contact.email
+
+    contact_url = None
+    if hasattr(caps.provider, 'url'):
+        contact_url = caps.provider.url
+    if hasattr(caps.provider.contact, 'url') and caps.provider.contact.url is not None:
+        contact_url = caps.provider.contact.url
+
+    if contact_url is not None:
+        online_resource = etree.SubElement(ci_contact, qnames['gmd:onlineResource'])
+        gmd_linkage = etree.SubElement(online_resource, qnames['gmd:linkage'])
+        etree.SubElement(gmd_linkage, qnames['gmd:URL']).text = contact_url
+
+    if hasattr(caps.provider.contact, 'role'):
+        role = etree.SubElement(CI_resp, qnames['gmd:role'])
+        role_val = caps.provider.contact.role
+        if role_val is None:
+            role_val = 'pointOfContact'
+        etree.SubElement(role, qnames['gmd:CI_RoleCode'], codeListValue=role_val, codeList='%s#CI_RoleCode' % CODELIST).text = role_val
 
 def write_keywords(keywords, nsmap):
     """generate gmd:MD_Keywords construct"""
-    md_keywords = etree.Element(util.nspath_eval('gmd:MD_Keywords', nsmap))
+    qnames = util.get_qnames(nsmap)
+    md_keywords = etree.Element(qnames['gmd:MD_Keywords'])
     for kw in keywords.split(','):
-        keyword = etree.SubElement(md_keywords, util.nspath_eval('gmd:keyword', nsmap))
-        etree.SubElement(keyword, util.nspath_eval('gco:CharacterString', nsmap)).text = kw
+        keyword = etree.SubElement(md_keywords, qnames['gmd:keyword'])
+        etree.SubElement(keyword, qnames['gco:CharacterString']).text = kw
     return md_keywords
 
 def write_extent(bbox, nsmap):
@@ -694,32 +752,34 @@ def write_extent(bbox, nsmap):
             bbox2 = util.wkt2geom(bbox)
         except:
             return None
-        extent = etree.Element(util.nspath_eval('gmd:extent', nsmap))
-        ex_extent = etree.SubElement(extent, util.nspath_eval('gmd:EX_Extent', nsmap))
-        ge = etree.SubElement(ex_extent, util.nspath_eval('gmd:geographicElement', nsmap))
-        gbb = etree.SubElement(ge, util.nspath_eval('gmd:EX_GeographicBoundingBox', nsmap))
-        west = etree.SubElement(gbb, util.nspath_eval('gmd:westBoundLongitude', nsmap))
-        east = etree.SubElement(gbb, util.nspath_eval('gmd:eastBoundLongitude', nsmap))
-        south = etree.SubElement(gbb, util.nspath_eval('gmd:southBoundLatitude', nsmap))
-        north = etree.SubElement(gbb, util.nspath_eval('gmd:northBoundLatitude', nsmap))
-
-        etree.SubElement(west, util.nspath_eval('gco:Decimal', nsmap)).text = str(bbox2[0])
-        etree.SubElement(south, util.nspath_eval('gco:Decimal', nsmap)).text = str(bbox2[1])
-        etree.SubElement(east, util.nspath_eval('gco:Decimal', nsmap)).text = str(bbox2[2])
-        etree.SubElement(north, util.nspath_eval('gco:Decimal', nsmap)).text = str(bbox2[3])
+        qnames = util.get_qnames(nsmap)
+        extent = etree.Element(qnames['gmd:extent'])
+        ex_extent = etree.SubElement(extent, qnames['gmd:EX_Extent'])
+        ge = etree.SubElement(ex_extent, qnames['gmd:geographicElement'])
+        gbb = etree.SubElement(ge, qnames['gmd:EX_GeographicBoundingBox'])
+        west = etree.SubElement(gbb, qnames['gmd:westBoundLongitude'])
+        east = etree.SubElement(gbb, qnames['gmd:eastBoundLongitude'])
+        south = etree.SubElement(gbb, qnames['gmd:southBoundLatitude'])
+        north = etree.SubElement(gbb, qnames['gmd:northBoundLatitude'])
+
+        etree.SubElement(west, qnames['gco:Decimal']).text = str(bbox2[0])
+        etree.SubElement(south, qnames['gco:Decimal']).text = str(bbox2[1])
+        etree.SubElement(east, qnames['gco:Decimal']).text = str(bbox2[2])
+        etree.SubElement(north, qnames['gco:Decimal']).text = str(bbox2[3])
         return extent
     return None
 
 def _write_date(dateval, datetypeval, nsmap):
-    date1 = etree.Element(util.nspath_eval('gmd:date', nsmap))
-    date2 = etree.SubElement(date1, util.nspath_eval('gmd:CI_Date', nsmap))
-    date3 = etree.SubElement(date2, util.nspath_eval('gmd:date', nsmap))
+    qnames = util.get_qnames(nsmap)
+    date1 = etree.Element(qnames['gmd:date'])
+    date2 = etree.SubElement(date1, qnames['gmd:CI_Date'])
+    date3 = etree.SubElement(date2, qnames['gmd:date'])
     if dateval.find('T') != -1:
         dateel = 'gco:DateTime'
     else:
         dateel = 'gco:Date'
-    etree.SubElement(date3, util.nspath_eval(dateel, nsmap)).text = dateval
-    datetype = etree.SubElement(date2, util.nspath_eval('gmd:dateType', nsmap))
+    etree.SubElement(date3, qnames[dateel]).text = dateval
+    datetype = etree.SubElement(date2, qnames['gmd:dateType'])
     datetype.append(_write_codelist_element('gmd:CI_DateTypeCode', datetypeval, nsmap))
     return date1
 
@@ -731,8 +791,9 @@ def _get_resource_opname(operations):
 
 def _write_codelist_element(codelist_element, codelist_value, nsmap):
     namespace, codelist = codelist_element.split(':')
+    qnames = util.get_qnames(nsmap)
 
-    element = etree.Element(util.nspath_eval(codelist_element, nsmap),
+    element = etree.Element(qnames[codelist_element],
     codeSpace=CODESPACE, codeList='%s#%s' % (CODELIST, codelist),
     codeListValue=codelist_value)
 
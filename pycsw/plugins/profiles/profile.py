@@ -98,6 +98,14 @@ class Profile(object):
         ''' Return csw:SearchResults child as lxml.etree.Element '''
         raise NotImplementedError
 
+    def compile_record_writer(self, esn, outputschema, queryables):
+        ''' Return a function of result writing records as write_record,
+        with what does not depend on the record resolved once '''
+
+        def write(result):
+            return self.write_record(result, esn, outputschema, queryables)
+        return write
+
     def transform2dcmappings(self, queryables):
         ''' Transform information model mappings into csw:Record mappings '''
         raise NotImplementedError
@@ -46,6 +46,7 @@ class OpenDataCatalogRepository(object):
         self.context = context
         self.filter = repo_filter
         self.fts = False
+        self.spatial_index = None
 
         self.dbtype = settings.DATABASES['default']['ENGINE'].split('.')[-1]
 
@@ -120,6 +121,16 @@ class OpenDataCatalogRepository(object):
         ''' Query by source '''
         return self._get_repo_filter(Resource.objects).filter(source=source)
 
+    def count(self, constraint):
+        ''' Count records matching constraint in underlying repository '''
+
+        if 'where' in constraint:  # GetRecords with constraint
+            query = self._get_repo_filter(Resource.objects).extra(where=[constraint['where']], params=constraint['values'])
+        else:  # GetRecords sans constraint
+            query = self._get_repo_filter(Resource.objects)
+
+        return query.count()
+
     def query(self, constraint, sortby=None, typenames=None,
         maxrecords=10, startposition=0):
         ''' Query records from underlying repository '''
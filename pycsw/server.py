@@ -32,15 +32,22 @@
 #
 # =================================================================
 
+import codecs
+import copy
+from email.utils import formatdate
+import hashlib
 import logging
 import os
+import re
 from six.moves.urllib.parse import parse_qsl
 from six.moves.urllib.parse import splitquery
 from six.moves.urllib.parse import urlparse
-from six import StringIO
+from six import BytesIO, StringIO
 from six.moves.configparser import SafeConfigParser
 import sys
+import threading
 from time import time
+import uuid
 import wsgiref.util
 
 from pycsw.core.etree import etree
@@ -52,6 +59,12 @@ from pycsw.ogc.csw import csw2, csw3
 
 LOGGER = logging.getLogger(__name__)
 
+# processing instruction standing for a stored record written as is
+STORED_RECORD_TARGET = 'pycsw-record'
+
+# suffix of the entity tags of gzip compressed responses (see wsgi.py)
+GZIP_ETAG_SUFFIX = '-gzip'
+
 
 class Csw(object):
     """ Base CSW server """
@@ -80,12 +93,22 @@ class Csw(object):
         self.request = None
         self.exception = False
         self.status = 'OK'
+        self.headers = {}
+        self.capabilities_cache = None
         self.profiles = None
         self.manager = False
         self.outputschemas = {}
         self.mimetype = 'application/xml; charset=UTF-8'
         self.encoding = 'UTF-8'
         self.pretty_print = 0
+        self.streaming = False
+        self.stream = None
+        self.passthrough = False
+        self.stored_records = {}
+        self.stored_record_token = None
+        self.stored_record_count = 0
+        self.xml_validation = 'full'
+        self.spatial_ranking = False
         self.domainquerytype = 'list'
         self.orm = 'django'
         self.language = {'639_code': 'en', 'text': 'english'}
@@ -100,21 +123,20 @@ class Csw(object):
             self.context.set_model('csw')
 
         # load user configuration
+        self.state = None
         try:
             LOGGER.info('Loading user configuration')
             if isinstance(rtconfig, SafeConfigParser):  # serialized already
                 self.config = rtconfig
-            else:
+            elif isinstance(rtconfig, dict):  # dictionary
                 self.config = SafeConfigParser()
-                if isinstance(rtconfig, dict):  # dictionary
-                    for section, options in rtconfig.items():
-                        self.config.add_section(section)
-                        for k, v in options.items():
-                            self.config.set(section, k, v)
-                else:  # configuration file
-                    import codecs
-                    with codecs.open(rtconfig, encoding='utf-8') as scp:
-                        self.config.readfp(scp)
+                for section, options in rtconfig.items():
+                    self.config.add_section(section)
+                    for k, v in options.items():
+                        self.config.set(section, k, v)
+            else:  # configuration file, kept warm across requests
+                self.state = ServerState.get(rtconfig)
+                self.config = self.state.config
         except Exception as err:
             msg = 'Could not load configuration'
             LOGGER.exception('%s %s: %s', msg, rtconfig, err)
@@ -122,26 +144,17 @@ class Csw(object):
                 'NoApplicableCode', 'service', msg)
             return
 
-        # set server.home safely
-        # TODO: make this more abstract
-        self.config.set(
-            'server', 'home',
-            os.path.dirname(os.path.join(os.path.dirname(__file__), '..'))
-        )
-
-        self.context.pycsw_home = self.config.get('server', 'home')
-        self.context.url = self.config.get('server', 'url')
-
-        log.setup_logger(self.config)
+        if self.state is not None:
+            self.context = self.state.context.clone()
+            self.outputschemas = self.state.outputschemas
+            if self.request_version == '2.0.2':
+                self.context.set_model('csw')
+        else:
+            setup_config(self.config, self.context)
 
         LOGGER.info('running configuration %s', rtconfig)
         LOGGER.debug('QUERY_STRING: %s', self.environ['QUERY_STRING'])
 
-        # set OGC schemas location
-        if not self.config.has_option('server', 'ogc_schemas_base'):
-            self.config.set('server', 'ogc_schemas_base',
-                            self.context.ogc_schemas_base)
-
         # set mimetype
         if self.config.has_option('server', 'mimetype'):
             self.mimetype = self.config.get('server', 'mimetype').encode()
@@ -159,10 +172,24 @@ class Csw(object):
                 self.config.get('server', 'pretty_print') == 'true'):
             self.pretty_print = 1
 
+        # set GetRecords streaming
+        if (self.config.has_option('server', 'streaming') and
+                self.config.get('server', 'streaming') == 'true'):
+            self.streaming = True
+
+        # set pass-through of stored records
+        if (self.config.has_option('server', 'passthrough') and
+                self.config.get('server', 'passthrough') == 'true'):
+            self.passthrough = True
+
+        # set XML validation mode
+        if self.config.has_option('server', 'xml_validation'):
+            self.xml_validation = self.config.get('server', 'xml_validation')
+
         # set Spatial Ranking option
         if (self.config.has_option('server', 'spatial_ranking') and
                 self.config.get('server', 'spatial_ranking') == 'true'):
-            util.ranking_enabled = True
+            self.spatial_ranking = True
 
         # set language default
         if self.config.has_option('server', 'language'):
@@ -178,36 +205,17 @@ class Csw(object):
         LOGGER.debug('Configuration: %s.', self.config)
         LOGGER.debug('Model: %s.', self.context.model)
 
-        # load user-defined mappings if they exist
-        if self.config.has_option('repository', 'mappings'):
-            # override default repository mappings
+        if self.state is None:
+            # load user-defined mappings if they exist
             try:
-                import imp
-                module = self.config.get('repository', 'mappings')
-                if '/' in module:  # filepath
-                    modulename = '%s' % os.path.splitext(module)[0].replace(
-                        os.sep, '.')
-                    mappings = imp.load_source(modulename, module)
-                else:  # dotted name
-                    mappings = __import__(module, fromlist=[''])
-                LOGGER.info('Loading custom repository mappings '
-                             'from %s', module)
-                self.context.md_core_model = mappings.MD_CORE_MODEL
-                self.context.refresh_dc(mappings.MD_CORE_MODEL)
+                load_mappings(self.config, self.context)
             except Exception as err:
                 LOGGER.exception('Could not load custom mappings: %s', err)
                 self.response = self.iface.exceptionreport(
                     'NoApplicableCode', 'service',
                     'Could not load repository.mappings')
 
-        # load outputschemas
-        LOGGER.info('Loading outputschemas')
-
-        for osch in pycsw.plugins.outputschemas.__all__:
-            output_schema_module = __import__(
-                'pycsw.plugins.outputschemas.%s' % osch)
-            mod = getattr(output_schema_module.plugins.outputschemas, osch)
-            self.outputschemas[mod.NAMESPACE] = mod
+            self.outputschemas = load_outputschemas()
 
         LOGGER.debug('Outputschemas loaded: %s.', self.outputschemas)
         LOGGER.debug('Namespaces: %s', self.context.namespaces)
@@ -304,66 +312,15 @@ class Csw(object):
             self.iface = csw2.Csw2(server_csw=self)
             self.context.set_model('csw')
 
+        if self.state is not None:  # information model prepared already
+            self.profiles = self.state.profiles[self.request_version]
+        else:
+            self.profiles = prepare_model(self.context, self.config,
+                                          self.outputschemas)
+
         # configure transaction support, if specified in config
         self._gen_manager()
 
-        namespaces = self.context.namespaces
-        ops = self.context.model['operations']
-        constraints = self.context.model['constraints']
-        # generate domain model
-        # NOTE: We should probably avoid this sort of mutable state for WSGI
-        if 'GetDomain' not in ops:
-            ops['GetDomain'] = self.context.gen_domains()
-
-        # generate distributed search model, if specified in config
-        if self.config.has_option('server', 'federatedcatalogues'):
-            LOGGER.info('Configuring distributed search')
-
-            constraints['FederatedCatalogues'] = {'values': []}
-
-            for fedcat in self.config.get('server',
-                                          'federatedcatalogues').split(','):
-                LOGGER.debug('federated catalogue: %s', fedcat)
-                constraints['FederatedCatalogues']['values'].append(fedcat)
-
-        for key, value in self.outputschemas.items():
-            get_records_params = ops['GetRecords']['parameters']
-            get_records_params['outputSchema']['values'].append(
-                value.NAMESPACE)
-            get_records_by_id_params = ops['GetRecordById']['parameters']
-            get_records_by_id_params['outputSchema']['values'].append(
-                value.NAMESPACE)
-            if 'Harvest' in ops:
-                harvest_params = ops['Harvest']['parameters']
-                harvest_params['ResourceType']['values'].append(
-                    value.NAMESPACE)
-
-        LOGGER.info('Setting MaxRecordDefault')
-        if self.config.has_option('server', 'maxrecords'):
-            constraints['MaxRecordDefault']['values'] = [
-                self.config.get('server', 'maxrecords')]
-
-        # load profiles
-        if self.config.has_option('server', 'profiles'):
-            self.profiles = pprofile.load_profiles(
-                os.path.join('pycsw', 'plugins', 'profiles'),
-                pprofile.Profile,
-                self.config.get('server', 'profiles')
-            )
-
-            for prof in self.profiles['plugins'].keys():
-                tmp = self.profiles['plugins'][prof](self.context.model,
-                                                     namespaces,
-                                                     self.context)
-
-                key = tmp.outputschema  # to ref by outputschema
-                self.profiles['loaded'][key] = tmp
-                self.profiles['loaded'][key].extend_core(self.context.model,
-                                                         namespaces,
-                                                         self.config)
-
-            LOGGER.debug('Profiles loaded: %s' % list(self.profiles['loaded'].keys()))
-
         # init repository
         # look for tablename, set 'records' as default
         if not self.config.has_option('repository', 'table'):
@@ -395,6 +352,10 @@ class Csw(object):
             self.orm = 'sqlalchemy'
             from pycsw.core import repository
             try:
+                if (self.state is None and  # else set with the state
+                        self.config.has_option('repository', 'geometry_cache')):
+                    repository.RECORD_GEOMETRIES.size = int(
+                        self.config.get('repository', 'geometry_cache'))
                 LOGGER.info('Loading default repository')
                 self.repository = repository.Repository(
                     self.config.get('repository', 'database'),
@@ -534,10 +495,12 @@ class Csw(object):
                 self.async = True
                 request_id = self.kvp.get('requestid', None)
                 if request_id is None:
-                    import uuid
                     self.kvp['requestid'] = str(uuid.uuid4())
 
             if self.kvp['request'] == 'GetCapabilities':
+                cached = self._get_cached_capabilities()
+                if cached is not None:
+                    return cached
                 self.response = self.iface.getcapabilities()
             elif self.kvp['request'] == 'DescribeRecord':
                 self.response = self.iface.describerecord()
@@ -584,7 +547,16 @@ class Csw(object):
                 self.config.get('server', 'url')
             )
 
-        return self._write_response()
+        if (self.state is not None and isinstance(self.kvp, dict) and
+                self.kvp.get('request') in ['Transaction', 'Harvest']):
+            self.state.invalidate_capabilities()
+
+        response = self._write_response()
+
+        if self.capabilities_cache is not None and not self.exception:
+            self._set_cached_capabilities(response[1])
+
+        return response
 
     def getcapabilities(self):
         """ Handle GetCapabilities request """
@@ -618,6 +590,156 @@ class Csw(object):
         """ Handle Harvest request """
         return self.iface.harvest()
 
+    def _get_cached_capabilities(self):
+        """ Return a cached GetCapabilities response, if still valid """
+
+        if (self.state is None or self.mode != 'csw' or self.soap or
+                self.async or 'updatesequence' in self.kvp):
+            return None
+
+        key = (self.request_version, self.kvp.get('sections'),
+               self.kvp.get('acceptformats'), self.kvp.get('outputformat'))
+
+        try:
+            updatesequence = self.state.get_updatesequence(self.repository)
+        except Exception as err:
+            LOGGER.exception('Could not get repository updatesequence')
+            return None
+
+        cached = self.state.capabilities.get(key)
+        if cached is None or cached['updatesequence'] != updatesequence:
+            self.capabilities_cache = (key, updatesequence)
+            return None
+
+        LOGGER.info('Returning cached GetCapabilities response')
+        self.contenttype = cached['contenttype']
+        self.headers.update(cached['headers'])
+
+        # weak comparison, as for If-None-Match, of the tags of both the
+        # uncompressed and gzip compressed response
+        etag = cached['headers']['ETag']
+        current = ['*', etag, '%s%s"' % (etag[:-1], GZIP_ETAG_SUFFIX)]
+        tags = [tag.strip() for tag in
+                self.environ.get('HTTP_IF_NONE_MATCH', '').split(',')]
+        if any((tag[2:] if tag.startswith('W/') else tag) in current
+               for tag in tags):
+            self.status = 'NotModified'
+            return [self.context.response_codes[self.status], b'']
+
+        return [self.context.response_codes[self.status], cached['response']]
+
+    def _set_cached_capabilities(self, response):
+        """ Cache a GetCapabilities response and set its HTTP validators """
+
+        key, updatesequence = self.capabilities_cache
+
+        self.headers['ETag'] = '"%s"' % hashlib.md5(response).hexdigest()
+        try:
+            self.headers['Last-Modified'] = formatdate(
+                util.get_time_iso2unix(updatesequence), usegmt=True)
+        except Exception as err:
+            LOGGER.debug('No Last-Modified for updatesequence %s: %s',
+                         updatesequence, err)
+
+        self.state.set_capabilities(key, {
+            'updatesequence': updatesequence,
+            'contenttype': self.contenttype,
+            'headers': dict(self.headers),
+            'response': response
+        })
+
+    def _can_stream(self):
+        """ Whether GetRecords results can be streamed to the client """
+
+        return (self.streaming and self.mode == 'csw' and not self.soap and
+                not self.async and self.orm == 'sqlalchemy' and
+                isinstance(self.kvp, dict) and
+                self.kvp.get('outputformat') != 'application/json' and
+                'responsehandler' not in self.kvp and
+                not self.kvp.get('distributedsearch'))
+
+    def _can_pass_through(self):
+        """ Whether stored records can be written as is into the response """
+
+        return (self.passthrough and self.mode == 'csw' and
+                isinstance(self.kvp, dict) and
+                self.kvp.get('outputformat') != 'application/json' and
+                'responsehandler' not in self.kvp and
+                self.encoding.lower() in util.UTF8_ENCODINGS and
+                None not in self.context.namespaces)
+
+    def _pass_through(self, xml):
+        """ Placeholder for a stored XML document written as is into the
+        response, or None if the document has to be parsed """
+
+        root = util.get_document_root(xml)
+        if root is None:
+            return None
+        if self.stored_record_token is None:
+            # placeholders are told apart from processing instructions of
+            # the same target in stored documents by a per response token
+            self.stored_record_token = uuid.uuid4().hex
+        self.stored_record_count += 1
+        self.stored_records[self.stored_record_count] = root
+        return etree.ProcessingInstruction(STORED_RECORD_TARGET, '%s %d' % (
+            self.stored_record_token, self.stored_record_count))
+
+    def _splice_stored_records(self, response):
+        """ Replace stored record placeholders by their documents """
+
+        def splice(match):
+            root = self.stored_records.pop(int(match.group(1)), None)
+            if root is None:  # not a placeholder of this response
+                return match.group(0)
+            return root
+
+        placeholder = r'<\?%s %s (\d+)\?>' % (STORED_RECORD_TARGET,
+                                                 self.stored_record_token)
+        return re.sub(placeholder.encode('ascii'), splice, response)
+
+    def _get_result_columns(self):
+        """ Repository columns needed to present GetRecords results """
+
+        mappings = self.context.md_core_model['mappings']
+        columns = [column.name for column in
+                   self.repository.dataset.__table__.columns]
+        csw_schemas = [self.context.namespaces['csw'],
+                       self.context.namespaces['csw30']]
+
+        if (isinstance(self.kvp.get('elementname'), list) and
+                self.kvp['elementname'] and
+                'csw:Record' in self.kvp['typenames'] and
+                self.kvp['outputschema'] in csw_schemas):
+            # csw:Record with ElementName: only the requested elements
+            queryables = self.repository.queryables['_all']
+            needed = [mappings['pycsw:Identifier']]
+            if self.request_version == '3.0.0':  # always written out
+                needed.append(mappings['pycsw:Title'])
+            needed.extend(queryables[name]['dbcol'] for name in
+                          self.kvp['elementname'] if name in queryables)
+            if all(name in columns for name in needed):
+                return sorted(set(needed))
+
+        # AnyText is only ever queried, never presented
+        unused = [mappings['pycsw:AnyText']]
+
+        # pre-rendered csw:Record elementsets are only presented as such
+        for elementset, (elname, name) in \
+                csw2.RENDERED_ELEMENTSETS.items():
+            if (self.kvp.get('elementsetname') != elementset or
+                    self.request_version != '2.0.2' or
+                    self.kvp['outputschema'] not in csw_schemas):
+                unused.append(mappings.get(name))
+
+        if (self.kvp.get('elementsetname') != 'full' and
+                (self.kvp['outputschema'] in csw_schemas or
+                 (self.profiles is not None and
+                  self.kvp['outputschema'] in self.profiles['loaded']))):
+            # brief and summary records are built from the columns
+            unused.append(mappings['pycsw:XML'])
+
+        return [column for column in columns if column not in unused]
+
     def _write_response(self):
         """ Generate response """
         # set HTTP response headers and XML declaration
@@ -625,6 +747,9 @@ class Csw(object):
         xmldecl = ''
         appinfo = ''
 
+        if self.stream is not None and not self.exception:
+            return self._write_stream()
+
         LOGGER.info('Writing response.')
 
         if hasattr(self, 'soap') and self.soap:
@@ -634,17 +759,13 @@ class Csw(object):
             etree.cleanup_namespaces(self.response,
                                      keep_ns_prefixes=self.context.keep_ns_prefixes)
 
-        response = etree.tostring(self.response,
-                                  pretty_print=self.pretty_print,
-                                  encoding='unicode')
-
         if (isinstance(self.kvp, dict) and 'outputformat' in self.kvp and
                 self.kvp['outputformat'] == 'application/json'):
             self.contenttype = self.kvp['outputformat']
             from pycsw.core.formats import fmt_json
-            response = fmt_json.xml2json(response,
-                                         self.context.namespaces,
-                                         self.pretty_print)
+            response = fmt_json.etree2json(self.response,
+                                           self.context.namespaces,
+                                           self.pretty_print)
         else:  # it's XML
             if 'outputformat' in self.kvp:
                 self.contenttype = self.kvp['outputformat']
@@ -654,16 +775,87 @@ class Csw(object):
             xmldecl = ('<?xml version="1.0" encoding="%s" standalone="no"?>'
                        '\n' % self.encoding)
             appinfo = '<!-- pycsw %s -->\n' % self.context.version
+            response = etree.tostring(self.response,
+                                      pretty_print=self.pretty_print,
+                                      encoding='unicode')
 
         if isinstance(self.contenttype, bytes):
             self.contenttype = self.contenttype.decode()
 
         s = (u'%s%s%s' % (xmldecl, appinfo, response)).encode(self.encoding)
+        if self.stored_records:
+            s = self._splice_stored_records(s)
         LOGGER.debug('Response code: %s',
                      self.context.response_codes[self.status])
         LOGGER.debug('Response:\n%s', s)
         return [self.context.response_codes[self.status], s]
 
+    def _write_stream(self):
+        """ Generate a streamed response
+
+        The response envelope is written around the records of
+        ``self.stream``, each record being serialized and handed to the
+        WSGI server as soon as it is fetched from the repository.
+        """
+
+        LOGGER.info('Writing streamed response.')
+
+        if 'outputformat' in self.kvp:
+            self.contenttype = self.kvp['outputformat']
+        else:
+            self.contenttype = self.mimetype
+
+        if isinstance(self.contenttype, bytes):
+            self.contenttype = self.contenttype.decode()
+
+        if etree.__version__ >= '3.5.0':  # remove superfluous namespaces
+            etree.cleanup_namespaces(self.response,
+                                     keep_ns_prefixes=self.context.keep_ns_prefixes)
+
+        return [self.context.response_codes[self.status],
+                self._generate_stream()]
+
+    def _generate_stream(self):
+        """ Yield the encoded chunks of a streamed response """
+
+        node = self.response
+        searchresults, records = self.stream
+
+        yield (u'<?xml version="1.0" encoding="%s" standalone="no"?>\n'
+               u'<!-- pycsw %s -->\n' % (self.encoding, self.context.version)
+               ).encode(self.encoding)
+
+        output = BytesIO()
+        with etree.xmlfile(output, encoding=self.encoding) as xmlfile:
+            with xmlfile.element(node.tag, node.attrib, nsmap=node.nsmap):
+                for child in node:
+                    if child is not searchresults:
+                        xmlfile.write(self._standalone(copy.deepcopy(child)),
+                                      pretty_print=self.pretty_print)
+                        continue
+                    with xmlfile.element(child.tag, child.attrib):
+                        for record in records:
+                            xmlfile.write(self._standalone(record),
+                                          pretty_print=self.pretty_print)
+                            xmlfile.flush()
+                            if self.stored_records:
+                                yield self._splice_stored_records(
+                                    output.getvalue())
+                            else:
+                                yield output.getvalue()
+                            output.seek(0)
+                            output.truncate()
+        yield output.getvalue()
+
+    def _standalone(self, element):
+        """ Declare the namespaces of an element once, on the element """
+
+        if (etree.__version__ >= '3.5.0' and
+                not isinstance(element, (etree._Comment,
+                                         etree._ProcessingInstruction))):
+            etree.cleanup_namespaces(element, top_nsmap=self.response.nsmap)
+        return element
+
     def _gen_soap_wrapper(self):
         """ Generate SOAP wrapper """
         LOGGER.info('Writing SOAP wrapper.')
@@ -718,50 +910,12 @@ class Csw(object):
         self.response = node
 
     def _gen_manager(self):
-        """ Update self.context.model with CSW-T advertising """
+        """ Configure CSW-T support """
         if (self.config.has_option('manager', 'transactions') and
                 self.config.get('manager', 'transactions') == 'true'):
 
             self.manager = True
 
-            self.context.model['operations_order'].append('Transaction')
-
-            self.context.model['operations']['Transaction'] = {
-                'methods': {'get': False, 'post': True},
-                'parameters': {}
-            }
-
-            schema_values = [
-                'http://www.opengis.net/cat/csw/2.0.2',
-                'http://www.opengis.net/cat/csw/3.0',
-                'http://www.opengis.net/wms',
-                'http://www.opengis.net/wmts/1.0',
-                'http://www.opengis.net/wfs',
-                'http://www.opengis.net/wfs/2.0',
-                'http://www.opengis.net/wcs',
-                'http://www.opengis.net/wps/1.0.0',
-                'http://www.opengis.net/sos/1.0',
-                'http://www.opengis.net/sos/2.0',
-                'http://www.isotc211.org/2005/gmi',
-                'urn:geoss:waf',
-            ]
-
-            self.context.model['operations_order'].append('Harvest')
-
-            self.context.model['operations']['Harvest'] = {
-                'methods': {'get': False, 'post': True},
-                'parameters': {
-                    'ResourceType': {'values': schema_values}
-                }
-            }
-
-            self.context.model['operations']['Transaction'] = {
-                'methods': {'get': False, 'post': True},
-                'parameters': {
-                    'TransactionSchemas': {'values': sorted(schema_values)}
-                }
-            }
-
             self.csw_harvest_pagesize = 10
             if self.config.has_option('manager', 'csw_harvest_pagesize'):
                 self.csw_harvest_pagesize = int(
@@ -866,3 +1020,285 @@ class Csw(object):
         for name, value in kvp.items():
             result[name.lower()] = value
         return result
+
+
+class ServerState(object):
+    """ Warm, process-wide state for a pycsw configuration file
+
+    Parsing the configuration, loading custom repository mappings, output
+    schemas and profiles, and preparing the information model only depend
+    on the configuration file, so this is done once per file and reused by
+    every request until the file's modification time changes.  Each
+    request works on its own copy of the context (see
+    ``StaticContext.clone``); the prepared information models and profile
+    instances are shared and treated as read-only.
+    """
+
+    _states = {}
+    _lock = threading.Lock()
+
+    def __init__(self, config_path, mtime):
+        """ Initialize server state from a configuration file """
+
+        LOGGER.info('Loading server state for %s', config_path)
+
+        self.config_path = config_path
+        self.mtime = mtime
+
+        self.config = SafeConfigParser()
+        with codecs.open(config_path, encoding='utf-8') as scp:
+            self.config.readfp(scp)
+
+        self.context = config.StaticContext()
+        setup_config(self.config, self.context)
+        load_mappings(self.config, self.context)
+        self.outputschemas = load_outputschemas()
+
+        # prepare the information model of each supported CSW version
+        self.profiles = {}
+        for version, prefix in [('3.0.0', 'csw30'), ('2.0.2', 'csw')]:
+            self.context.set_model(prefix)
+            self.profiles[version] = prepare_model(
+                self.context, self.config, self.outputschemas)
+        self.context.set_model('csw30')
+
+        # serialized GetCapabilities responses, see Csw.dispatch
+        self.capabilities = {}
+        self.capabilities_ttl = 10
+        if self.config.has_option('server', 'capabilities_ttl'):
+            self.capabilities_ttl = int(
+                self.config.get('server', 'capabilities_ttl'))
+        self.updatesequence = None
+        self.updatesequence_time = 0
+
+        # the record geometry cache of the default repository is process-wide
+        if (not self.config.has_option('repository', 'source') and
+                self.config.has_option('repository', 'geometry_cache')):
+            from pycsw.core import repository
+            repository.RECORD_GEOMETRIES.size = int(
+                self.config.get('repository', 'geometry_cache'))
+
+    @classmethod
+    def get(cls, config_path):
+        """ Return the (possibly cached) state of a configuration file """
+
+        mtime = os.path.getmtime(config_path)
+        state = cls._states.get(config_path)
+        if state is None or state.mtime != mtime:
+            with cls._lock:
+                state = cls._states.get(config_path)
+                if state is None or state.mtime != mtime:
+                    if state is not None:
+                        state.refresh_repository()
+                    state = cls(config_path, mtime)
+                    cls._states[config_path] = state
+        return state
+
+    def refresh_repository(self):
+        """ Discard cached database state of the default repository
+
+        Touching the configuration file is the signal for a running server
+        to reflect and probe its database again after schema changes.
+        """
+
+        if self.config.has_option('repository', 'source'):  # custom
+            return
+
+        from pycsw.core import repository
+        table = 'records'
+        if self.config.has_option('repository', 'table'):
+            table = self.config.get('repository', 'table')
+        repository.Repository.refresh_datasets(table=table)
+        repository.Repository.refresh_capabilities(table=table)
+
+    def get_updatesequence(self, repository):
+        """ Return the latest insert date of the repository
+
+        The repository is queried at most once every ``capabilities_ttl``
+        seconds, so that cached GetCapabilities responses (and 304 Not
+        Modified replies) are served without touching the database.
+        """
+
+        now = time()
+        if now - self.updatesequence_time >= self.capabilities_ttl:
+            self.updatesequence = repository.query_insert()
+            self.updatesequence_time = now
+        return self.updatesequence
+
+    def set_capabilities(self, key, cached):
+        """ Cache a serialized GetCapabilities response """
+
+        if len(self.capabilities) >= 64:  # bound arbitrary request keys
+            self.capabilities.clear()
+        self.capabilities[key] = cached
+
+    def invalidate_capabilities(self):
+        """ Force a repository check on the next GetCapabilities request """
+
+        self.updatesequence_time = 0
+
+    @classmethod
+    def clear(cls):
+        """ Drop all cached server states """
+        with cls._lock:
+            cls._states.clear()
+
+
+def setup_config(cfg, context):
+    """ Apply server wide configuration defaults and set up logging """
+
+    # set server.home safely
+    # TODO: make this more abstract
+    cfg.set(
+        'server', 'home',
+        os.path.dirname(os.path.join(os.path.dirname(__file__), '..'))
+    )
+
+    context.pycsw_home = cfg.get('server', 'home')
+    context.url = cfg.get('server', 'url')
+
+    log.setup_logger(cfg)
+
+    # set OGC schemas location
+    if not cfg.has_option('server', 'ogc_schemas_base'):
+        cfg.set('server', 'ogc_schemas_base', context.ogc_schemas_base)
+
+
+def load_mappings(cfg, context):
+    """ Load user-defined repository mappings, if they exist """
+
+    if cfg.has_option('repository', 'mappings'):
+        # override default repository mappings
+        import imp
+        module = cfg.get('repository', 'mappings')
+        if '/' in module:  # filepath
+            modulename = '%s' % os.path.splitext(module)[0].replace(
+                os.sep, '.')
+            mappings = imp.load_source(modulename, module)
+        else:  # dotted name
+            mappings = __import__(module, fromlist=[''])
+        LOGGER.info('Loading custom repository mappings '
+                    'from %s', module)
+        context.md_core_model = mappings.MD_CORE_MODEL
+        context.refresh_dc(mappings.MD_CORE_MODEL)
+
+
+def load_outputschemas():
+    """ Load outputschemas, return dict by namespace """
+
+    LOGGER.info('Loading outputschemas')
+
+    outputschemas = {}
+    for osch in pycsw.plugins.outputschemas.__all__:
+        output_schema_module = __import__(
+            'pycsw.plugins.outputschemas.%s' % osch)
+        mod = getattr(output_schema_module.plugins.outputschemas, osch)
+        outputschemas[mod.NAMESPACE] = mod
+    return outputschemas
+
+
+def prepare_model(context, cfg, outputschemas):
+    """ Prepare the current information model of context for a configuration
+
+    Advertises transactions, the distributed search and output schemas,
+    and loads profiles.  Returns the loaded profiles, if any.
+    """
+
+    profiles = None
+    namespaces = context.namespaces
+    ops = context.model['operations']
+    constraints = context.model['constraints']
+
+    # advertise CSW-T operations, if specified in config
+    if (cfg.has_option('manager', 'transactions') and
+            cfg.get('manager', 'transactions') == 'true'):
+
+        context.model['operations_order'].append('Transaction')
+
+        ops['Transaction'] = {
+            'methods': {'get': False, 'post': True},
+            'parameters': {}
+        }
+
+        schema_values = [
+            'http://www.opengis.net/cat/csw/2.0.2',
+            'http://www.opengis.net/cat/csw/3.0',
+            'http://www.opengis.net/wms',
+            'http://www.opengis.net/wmts/1.0',
+            'http://www.opengis.net/wfs',
+            'http://www.opengis.net/wfs/2.0',
+            'http://www.opengis.net/wcs',
+            'http://www.opengis.net/wps/1.0.0',
+            'http://www.opengis.net/sos/1.0',
+            'http://www.opengis.net/sos/2.0',
+            'http://www.isotc211.org/2005/gmi',
+            'urn:geoss:waf',
+        ]
+
+        context.model['operations_order'].append('Harvest')
+
+        ops['Harvest'] = {
+            'methods': {'get': False, 'post': True},
+            'parameters': {
+                'ResourceType': {'values': schema_values}
+            }
+        }
+
+        ops['Transaction'] = {
+            'methods': {'get': False, 'post': True},
+            'parameters': {
+                'TransactionSchemas': {'values': sorted(schema_values)}
+            }
+        }
+
+    # generate domain model
+    if 'GetDomain' not in ops:
+        ops['GetDomain'] = context.gen_domains()
+
+    # generate distributed search model, if specified in config
+    if cfg.has_option('server', 'federatedcatalogues'):
+        LOGGER.info('Configuring distributed search')
+
+        constraints['FederatedCatalogues'] = {'values': []}
+
+        for fedcat in cfg.get('server', 'federatedcatalogues').split(','):
+            LOGGER.debug('federated catalogue: %s', fedcat)
+            constraints['FederatedCatalogues']['values'].append(fedcat)
+
+    for key, value in outputschemas.items():
+        get_records_params = ops['GetRecords']['parameters']
+        get_records_params['outputSchema']['values'].append(
+            value.NAMESPACE)
+        get_records_by_id_params = ops['GetRecordById']['parameters']
+        get_records_by_id_params['outputSchema']['values'].append(
+            value.NAMESPACE)
+        if 'Harvest' in ops:
+            harvest_params = ops['Harvest']['parameters']
+            harvest_params['ResourceType']['values'].append(
+                value.NAMESPACE)
+
+    LOGGER.info('Setting MaxRecordDefault')
+    if cfg.has_option('server', 'maxrecords'):
+        constraints['MaxRecordDefault']['values'] = [
+            cfg.get('server', 'maxrecords')]
+
+    # load profiles
+    if cfg.has_option('server', 'profiles'):
+        profiles = pprofile.load_profiles(
+            os.path.join('pycsw', 'plugins', 'profiles'),
+            pprofile.Profile,
+            cfg.get('server', 'profiles')
+        )
+
+        for prof in profiles['plugins'].keys():
+            tmp = profiles['plugins'][prof](context.model, namespaces,
+                                            context)
+
+            key = tmp.outputschema  # to ref by outputschema
+            profiles['loaded'][key] = tmp
+            profiles['loaded'][key].extend_core(context.model, namespaces,
+                                                cfg)
+
+        LOGGER.debug('Profiles loaded: %s' % list(profiles['loaded'].keys()))
+
+    return profiles
@@ -38,13 +38,13 @@ class Sru(object):
     def __init__(self, context):
         self.sru_version = '1.1'
 
-        self.namespaces = {
+        self.namespaces = util.Namespaces({
             'zd': 'http://www.loc.gov/zing/srw/diagnostic/',
             'sru': 'http://www.loc.gov/zing/srw/',
             'zr': 'http://explain.z3950.org/dtd/2.1/',
             'zs': 'http://www.loc.gov/zing/srw/',
             'srw_dc': 'info:srw/schema/1/dc-schema'
-        }
+        })
 
         self.mappings = {
             'csw:Record': {
@@ -112,7 +112,8 @@ class Sru(object):
                     kvpout['constraint'] = {'type': 'cql'}
 
                     if not pname_in_query:
-                        kvpout['constraint'] = 'csw:AnyText like \'%%%s%%\'' % kvpin['query']
+                        kvpout['constraint'] = 'csw:AnyText like \'%%%s%%\'' % \
+                            kvpin['query'].replace('\'', '\'\'')
                     else:
                         kvpout['constraint'] = kvpin['query']
         else:
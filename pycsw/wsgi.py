@@ -57,6 +57,8 @@
 import gzip
 import os
 import sys
+import types
+import zlib
 
 import six
 from six.moves import configparser
@@ -75,17 +77,47 @@ def application(env, start_response):
         env['HTTP_HOST'] = env['HTTP_HOST'].split(':')[0]
     csw = server.Csw(configuration_path, env)
     status, contents = csw.dispatch_wsgi()
+    # with compression configured, responses depend on Accept-Encoding
+    compressible = csw.config.has_option("server", "gzip_compresslevel")
+    gzip_accepted = "gzip" in env.get("HTTP_ACCEPT_ENCODING", "")
+    if isinstance(contents, types.GeneratorType):  # streamed response
+        headers = {'Content-Type': str(csw.contenttype)}
+        headers.update(csw.headers)
+        if compressible:
+            headers['Vary'] = 'Accept-Encoding'
+        if gzip_accepted and compressible:
+            compression_level = int(
+                csw.config.get("server", "gzip_compresslevel"))
+            contents = compress_response_stream(contents, compression_level)
+            headers['Content-Encoding'] = 'gzip'
+            if 'ETag' in headers:
+                headers['ETag'] = get_gzip_etag(headers['ETag'])
+        start_response(status, list(headers.items()))
+        return contents
     headers = {
         'Content-Length': str(len(contents)),
         'Content-Type': str(csw.contenttype)
     }
-    if "gzip" in env.get("HTTP_ACCEPT_ENCODING", ""):
+    headers.update(csw.headers)
+    if status.startswith('304'):  # Not Modified: no message body
+        headers = dict(csw.headers)
+        if compressible:
+            headers['Vary'] = 'Accept-Encoding'
+            if gzip_accepted and 'ETag' in headers:  # that of the gzip body
+                headers['ETag'] = get_gzip_etag(headers['ETag'])
+        start_response(status, list(headers.items()))
+        return [contents]
+    if compressible:
+        headers['Vary'] = 'Accept-Encoding'
+    if gzip_accepted:
         try:
             compression_level = int(
                 csw.config.get("server", "gzip_compresslevel"))
             contents, compress_headers = compress_response(
                 contents, compression_level)
             headers.update(compress_headers)
+            if 'ETag' in headers:
+                headers['ETag'] = get_gzip_etag(headers['ETag'])
         except configparser.NoOptionError:
             print(
                 "The client requested a gzip compressed response. However, "
@@ -99,6 +131,30 @@ def application(env, start_response):
     return [contents]
 
 
+def get_gzip_etag(etag):
+    """Get the entity tag of a response once compressed with gzip
+
+    The compressed and uncompressed responses are distinct
+    representations, so a strong entity tag gets a suffix identifying the
+    gzip one (see ``server.GZIP_ETAG_SUFFIX``)
+
+    Parameters
+    ----------
+    etag: str
+        The entity tag of the uncompressed response
+
+    Returns
+    -------
+    str
+        The entity tag of the compressed response
+
+    """
+
+    if etag.startswith('W/'):  # weak tags ignore the content coding
+        return etag
+    return '%s%s"' % (etag[:-1], server.GZIP_ETAG_SUFFIX)
+
+
 def compress_response(response, compression_level):
     """Compress pycsw's response with gzip
 
@@ -128,6 +184,32 @@ def compress_response(response, compression_level):
     return compressed_response, compression_headers
 
 
+def compress_response_stream(response, compression_level):
+    """Compress a streamed pycsw response with gzip
+
+    Parameters
+    ----------
+    response: iterable
+        The chunks of the already processed CSW request
+    compression_level: int
+        Level of compression to use in gzip algorithm
+
+    Yields
+    ------
+    bytes
+        Chunks of the compressed response
+
+    """
+
+    compressor = zlib.compressobj(compression_level, zlib.DEFLATED,
+                                  16 + zlib.MAX_WBITS)
+    for chunk in response:
+        compressed_chunk = compressor.compress(chunk)
+        if compressed_chunk:
+            yield compressed_chunk
+    yield compressor.flush()
+
+
 def get_pycsw_root_path(process_environment, request_environment=None,
                         root_path_key="PYCSW_ROOT"):
     """Get pycsw's root path.
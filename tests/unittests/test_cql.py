@@ -0,0 +1,116 @@
+# =================================================================
+#
+# Authors: pycsw development team
+#
+# Copyright (c) 2026 pycsw development team
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Unit tests for pycsw.ogc.csw.cql"""
+
+import pytest
+
+from pycsw.core.config import StaticContext
+from pycsw.ogc.csw import cql
+from pycsw.ogc.fes import fes1
+
+pytestmark = pytest.mark.unit
+
+QUERYABLES = {
+    "dc:title": {"dbcol": "title"},
+    "dc:date": {"dbcol": "date"},
+    "csw:AnyText": {"dbcol": "anytext"},
+    "ows:BoundingBox": {"dbcol": "wkt_geometry"},
+    "pycsw:BoundingBox": "wkt_geometry",
+    "pycsw:Identifier": "identifier",
+}
+
+
+@pytest.mark.parametrize("dbtype, fts, spatial_index", [
+    ("sqlite", False, None),
+    ("sqlite", "records_fts", {"type": "rtree", "table": "records_rtree"}),
+    ("postgresql+postgis+wkt", True, None),
+    ("mysql", False, None),
+])
+@pytest.mark.parametrize("query", [
+    "dc:title like '%lor%'",
+    "dc:title like '%lor%' or csw:AnyText like '%pharetra%'",
+    "dc:title LIKE '%Lorem ipsum%' AND dc:date >= 2010-01-01",
+    "dc:title ilike 'lorem' and dc:title <> 'O''Brien'",
+    "NOT csw:AnyText like '%lorem%'",
+    "NOT upper(dc:title) = 'LOREM'",
+    "dc:title like '%a%' and not dc:date > 2000",
+    "dc:date DURING 2000-01-01/2010-01-01 or dc:date before 1990",
+    "dc:title = 'x' or (dc:date > 2000 and dc:date < 2010)",
+    "BBOX(ows:BoundingBox, -5, 47, 20, 55) and dc:title like '%lor%'",
+    "NOT BBOX(ows:BoundingBox, -5, 47, 20, 55)",
+    "WITHIN(ows:BoundingBox, ENVELOPE(-10, 10, 20, -20))",
+    "DWITHIN(ows:BoundingBox, POINT(1 2), 5, meters)",
+])
+def test_parse_as_fes1(dbtype, fts, spatial_index, query):
+    namespaces = StaticContext().namespaces
+    expected_constraint = {}
+    expected = fes1.parse(cql.cql2fes1(query, namespaces), QUERYABLES,
+                          dbtype, namespaces, fts=fts,
+                          spatial_index=spatial_index,
+                          constraint=expected_constraint)
+    constraint = {}
+    result = cql.parse(query, QUERYABLES, dbtype, fts=fts,
+                       spatial_index=spatial_index, constraint=constraint)
+    assert result == expected
+    assert constraint == expected_constraint
+
+
+@pytest.mark.parametrize("query, where, values", [
+    ("dc:title = 'a' and dc:date > 1 or dc:title = 'b'",
+     "(title = :pvalue0 and date > :pvalue1) or title = :pvalue2",
+     ["a", "1", "b"]),
+    ("dc:title = 'a' and (dc:date > 1 or dc:title = 'b')",
+     "title = :pvalue0 and (date > :pvalue1 or title = :pvalue2)",
+     ["a", "1", "b"]),
+    ("not (dc:title = 'a' or dc:title = 'b')",
+     "not (title = :pvalue0 or title = :pvalue1)", ["a", "b"]),
+    ("dc:title not like 'a' and dc:date is not null",
+     "not title like :pvalue0 and date is not null", ["a"]),
+    ("dc:title = 'it''s and or'", "title = :pvalue0", ["it's and or"]),
+])
+def test_parse_nested(query, where, values):
+    assert cql.parse(query, QUERYABLES, "sqlite") == (where, values)
+
+
+@pytest.mark.parametrize("query", [
+    "dc:title like",
+    "dc:title like 'a' and",
+    "(dc:title = 'a'",
+    "dc:title = 'a')",
+    "dc:title ~ 'a'",
+    "dc:title = 'a",
+    "dc:subject = 'a'",
+    "foo(dc:title) = 'a'",
+    "BBOX(ows:BoundingBox, -5, 47, 20)",
+    "BBOX(dc:title, -5, 47, 20, 55)",
+    "INTERSECTS(ows:BoundingBox, CIRCLE(1 2))",
+])
+def test_parse_invalid(query):
+    with pytest.raises(RuntimeError):
+        cql.parse(query, QUERYABLES, "sqlite")
@@ -0,0 +1,157 @@
+# =================================================================
+#
+# Authors: pycsw development team
+#
+# Copyright (c) 2026 pycsw development team
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Unit tests for pycsw.ogc.fes"""
+
+import pytest
+
+from pycsw.core.config import StaticContext
+from pycsw.core.etree import etree
+from pycsw.ogc.fes import fes1
+from pycsw.ogc.fes import fes2
+
+pytestmark = pytest.mark.unit
+
+QUERYABLES = {
+    "dc:title": {"dbcol": "title"},
+    "dc:date": {"dbcol": "date"},
+    "csw:AnyText": {"dbcol": "anytext"},
+    "ows:BoundingBox": {"dbcol": "wkt_geometry"},
+    "pycsw:BoundingBox": "wkt_geometry",
+    "pycsw:Identifier": "identifier",
+}
+
+LIKE = ("<ogc:PropertyIsLike wildCard='*' singleChar='#' escapeChar='!'>"
+        "<ogc:PropertyName>{0}</ogc:PropertyName>"
+        "<ogc:Literal>{1}</ogc:Literal></ogc:PropertyIsLike>")
+
+BBOX = ("<ogc:BBOX><ogc:PropertyName>ows:BoundingBox</ogc:PropertyName>"
+        "<gml:Envelope><gml:lowerCorner>47 -5</gml:lowerCorner>"
+        "<gml:upperCorner>55 20</gml:upperCorner></gml:Envelope></ogc:BBOX>")
+
+
+def _get_filter(operators):
+    return etree.fromstring(
+        '<ogc:Filter xmlns:ogc="http://www.opengis.net/ogc" '
+        'xmlns:gml="http://www.opengis.net/gml">%s</ogc:Filter>' % operators)
+
+
+@pytest.mark.parametrize("module", [fes1, fes2])
+@pytest.mark.parametrize("dbtype, fts", [
+    ("sqlite", False),
+    ("sqlite", "records_fts"),
+    ("postgresql+postgis+wkt", True),
+])
+@pytest.mark.parametrize("template, literals", [
+    (LIKE.format("dc:title", "{0}"), ["*Lorem#*", "ipsum*"]),
+    (LIKE.format("csw:AnyText", "{0}"), ["*lorem*", "dolor sit", "um"]),
+    ("<ogc:And>%s<ogc:PropertyIsBetween><ogc:PropertyName>dc:date"
+     "</ogc:PropertyName><ogc:LowerBoundary><ogc:Literal>{0}</ogc:Literal>"
+     "</ogc:LowerBoundary><ogc:UpperBoundary><ogc:Literal>2010"
+     "</ogc:Literal></ogc:UpperBoundary></ogc:PropertyIsBetween>"
+     "</ogc:And>" % BBOX, ["2000", "2005"]),
+    ("<ogc:Or><ogc:FeatureId fid='{0}'/><ogc:PropertyIsEqualTo>"
+     "<ogc:PropertyName>dc:title</ogc:PropertyName>"
+     "<ogc:Literal>{0}</ogc:Literal></ogc:PropertyIsEqualTo></ogc:Or>",
+     ["urn:uuid:1", "urn:uuid:2"]),
+])
+def test_parse_compiled_filter(module, dbtype, fts, template, literals):
+    namespaces = StaticContext().namespaces
+    module.COMPILED_FILTERS.clear()
+    expected = []
+    for literal in literals:  # compile each filter afresh
+        module.COMPILED_FILTERS.clear()
+        expected.append(module.parse(_get_filter(template.format(literal)),
+                                     QUERYABLES, dbtype, namespaces, fts=fts))
+    module.COMPILED_FILTERS.clear()
+    results = [module.parse(_get_filter(template.format(literal)),
+                            QUERYABLES, dbtype, namespaces, fts=fts)
+               for literal in literals]
+    assert results == expected
+    info = module.COMPILED_FILTERS.cache_info()
+    assert info.hits + info.misses == len(literals)
+    assert info.hits > 0
+
+
+def test_parse_compiled_filter_ranking():
+    namespaces = StaticContext().namespaces
+    fes1.COMPILED_FILTERS.clear()
+    constraints = [{}, {}, None]
+    for constraint in constraints:
+        fes1.parse(_get_filter(BBOX), QUERYABLES, "sqlite", namespaces,
+                   constraint=constraint)
+    assert fes1.COMPILED_FILTERS.cache_info().hits == 2
+    assert constraints[0]["ranking"] == constraints[1]["ranking"]
+    assert constraints[1]["ranking"].startswith("POLYGON")
+
+
+@pytest.mark.parametrize("module", [fes1, fes2])
+@pytest.mark.parametrize("dbtype, spatial_index", [
+    ("sqlite", None),
+    ("sqlite", {"type": "rtree", "table": "records_rtree"}),
+    ("sqlite", {"type": "bounds", "columns": ["minx", "miny", "maxx",
+                                               "maxy"]}),
+    ("mysql", None),
+    ("postgresql+postgis+wkt", None),
+    ("postgresql+postgis+native", None),
+])
+@pytest.mark.parametrize("operator", [
+    "<ogc:BBOX>%s</ogc:BBOX>",
+    "<ogc:Not><ogc:Intersects>%s</ogc:Intersects></ogc:Not>",
+    "<ogc:DWithin>%s<ogc:Distance units='deg'>2</ogc:Distance></ogc:DWithin>",
+])
+def test_parse_binds_geometry(module, dbtype, spatial_index, operator):
+    namespaces = StaticContext().namespaces
+    module.COMPILED_FILTERS.clear()
+    results = []
+    for upper in ["55 20", "60 30"]:
+        spatial = BBOX.replace("55 20", upper)
+        spatial = spatial[spatial.index("<ogc:PropertyName>"):
+                          spatial.index("</ogc:BBOX>")]
+        constraint = {}
+        results.append(module.parse(_get_filter(operator % spatial),
+                                    QUERYABLES, dbtype, namespaces,
+                                    spatial_index=spatial_index,
+                                    constraint=constraint))
+        assert constraint["ranking"] in results[-1][1]
+    assert results[0][0] == results[1][0]
+    assert "POLYGON" not in results[0][0]
+    assert results[0][1] != results[1][1]
+    assert module.COMPILED_FILTERS.cache_info().hits == 1
+
+
+def test_parse_invalid_distance():
+    namespaces = StaticContext().namespaces
+    spatial = BBOX[len("<ogc:BBOX>"):-len("</ogc:BBOX>")]
+    element = _get_filter(
+        "<ogc:DWithin>%s<ogc:Distance units='deg'>far</ogc:Distance>"
+        "</ogc:DWithin>" % spatial)
+    where, values = fes1.parse(element, QUERYABLES, "sqlite", namespaces)
+    assert "far" in values
+    with pytest.raises(RuntimeError):
+        fes1.parse(element, QUERYABLES, "postgresql+postgis+wkt", namespaces)
@@ -31,6 +31,7 @@
 
 import pytest
 
+from pycsw.core.etree import etree
 from pycsw.core.formats import fmt_json
 
 pytestmark = pytest.mark.unit
@@ -91,3 +92,27 @@ def test_xml2dict():
     result = fmt_json.xml2dict(xml_string=xml, namespaces=namespaces)
     assert result["csw:GetRecordsResponse"]["csw:SearchResults"][
         "csw:Record"]["dc:identifier"] == identifier
+
+
+@pytest.mark.parametrize("xml", [
+    '<a/>',
+    '<a>text</a>',
+    '<a x="1" y="2">text</a>',
+    '<a>  </a>',
+    '<a><b>1</b><c/><b>2</b><b>3</b></a>',
+    '<a>mixed <b>1</b> content<!-- comment --> here</a>',
+    '<a xmlns="urn:unknown" xmlns:dc="http://purl.org/dc/elements/1.1/" '
+    'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+    'xsi:type="t"><dc:title xml:lang="en">x</dc:title></a>',
+])
+def test_etree2dict(xml):
+    namespaces = {
+        "dc": "http://purl.org/dc/elements/1.1/",
+        "xsi": "http://www.w3.org/2001/XMLSchema-instance",
+    }
+    element = etree.fromstring(xml)
+    expected = fmt_json.xml2dict(xml_string=xml, namespaces=namespaces)
+    result = fmt_json.etree2dict(element, namespaces)
+    assert list(result.items()) == list(expected.items())
+    assert (fmt_json.etree2json(element, namespaces, pretty_print=True) ==
+            fmt_json.xml2json(xml, namespaces, pretty_print=True))
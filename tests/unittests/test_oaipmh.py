@@ -0,0 +1,71 @@
+# =================================================================
+#
+# Authors: Ricardo Garcia Silva <ricardo.garcia.silva@gmail.com>
+#
+# Copyright (c) 2017 Ricardo Garcia Silva
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Unit tests for pycsw.oaipmh"""
+
+import pytest
+
+from pycsw import oaipmh
+from pycsw.core import config
+from pycsw.core.etree import etree
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.mark.parametrize("prefix, expected", [
+    ("csw-record", {"elementname": "dc:identifier,dct:modified"}),
+    ("iso19139", {"elementname": "dc:identifier,dct:modified"}),
+    ("foo", {"elementsetname": "full", "outputschema": "foo"}),
+])
+def test_request_list_identifiers(prefix, expected):
+    oai = oaipmh.OAIPMH(config.StaticContext(), None)
+    kvp = oai.request({"mode": "oaipmh", "verb": "ListIdentifiers",
+                       "metadataprefix": prefix})
+    for name in ["elementname", "elementsetname", "outputschema"]:
+        assert kvp.get(name) == expected.get(name)
+
+
+def test_transform_element_scoped_to_record():
+    context = config.StaticContext()
+    oai = oaipmh.OAIPMH(context, None)
+    response = etree.fromstring(
+        '<csw:GetRecordsResponse xmlns:csw="%s" xmlns:dc="%s" '
+        'xmlns:dct="%s"><csw:SearchResults>'
+        '<csw:Record><dc:identifier>a</dc:identifier></csw:Record>'
+        '<csw:Record><dc:identifier>b</dc:identifier>'
+        '<dct:modified>2017-01-01</dct:modified></csw:Record>'
+        '</csw:SearchResults></csw:GetRecordsResponse>' % (
+            context.namespaces["csw"], context.namespaces["dc"],
+            context.namespaces["dct"]))
+    headers = []
+    for record in response[0]:
+        header = etree.Element("header")
+        for elname in ["oai:identifier", "oai:dateStamp"]:
+            oai._transform_element(header, record, elname, "csw-record")
+        headers.append([element.text for element in header])
+    assert headers == [["a", None], ["b", "2017-01-01"]]
@@ -30,6 +30,8 @@
 
 import pytest
 
+from pycsw.core import config
+from pycsw.core.etree import etree
 from pycsw.ogc.csw import csw3
 
 pytestmark = pytest.mark.unit
@@ -42,3 +44,52 @@ pytestmark = pytest.mark.unit
 def test_get_elapsed_time(begin, end, expected):
     result = csw3.get_elapsed_time(begin, end)
     assert result == expected
+
+
+@pytest.mark.parametrize("elementsetname, expected", [
+    ("brief", ["identifier", "title", "type", "BoundingBox"]),
+    ("summary", ["identifier", "title", "type", "subject", "subject",
+                 "references", "modified", "BoundingBox"]),
+])
+def test_compile_record_writer(elementsetname, expected):
+    context = config.StaticContext()
+    queryables = dict(
+        (name, {"dbcol": column}) for name, column in [
+            ("dc:title", "title"), ("dc:type", "type"),
+            ("dc:subject", "keywords"), ("dc:format", "format"),
+            ("dc:relation", "relation"), ("dct:modified", "date_modified"),
+            ("dct:abstract", "abstract"),
+        ]
+    )
+
+    class Phony(object):
+        pass
+
+    recobj = Phony()
+    for column in ["title", "type", "keywords", "format", "relation",
+                   "date_modified", "abstract", "wkt_geometry", "links",
+                   "topicategory"]:
+        setattr(recobj, column, None)
+    recobj.identifier = "id1"
+    recobj.title = "some title"
+    recobj.keywords = "one,two"
+    recobj.date_modified = "2017-01-01"
+    recobj.links = "name,description,WWW:LINK,http://host/path"
+    recobj.wkt_geometry = "POLYGON((0 1,0 3,2 3,2 1,0 1))"
+
+    writer = csw3.compile_record_writer(queryables, elementsetname, context,
+                                        csw3.write_boundingbox)
+    records = []
+    for identifier in ["id1", "id2"]:
+        recobj.identifier = identifier
+        record = etree.Element("record")
+        writer(record, recobj)
+        records.append(record)
+    names = [etree.QName(element).localname for element in records[1]]
+    assert names == expected
+    assert [records[0][0].text, records[1][0].text] == ["id1", "id2"]
+    assert records[1][1].text == "some title"
+    assert records[1][2].text == ""
+    bbox = records[1][-1]
+    assert bbox.get("crs") == "http://www.opengis.net/def/crs/EPSG/0/4326"
+    assert [corner.text for corner in bbox] == ["1.0 0.0", "3.0 2.0"]
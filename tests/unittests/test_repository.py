@@ -28,9 +28,19 @@
 # =================================================================
 """Unit tests for pycsw.core.repository"""
 
+import os
+import sqlite3
+
 import pytest
+import sqlalchemy
+from sqlalchemy.dialects import postgresql
 
+from pycsw.core import admin
 from pycsw.core import repository
+from pycsw.core import util
+from pycsw.core.config import StaticContext
+from pycsw.core.etree import etree
+from pycsw.ogc.fes import fes1
 
 pytestmark = pytest.mark.unit
 
@@ -64,3 +74,550 @@ def test_query_spatial(data, input_, predicate, distance, expected):
         distance=distance
     )
     assert result == expected
+
+
+def test_geometry_cache():
+    cache = repository.GeometryCache(size=2)
+    first = cache.get("POINT(0 0)")
+    assert cache.get("POINT(0 0)") is first
+    cache.get("POINT(1 1)")
+    assert cache.get("POINT(0 0)") is first
+    cache.get("SRID=4326;POINT(2 2)")
+    assert cache.get("POINT(1 1)").wkt == "POINT (1 1)"  # evicted, parsed
+    assert cache.get("POINT(0 0)") is not first  # least recently used
+    prepared = repository.GeometryCache(size=2, prepared=True)
+    assert prepared.get("POINT(0 0)").context.equals(first)
+    disabled = repository.GeometryCache()
+    assert disabled.get("POINT(0 0)") is not disabled.get("POINT(0 0)")
+
+
+@pytest.fixture()
+def database(tmpdir):
+    url = "sqlite:///{0}".format(tmpdir.join("records.db"))
+    admin.setup_db(url, "records", str(tmpdir))
+    yield url
+    repository.Repository.refresh_datasets()
+    repository.Repository.refresh_capabilities()
+
+
+def test_repository_dataset_is_cached(database):
+    context = StaticContext()
+    first = repository.Repository(database, context, table="records")
+    second = repository.Repository(database, context, table="records")
+    assert first.dataset is second.dataset
+    assert "identifier" in first.dataset.__table__.columns
+
+
+def test_repository_refresh_datasets(database):
+    context = StaticContext()
+    first = repository.Repository(database, context, table="records")
+    repository.Repository.refresh_datasets("sqlite:///other.db")
+    assert repository.Repository(
+        database, context, table="records").dataset is first.dataset
+    repository.Repository.refresh_datasets(database, "records")
+    assert repository.Repository(
+        database, context, table="records").dataset is not first.dataset
+
+
+def test_repository_capabilities_are_cached(database):
+    context = StaticContext()
+    repos = repository.Repository(database, context, table="records")
+    assert repos.dbtype == "sqlite"
+    assert repos.postgis_geometry_column is None
+    assert repos.fts == "records_fts"
+    capabilities = repository.Repository.probe_capabilities(
+        repos.engine, None, "records")
+    assert repository.Repository.probe_capabilities(
+        repos.engine, None, "records") is capabilities
+    repository.Repository.refresh_capabilities(database)
+    assert repository.Repository.probe_capabilities(
+        repos.engine, None, "records") is not capabilities
+
+
+@pytest.mark.parametrize("constraint", [
+    {},
+    {"where": "title like :pvalue0", "values": ["%Lorem%"]},
+    {"where": "title = :pvalue0", "values": ["no such title"]},
+])
+def test_repository_count(database, constraint):
+    context = StaticContext()
+    data_path = os.path.join(os.path.dirname(__file__), os.pardir,
+                             "functionaltests", "suites", "cite", "data")
+    admin.load_records(context, database, "records", data_path)
+    repos = repository.Repository(database, context, table="records")
+    matched, results = repos.query(constraint, maxrecords=100)
+    statements = []
+
+    def count_statements(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    sqlalchemy.event.listen(repos.engine, "before_cursor_execute",
+                            count_statements)
+    try:
+        assert repos.count(constraint) == int(matched) == len(results)
+    finally:
+        sqlalchemy.event.remove(repos.engine, "before_cursor_execute",
+                                count_statements)
+    # rows are counted, not a bound parameter
+    assert "count(*)" in statements[0]
+
+
+def test_repository_query_columns(database):
+    context = StaticContext()
+    data_path = os.path.join(os.path.dirname(__file__), os.pardir,
+                             "functionaltests", "suites", "cite", "data")
+    admin.load_records(context, database, "records", data_path)
+    repos = repository.Repository(database, context, table="records")
+    results = repos.query({}, columns=["identifier", "title"])[1]
+    assert len(results) == 10
+    state = sqlalchemy.inspect(results[0])
+    assert "title" not in state.unloaded
+    assert "xml" in state.unloaded
+    assert results[0].xml.startswith(b"<")
+
+
+@pytest.mark.parametrize("sortby", [
+    None,
+    {"propertyname": "title", "order": "ASC"},
+    {"propertyname": "date_modified", "order": "ASC"},
+    {"propertyname": "format", "order": "ASC"},
+    {"propertyname": "format", "order": "DESC"},
+])
+def test_repository_query_keyset(database, sortby):
+    context = StaticContext()
+    data_path = os.path.join(os.path.dirname(__file__), os.pardir,
+                             "functionaltests", "suites", "cite", "data")
+    admin.load_records(context, database, "records", data_path)
+    repos = repository.Repository(database, context, table="records")
+    expected = [record.identifier for record in repos.query(
+        {}, sortby=sortby, maxrecords=100, keyset=True)[1]]
+    pages = []
+    after = None
+    for startposition in range(0, 12, 5):
+        results = repos.query({}, sortby=sortby, maxrecords=5,
+                              startposition=startposition, keyset=True,
+                              after=after)[1]
+        pages.extend(record.identifier for record in results)
+        after = repos.last_key
+    assert pages == expected
+    assert len(set(pages)) == 12
+    # pages are also found from the keys remembered for each position
+    results = repos.query({}, sortby=sortby, maxrecords=5, startposition=10,
+                          keyset=True)[1]
+    assert [record.identifier for record in results] == expected[10:]
+
+
+def test_repository_query_keyset_stale(database):
+    context = StaticContext()
+    data_path = os.path.join(os.path.dirname(__file__), os.pardir,
+                             "functionaltests", "suites", "cite", "data")
+    admin.load_records(context, database, "records", data_path)
+    repos = repository.Repository(database, context, table="records")
+    sortby = {"propertyname": "title", "order": "ASC"}
+    repos.query({}, sortby=sortby, maxrecords=5, keyset=True)
+    first = repos.last_key
+    # a write made without the repository, as by another worker
+    engine = sqlalchemy.create_engine(database)
+    engine.execute("delete from records where identifier = "
+                   "(select identifier from records order by title, "
+                   "identifier limit 1)")
+    expected = [record.identifier for record in repos.query(
+        {}, sortby=sortby, maxrecords=100)[1]]
+    results = repos.query({}, sortby=sortby, maxrecords=5, startposition=5,
+                          keyset=True)[1]
+    assert [record.identifier for record in results] == expected[5:10]
+    # seeking past the remembered key would skip a record
+    assert first[-1] == expected[3]
+
+
+def test_repository_query_keyset_current(database):
+    context = StaticContext()
+    data_path = os.path.join(os.path.dirname(__file__), os.pardir,
+                             "functionaltests", "suites", "cite", "data")
+    admin.load_records(context, database, "records", data_path)
+    repos = repository.Repository(database, context, table="records")
+    sortby = {"propertyname": "title", "order": "ASC"}
+    expected = [record.identifier for record in repos.query(
+        {}, sortby=sortby, maxrecords=100)[1]]
+    repos.query({}, sortby=sortby, maxrecords=5, keyset=True)
+    statements = []
+
+    def count_statements(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    sqlalchemy.event.listen(repos.engine, "before_cursor_execute",
+                            count_statements)
+    try:
+        results = repos.query({}, sortby=sortby, maxrecords=5,
+                              startposition=5, keyset=True)[1]
+    finally:
+        sqlalchemy.event.remove(repos.engine, "before_cursor_execute",
+                                count_statements)
+    assert [record.identifier for record in results] == expected[5:10]
+    # the total, the lookup of the key record and the page
+    assert len(statements) == 3
+    assert sum("count(" in statement for statement in statements) == 1
+
+
+@pytest.mark.parametrize("after", [
+    "urn:uuid:19887a8a-f6b0-4a63-ae56-7fba0e17801f",
+    ["urn:uuid:19887a8a-f6b0-4a63-ae56-7fba0e17801f"],
+    [None, None],
+    [["Lorem ipsum"], "urn:uuid:19887a8a-f6b0-4a63-ae56-7fba0e17801f"],
+    [{"title": 1}, "urn:uuid:19887a8a-f6b0-4a63-ae56-7fba0e17801f"],
+    ["Lorem ipsum", 1],
+])
+def test_repository_query_keyset_invalid(database, after):
+    context = StaticContext()
+    data_path = os.path.join(os.path.dirname(__file__), os.pardir,
+                             "functionaltests", "suites", "cite", "data")
+    admin.load_records(context, database, "records", data_path)
+    repos = repository.Repository(database, context, table="records")
+    sortby = {"propertyname": "title", "order": "ASC"}
+    expected = [record.identifier for record in repos.query(
+        {}, sortby=sortby, maxrecords=100)[1]]
+    # malformed keys, as from forged tokens, fall back to the offset
+    results = repos.query({}, sortby=sortby, maxrecords=5, startposition=5,
+                          keyset=True, after=after)[1]
+    assert [record.identifier for record in results] == expected[5:10]
+
+
+@pytest.mark.parametrize("startposition, maxrecords", [
+    (0, 2),
+    (1, 3),
+    (2, 10),
+    (12, 5),
+])
+@pytest.mark.parametrize("bounds", [True, False, "unset"])
+def test_repository_query_ranked(database, startposition, maxrecords,
+                                 bounds):
+    context = StaticContext()
+    data_path = os.path.join(os.path.dirname(__file__), os.pardir,
+                             "functionaltests", "suites", "cite", "data")
+    admin.load_records(context, database, "records", data_path)
+    repos = repository.Repository(database, context, table="records")
+    if bounds == "unset":  # as written by another tool
+        repos.engine.execute("update records set minx = null, miny = null, "
+                             "maxx = null, maxy = null")
+    elif not bounds:
+        repos._get_bounds_columns = lambda: None
+    geometry = ("POLYGON((-6.171 44.792, -6.171 51.126, -2.228 51.126, "
+                "-2.228 44.792, -6.171 44.792))")
+    records = repos.query({}, maxrecords=100)[1]
+    expected = sorted(records, key=lambda record: (-float(
+        repository.get_spatial_overlay_rank(record.wkt_geometry, geometry)),
+        record.identifier))
+    matched, results = repos.query({"ranking": geometry},
+                                   maxrecords=maxrecords,
+                                   startposition=startposition,
+                                   columns=["identifier", "wkt_geometry"])
+    assert int(matched) == len(records)
+    assert [record.identifier for record in results] == [
+        record.identifier for record in
+        expected[startposition:startposition + maxrecords]]
+
+
+@pytest.mark.parametrize("geometry, ranked", [
+    ("POLYGON((-6.171 44.792, -6.171 51.126, -2.228 51.126, "
+     "-2.228 44.792, -6.171 44.792))", 2),
+    ("POINT(-4 47)", 0),
+])
+def test_repository_query_ranked_prunes(database, monkeypatch, geometry,
+                                        ranked):
+    context = StaticContext()
+    data_path = os.path.join(os.path.dirname(__file__), os.pardir,
+                             "functionaltests", "suites", "cite", "data")
+    admin.load_records(context, database, "records", data_path)
+    repos = repository.Repository(database, context, table="records")
+    records = repos.query({}, maxrecords=100)[1]
+    expected = sorted(records, key=lambda record: (-float(
+        repository.get_spatial_overlay_rank(record.wkt_geometry, geometry)),
+        record.identifier))[:2]
+    calls = []
+    get_rank = repository._get_spatial_overlay_rank
+
+    def get_rank_counted(target_geometry, query_geometry):
+        calls.append(target_geometry)
+        return get_rank(target_geometry, query_geometry)
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    monkeypatch.setattr(repository, "RANKING_BATCH_SIZE", 2)
+    monkeypatch.setattr(repository, "_get_spatial_overlay_rank",
+                        get_rank_counted)
+    sqlalchemy.event.listen(repos.engine, "before_cursor_execute",
+                            before_cursor_execute)
+    try:
+        results = repos.query({"ranking": geometry}, maxrecords=2)[1]
+    finally:
+        sqlalchemy.event.remove(repos.engine, "before_cursor_execute",
+                                before_cursor_execute)
+    assert [record.identifier for record in results] == [
+        record.identifier for record in expected]
+    # records whose envelope cannot reach the top ranks are not ranked,
+    # nor fetched
+    assert len(calls) == ranked
+    batches = [statement for statement in statements
+               if "ORDER BY" in statement and "LIMIT" in statement]
+    assert len(batches) == (2 if ranked else 1)
+
+
+@pytest.mark.parametrize("dbtype, expected", [
+    ("postgresql+postgis+native",
+     "ST_Area(ST_Intersection(wkb_geometry, ST_GeomFromText("),
+    ("postgresql+postgis+wkt",
+     "ST_Area(ST_Intersection(ST_GeomFromText(records.wkt_geometry), "),
+])
+def test_repository_spatial_rank_postgis(database, dbtype, expected):
+    context = StaticContext()
+    repos = repository.Repository(database, context, table="records")
+    repos.dbtype = dbtype
+    repos.postgis_geometry_column = "wkb_geometry"
+    rank = repos._get_spatial_rank(
+        "POLYGON((40 -10, 40 30, 70 30, 70 -10, 40 -10))")
+    sql = str(rank.compile(dialect=postgresql.dialect()))
+    assert sql.startswith("CASE WHEN (")
+    assert expected in sql
+    assert " && " in sql
+
+
+@pytest.mark.parametrize("spatial_index", [
+    {"type": "rtree", "table": "records_rtree"},
+    {"type": "bounds", "columns": ["minx", "miny", "maxx", "maxy"]},
+])
+@pytest.mark.parametrize("envelopes", [True, False])
+@pytest.mark.parametrize("operator, indexed", [
+    ("<ogc:BBOX>{0}</ogc:BBOX>", True),
+    ("<ogc:Not><ogc:BBOX>{0}</ogc:BBOX></ogc:Not>", False),
+    ("<ogc:Or><ogc:Within>{0}</ogc:Within><ogc:PropertyIsEqualTo>"
+     "<ogc:PropertyName>dc:title</ogc:PropertyName>"
+     "<ogc:Literal>Lorem ipsum</ogc:Literal></ogc:PropertyIsEqualTo>"
+     "</ogc:Or>", True),
+    ("<ogc:Disjoint>{0}</ogc:Disjoint>", False),
+    ("<ogc:DWithin>{0}<ogc:Distance units='deg'>10</ogc:Distance>"
+     "</ogc:DWithin>", True),
+])
+def test_repository_spatial_index(database, spatial_index, envelopes,
+                                  operator, indexed):
+    context = StaticContext()
+    data_path = os.path.join(os.path.dirname(__file__), os.pardir,
+                             "functionaltests", "suites", "cite", "data")
+    admin.load_records(context, database, "records", data_path)
+    repos = repository.Repository(database, context, table="records")
+    assert repos.spatial_index == {"type": "rtree", "table": "records_rtree"}
+    if not envelopes:  # as written by another tool
+        repos.engine.execute("update records set minx = null, miny = null, "
+                             "maxx = null, maxy = null")
+    envelope = (
+        "<ogc:PropertyName>ows:BoundingBox</ogc:PropertyName>"
+        "<gml:Envelope><gml:lowerCorner>47 -5</gml:lowerCorner>"
+        "<gml:upperCorner>55 20</gml:upperCorner></gml:Envelope>"
+    )
+    element = etree.fromstring(
+        '<ogc:Filter xmlns:ogc="http://www.opengis.net/ogc" '
+        'xmlns:gml="http://www.opengis.net/gml">%s</ogc:Filter>' %
+        operator.format(envelope)
+    )
+    queryables = repos.queryables["_all"]
+    results = []
+    for index in (None, spatial_index):
+        where, values = fes1.parse(element, queryables, repos.dbtype,
+                                   context.namespaces, spatial_index=index)
+        results.append(sorted(
+            record.identifier for record in repos.query(
+                {"where": where, "values": values}, maxrecords=100)[1]))
+    assert ("maxx >=" in where) == indexed
+    assert results[0] == results[1]
+    assert envelopes or not indexed or results[0]
+
+
+def test_repository_update_bounds(database):
+    context = StaticContext()
+    data_path = os.path.join(os.path.dirname(__file__), os.pardir,
+                             "functionaltests", "suites", "cite", "data")
+    admin.load_records(context, database, "records", data_path)
+    engine = sqlalchemy.create_engine(database)
+    expected = engine.execute("select identifier, minx, miny, maxx, maxy "
+                              "from records order by identifier").fetchall()
+    # a table created before the envelope columns and R*Tree existed
+    for trigger in ["insert", "update", "stale", "delete"]:
+        engine.execute("drop trigger records_rtree_%s" % trigger)
+    engine.execute("drop table records_rtree")
+    for column in ["minx", "miny", "maxx", "maxy"]:
+        engine.execute("drop index ix_records_%s" % column)
+        engine.execute("alter table records drop column %s" % column)
+    repository.Repository.refresh_datasets(database, "records")
+    assert admin.update_bounds(context, database, "records") == 3
+    assert engine.execute("select identifier, minx, miny, maxx, maxy "
+                          "from records order by identifier").fetchall() == \
+        expected
+    assert admin.update_bounds(context, database, "records") == 0
+
+
+def test_metadata_sets_bounds(database):
+    context = StaticContext()
+    data_path = os.path.join(os.path.dirname(__file__), os.pardir,
+                             "functionaltests", "suites", "cite", "data")
+    admin.load_records(context, database, "records", data_path)
+    repos = repository.Repository(database, context, table="records")
+    records = repos.query({"where": "wkt_geometry is not null",
+                           "values": []}, maxrecords=100)[1]
+    assert len(records) == 3
+    for record in records:
+        assert (record.minx, record.miny, record.maxx, record.maxy) == \
+            util.wkt2geom(record.wkt_geometry)
+    assert repos.count({"where": "minx is null", "values": []}) == \
+        repos.count({"where": "wkt_geometry is null", "values": []})
+
+
+def test_repository_spatial_index_follows_records(database):
+    context = StaticContext()
+    data_path = os.path.join(os.path.dirname(__file__), os.pardir,
+                             "functionaltests", "suites", "cite", "data")
+    admin.load_records(context, database, "records", data_path)
+    repos = repository.Repository(database, context, table="records")
+
+    def count_envelopes():
+        return repos.engine.execute(
+            "select count(*) from records_rtree").scalar()
+
+    geometries = repos.count({"where": "wkt_geometry is not null",
+                              "values": []})
+    assert geometries > 0
+    assert count_envelopes() == geometries
+    admin.rebuild_db_indexes(database, "records")
+    assert count_envelopes() == geometries
+    repos.delete({"where": "wkt_geometry is not null", "values": []})
+    assert count_envelopes() == 0
+
+
+def test_repository_spatial_index_plain_sql_writes(database):
+    context = StaticContext()
+    data_path = os.path.join(os.path.dirname(__file__), os.pardir,
+                             "functionaltests", "suites", "cite", "data")
+    admin.load_records(context, database, "records", data_path)
+    repos = repository.Repository(database, context, table="records")
+    # a client without the functions pycsw registers on its connections
+    connection = sqlite3.connect(database[len("sqlite:///"):])
+    with connection:
+        connection.execute(
+            "insert into records (identifier, typename, schema, mdsource, "
+            "insert_date, xml, anytext, wkt_geometry) select 'copy', "
+            "typename, schema, mdsource, insert_date, xml, anytext, "
+            "'POLYGON((100 10, 100 20, 110 20, 110 10, 100 10))' from "
+            "records where wkt_geometry is null limit 1")
+        connection.execute(
+            "update records set wkt_geometry = "
+            "'POLYGON((101 11, 101 12, 102 12, 102 11, 101 11))' where "
+            "identifier = (select identifier from records where minx is "
+            "not null order by identifier limit 1)")
+    connection.close()
+    assert repos.count({"where": "minx is null and wkt_geometry is not null",
+                        "values": []}) == 2
+    element = etree.fromstring(
+        '<ogc:Filter xmlns:ogc="http://www.opengis.net/ogc" '
+        'xmlns:gml="http://www.opengis.net/gml"><ogc:BBOX>'
+        "<ogc:PropertyName>ows:BoundingBox</ogc:PropertyName>"
+        "<gml:Envelope><gml:lowerCorner>5 95</gml:lowerCorner>"
+        "<gml:upperCorner>25 115</gml:upperCorner></gml:Envelope>"
+        "</ogc:BBOX></ogc:Filter>")
+    where, values = fes1.parse(element, repos.queryables["_all"],
+                               repos.dbtype, context.namespaces,
+                               spatial_index=repos.spatial_index)
+    assert "records_rtree" in where
+    assert repos.count({"where": where, "values": values}) == 2
+    assert admin.update_bounds(context, database, "records") == 2
+    assert repos.count({"where": where, "values": values}) == 2
+
+
+@pytest.mark.parametrize("operator, indexed", [
+    ("<ogc:PropertyIsLike wildCard='%' singleChar='_' escapeChar='\\'>"
+     "{0}<ogc:Literal>%lorem%</ogc:Literal></ogc:PropertyIsLike>", True),
+    ("<ogc:PropertyIsEqualTo>{0}<ogc:Literal>LOREM ipsum"
+     "</ogc:Literal></ogc:PropertyIsEqualTo>", True),
+    ("<ogc:Not><ogc:PropertyIsEqualTo>{0}<ogc:Literal>lorem"
+     "</ogc:Literal></ogc:PropertyIsEqualTo></ogc:Not>", True),
+    ("<ogc:PropertyIsLike wildCard='*' singleChar='#' escapeChar='\\'>"
+     "{0}<ogc:Literal>lor*m</ogc:Literal></ogc:PropertyIsLike>", False),
+    ("<ogc:PropertyIsEqualTo>{0}<ogc:Literal>um</ogc:Literal>"
+     "</ogc:PropertyIsEqualTo>", False),
+])
+def test_repository_fts(database, operator, indexed):
+    context = StaticContext()
+    data_path = os.path.join(os.path.dirname(__file__), os.pardir,
+                             "functionaltests", "suites", "cite", "data")
+    admin.load_records(context, database, "records", data_path)
+    repos = repository.Repository(database, context, table="records")
+    element = etree.fromstring(
+        '<ogc:Filter xmlns:ogc="http://www.opengis.net/ogc">%s</ogc:Filter>'
+        % operator.format(
+            "<ogc:PropertyName>csw:AnyText</ogc:PropertyName>")
+    )
+    queryables = repos.queryables["_all"]
+    results = []
+    for fts in (False, repos.fts):
+        where, values = fes1.parse(element, queryables, repos.dbtype,
+                                   context.namespaces, fts=fts)
+        results.append(sorted(
+            record.identifier for record in repos.query(
+                {"where": where, "values": values}, maxrecords=100)[1]))
+    assert ("records_fts" in where) == indexed
+    assert 0 < len(results[0]) < 12
+    assert results[0] == results[1]
+
+
+def test_repository_renders_records(database):
+    context = StaticContext()
+    data_path = os.path.join(os.path.dirname(__file__), os.pardir,
+                             "functionaltests", "suites", "cite", "data")
+    admin.load_records(context, database, "records", data_path)
+    repos = repository.Repository(database, context, table="records")
+    records = repos.query({"where": "1=1", "values": []}, maxrecords=100)[1]
+    assert len(records) == 12
+    for record in records:
+        brief = etree.fromstring(record.xml_brief)
+        summary = etree.fromstring(record.xml_summary)
+        assert brief.tag == "{http://www.opengis.net/cat/csw/2.0.2}BriefRecord"
+        assert summary.tag == \
+            "{http://www.opengis.net/cat/csw/2.0.2}SummaryRecord"
+        assert brief.findtext(
+            "{http://purl.org/dc/elements/1.1/}identifier") == \
+            record.identifier
+
+
+def test_repository_update_renders_records(database):
+    context = StaticContext()
+    data_path = os.path.join(os.path.dirname(__file__), os.pardir,
+                             "functionaltests", "suites", "cite", "data")
+    admin.load_records(context, database, "records", data_path)
+    repos = repository.Repository(database, context, table="records")
+    constraint = {"where": "identifier = :pvalue0",
+                  "values": ["urn:uuid:19887a8a-f6b0-4a63-ae56-7fba0e17801f"]}
+    title = {"name": "dc:title", "xpath": "dc:title",
+             "dbcol": repos.queryables["_all"]["dc:title"]["dbcol"]}
+    assert repos.update(recprops=[{"rp": title, "value": "Updated"}],
+                        constraint=constraint) == 1
+    record = repos.query(constraint)[1][0]
+    assert etree.fromstring(record.xml_brief).findtext(
+        "{http://purl.org/dc/elements/1.1/}title") == "Updated"
+
+
+def test_render_records_adds_columns(database):
+    context = StaticContext()
+    data_path = os.path.join(os.path.dirname(__file__), os.pardir,
+                             "functionaltests", "suites", "cite", "data")
+    admin.load_records(context, database, "records", data_path)
+    engine = sqlalchemy.create_engine(database)
+    engine.execute("drop trigger records_rendered")
+    for column in ("xml_brief", "xml_summary"):
+        engine.execute("alter table records drop column %s" % column)
+    repository.Repository.refresh_datasets(database, "records")
+    assert admin.render_records(context, database, "records") == 12
+    assert engine.execute("select count(*) from records where "
+                          "xml_brief is null or xml_summary is null"
+                          ).scalar() == 0
+    assert engine.execute("select count(*) from sqlite_master where "
+                          "name = 'records_rendered'").scalar() == 1
@@ -0,0 +1,563 @@
+# =================================================================
+#
+# Authors: pycsw development team
+#
+# Copyright (c) 2026 pycsw development team
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+#
+# =================================================================
+"""Unit tests for pycsw.server"""
+
+import base64
+import json
+import os
+import sqlite3
+import threading
+import types
+from wsgiref.util import setup_testing_defaults
+
+import pytest
+from six.moves import configparser
+from six.moves.urllib.parse import quote
+
+from pycsw import server
+from pycsw.core import admin
+from pycsw.core import repository
+from pycsw.core.config import StaticContext
+from pycsw.core.etree import etree
+from pycsw.plugins.profiles.apiso import apiso
+
+pytestmark = pytest.mark.unit
+
+CONFIGURATION = u"""
+[server]
+home=.
+url=http://localhost/pycsw/csw.py
+maxrecords=10
+profiles=apiso
+
+[manager]
+transactions=true
+
+[metadata:main]
+identification_title=pycsw Geospatial Catalogue
+
+[repository]
+database=sqlite:///records.db
+table=records
+"""
+
+
+@pytest.fixture()
+def config_path(tmpdir):
+    path = tmpdir.join("default.cfg")
+    path.write_text(CONFIGURATION, encoding="utf-8")
+    yield str(path)
+    server.ServerState.clear()
+
+
+@pytest.fixture()
+def repository_config_path(tmpdir):
+    sample = os.path.join(os.path.dirname(__file__), "..", "..",
+                          "default-sample.cfg")
+    database = "sqlite:///{0}".format(tmpdir.join("records.db"))
+    admin.setup_db(database, "records", str(tmpdir))
+    config = configparser.SafeConfigParser()
+    config.read(sample)
+    config.set("repository", "database", database)
+    config.set("server", "capabilities_ttl", "0")
+    path = tmpdir.join("default.cfg")
+    with open(str(path), "w") as fh:
+        config.write(fh)
+    yield str(path)
+    server.ServerState.clear()
+
+
+def _get_capabilities(config_path, **extra_environ):
+    env = {
+        "QUERY_STRING": "service=CSW&version=2.0.2&request=GetCapabilities",
+        "REQUEST_METHOD": "GET"
+    }
+    env.update(extra_environ)
+    setup_testing_defaults(env)
+    pycsw_server = server.Csw(config_path, env)
+    status, contents = pycsw_server.dispatch_wsgi()
+    return status, pycsw_server.headers, contents
+
+
+def test_server_state_is_cached(config_path):
+    state = server.ServerState.get(config_path)
+    assert server.ServerState.get(config_path) is state
+
+
+def test_server_state_is_reloaded_on_config_change(config_path):
+    state = server.ServerState.get(config_path)
+    mtime = os.path.getmtime(config_path)
+    os.utime(config_path, (mtime + 10, mtime + 10))
+    reloaded = server.ServerState.get(config_path)
+    assert reloaded is not state
+    assert reloaded.mtime == mtime + 10
+
+
+def test_server_state_sets_geometry_cache(repository_config_path,
+                                          monkeypatch):
+    config = configparser.SafeConfigParser()
+    config.read(repository_config_path)
+    config.set("repository", "geometry_cache", "100")
+    with open(repository_config_path, "w") as fh:
+        config.write(fh)
+    monkeypatch.setattr(repository, "RECORD_GEOMETRIES",
+                        repository.GeometryCache())
+    status, headers, contents = _get_capabilities(repository_config_path)
+    assert repository.RECORD_GEOMETRIES.size == 100
+    # set with the state, not by each request
+    repository.RECORD_GEOMETRIES.size = 10
+    status, headers, contents = _get_capabilities(repository_config_path)
+    assert repository.RECORD_GEOMETRIES.size == 10
+
+
+def test_server_state_prepares_models(config_path):
+    state = server.ServerState.get(config_path)
+    for version, prefix in [("3.0.0", "csw30"), ("2.0.2", "csw")]:
+        model = state.context.models[prefix]
+        assert model["operations_order"].count("Transaction") == 1
+        assert "GetDomain" in model["operations"]
+        output_schemas = (model["operations"]["GetRecords"]["parameters"]
+                          ["outputSchema"]["values"])
+        assert len(output_schemas) == len(set(output_schemas))
+        assert "gmd:MD_Metadata" in model["typenames"]
+        assert list(state.profiles[version]["loaded"].keys()) == [
+            "http://www.isotc211.org/2005/gmd"]
+
+
+def test_csw_uses_server_state(config_path):
+    env = {"QUERY_STRING": "", "REQUEST_METHOD": "GET"}
+    first = server.Csw(config_path, env)
+    second = server.Csw(config_path, env, version="2.0.2")
+    state = server.ServerState.get(config_path)
+    assert first.state is second.state is state
+    assert first.config is state.config
+    assert first.context is not state.context
+    assert first.context.model is state.context.models["csw30"]
+    assert second.context.model is state.context.models["csw"]
+    first.context.namespaces["foo"] = "http://example.org/foo"
+    assert "foo" not in second.context.namespaces
+    assert "foo" not in state.context.namespaces
+
+
+def test_csw_reports_missing_configuration(tmpdir):
+    env = {"QUERY_STRING": "", "REQUEST_METHOD": "GET"}
+    pycsw_server = server.Csw(str(tmpdir.join("missing.cfg")), env)
+    assert pycsw_server.state is None
+    assert hasattr(pycsw_server, "response")
+
+
+def test_server_state_reload_refreshes_repository(config_path, monkeypatch):
+    refreshed = []
+    monkeypatch.setattr(
+        "pycsw.core.repository.Repository.refresh_datasets",
+        lambda table=None: refreshed.append(("datasets", table)))
+    monkeypatch.setattr(
+        "pycsw.core.repository.Repository.refresh_capabilities",
+        lambda table=None: refreshed.append(("capabilities", table)))
+    server.ServerState.get(config_path)
+    assert refreshed == []
+    mtime = os.path.getmtime(config_path)
+    os.utime(config_path, (mtime + 10, mtime + 10))
+    server.ServerState.get(config_path)
+    assert refreshed == [("datasets", "records"), ("capabilities", "records")]
+
+
+def test_capabilities_are_cached(repository_config_path):
+    status, headers, contents = _get_capabilities(repository_config_path)
+    assert status == "200 OK"
+    assert b"csw:Capabilities" in contents
+    state = server.ServerState.get(repository_config_path)
+    assert len(state.capabilities) == 1
+    status, cached_headers, cached_contents = _get_capabilities(
+        repository_config_path)
+    assert status == "200 OK"
+    assert cached_contents == contents
+    assert cached_headers["ETag"] == headers["ETag"]
+
+
+def test_capabilities_not_modified(repository_config_path):
+    status, headers, contents = _get_capabilities(repository_config_path)
+    status, headers, contents = _get_capabilities(
+        repository_config_path, HTTP_IF_NONE_MATCH=headers["ETag"])
+    assert status == "304 Not Modified"
+    assert contents == b""
+    status, headers, contents = _get_capabilities(
+        repository_config_path, HTTP_IF_NONE_MATCH='"outdated"')
+    assert status == "200 OK"
+    etag = headers["ETag"]
+    # weak tags, and that of the gzip compressed response, match too
+    for if_none_match in ["W/%s" % etag, '"outdated", %s-gzip"' % etag[:-1],
+                          'W/%s-gzip"' % etag[:-1]]:
+        status, headers, contents = _get_capabilities(
+            repository_config_path, HTTP_IF_NONE_MATCH=if_none_match)
+        assert status == "304 Not Modified"
+
+
+def test_capabilities_updatesequence_change(repository_config_path,
+                                            monkeypatch):
+    status, headers, contents = _get_capabilities(repository_config_path)
+    monkeypatch.setattr("pycsw.core.repository.Repository.query_insert",
+                        lambda self: "2017-01-01T00:00:00Z")
+    status, new_headers, new_contents = _get_capabilities(
+        repository_config_path, HTTP_IF_NONE_MATCH=headers["ETag"])
+    assert status == "200 OK"
+    assert new_headers["ETag"] != headers["ETag"]
+    assert new_headers["Last-Modified"] == "Sun, 01 Jan 2017 00:00:00 GMT"
+    assert b'updateSequence="1483228800"' in new_contents
+
+
+@pytest.fixture()
+def streaming_config_path(repository_config_path):
+    config = configparser.SafeConfigParser()
+    config.read(repository_config_path)
+    records = os.path.join(os.path.dirname(__file__), "..", "functionaltests",
+                           "suites", "cite", "data")
+    admin.load_records(StaticContext(),
+                       config.get("repository", "database"),
+                       config.get("repository", "table"), records)
+    config.set("server", "streaming", "true")
+    with open(repository_config_path, "w") as fh:
+        config.write(fh)
+    return repository_config_path
+
+
+@pytest.mark.parametrize("version, namespace", [
+    ("2.0.2", "http://www.opengis.net/cat/csw/2.0.2"),
+    ("3.0.0", "http://www.opengis.net/cat/csw/3.0"),
+])
+def test_getrecords_stream(streaming_config_path, version, namespace):
+    env = {
+        "QUERY_STRING": (
+            "service=CSW&version={0}&request=GetRecords&typenames=csw:Record"
+            "&elementsetname=brief&resulttype=results&maxrecords=5".format(
+                version)),
+        "REQUEST_METHOD": "GET"
+    }
+    setup_testing_defaults(env)
+    pycsw_server = server.Csw(streaming_config_path, env)
+    status, contents = pycsw_server.dispatch_wsgi()
+    assert status == "200 OK"
+    assert isinstance(contents, types.GeneratorType)
+    response = etree.fromstring(b"".join(contents))
+    search_results = response.find("{%s}SearchResults" % namespace)
+    assert search_results.get("numberOfRecordsMatched") == "12"
+    records = search_results.findall("{%s}BriefRecord" % namespace)
+    assert len(records) == 5
+
+
+@pytest.mark.parametrize("version, namespace, stored", [
+    ("2.0.2", "http://www.opengis.net/cat/csw/2.0.2", True),
+    ("3.0.0", "http://www.opengis.net/cat/csw/3.0", False),
+])
+def test_getrecords_rendered(streaming_config_path, version, namespace,
+                             stored):
+    config = configparser.SafeConfigParser()
+    config.read(streaming_config_path)
+    repos = repository.Repository(config.get("repository", "database"),
+                                  StaticContext(),
+                                  table=config.get("repository", "table"))
+    repos.engine.execute("update records set xml_brief = replace("
+                         "xml_brief, '<dc:title>', '<dc:title>stored ')")
+    env = {
+        "QUERY_STRING": (
+            "service=CSW&version={0}&request=GetRecords&typenames=csw:Record"
+            "&elementsetname=brief&resulttype=results".format(version)),
+        "REQUEST_METHOD": "GET"
+    }
+    setup_testing_defaults(env)
+    status, contents = server.Csw(streaming_config_path,
+                                  env).dispatch_wsgi()
+    assert status == "200 OK"
+    response = etree.fromstring(b"".join(contents))
+    titles = response.findall("{%s}SearchResults/{%s}BriefRecord/"
+                              "{http://purl.org/dc/elements/1.1/}title" %
+                              (namespace, namespace))
+    assert len(titles) == 10
+    # CSW 3.0 records are always written out from the columns
+    assert all((title.text or "").startswith("stored ") == stored
+               for title in titles)
+
+
+@pytest.mark.parametrize("elementsetname", ["brief", "summary", "full"])
+def test_getrecords_profile_writer(streaming_config_path, monkeypatch,
+                                   elementsetname):
+    compiled = []
+    compile_record_writer = apiso.APISO.compile_record_writer
+
+    def compile_counted(self, *args):
+        compiled.append(args[:2])
+        return compile_record_writer(self, *args)
+
+    monkeypatch.setattr(apiso.APISO, "compile_record_writer", compile_counted)
+    env = {
+        "QUERY_STRING": (
+            "service=CSW&version=2.0.2&request=GetRecords&typenames=csw:Record"
+            "&elementsetname={0}&resulttype=results"
+            "&outputschema=http://www.isotc211.org/2005/gmd".format(
+                elementsetname)),
+        "REQUEST_METHOD": "GET"
+    }
+    setup_testing_defaults(env)
+    status, contents = server.Csw(streaming_config_path,
+                                  env).dispatch_wsgi()
+    assert status == "200 OK"
+    search_results = etree.fromstring(b"".join(contents)).find(
+        "{http://www.opengis.net/cat/csw/2.0.2}SearchResults")
+    records = search_results.findall(
+        "{http://www.isotc211.org/2005/gmd}MD_Metadata")
+    assert len(records) == 10
+    assert compiled == [(elementsetname, "http://www.isotc211.org/2005/gmd")]
+    abstracts = search_results.findall(
+        ".//{http://www.isotc211.org/2005/gmd}abstract")
+    assert len(abstracts) == (0 if elementsetname == "brief" else 10)
+
+
+def test_getrecords_rendered_updated_elsewhere(streaming_config_path):
+    config = configparser.SafeConfigParser()
+    config.read(streaming_config_path)
+    database = config.get("repository", "database")
+    identifier = "urn:uuid:19887a8a-f6b0-4a63-ae56-7fba0e17801f"
+    connection = sqlite3.connect(database.replace("sqlite:///", ""))
+    with connection:
+        connection.execute("update records set title = 'Updated elsewhere' "
+                           "where identifier = ?", (identifier,))
+        # envelope and other columns leave the renderings alone
+        connection.execute("update records set minx = minx, anytext = 'x'")
+    rendered = connection.execute(
+        "select identifier from records where xml_brief is not null and "
+        "xml_summary is not null").fetchall()
+    connection.close()
+    assert len(rendered) == 11
+    assert (identifier,) not in rendered
+
+    env = {
+        "QUERY_STRING": (
+            "service=CSW&version=2.0.2&request=GetRecordById"
+            "&elementsetname=brief&id={0}".format(identifier)),
+        "REQUEST_METHOD": "GET"
+    }
+    setup_testing_defaults(env)
+    status, contents = server.Csw(streaming_config_path,
+                                  env).dispatch_wsgi()
+    assert status == "200 OK"
+    assert etree.fromstring(contents).findtext(
+        "{http://www.opengis.net/cat/csw/2.0.2}BriefRecord/"
+        "{http://purl.org/dc/elements/1.1/}title") == "Updated elsewhere"
+
+
+@pytest.mark.parametrize("version, namespace, parameters", [
+    ("2.0.2", "http://www.opengis.net/cat/csw/2.0.2", "resulttype=hits"),
+    ("3.0.0", "http://www.opengis.net/cat/csw/3.0", "resulttype=hits"),
+    ("3.0.0", "http://www.opengis.net/cat/csw/3.0", "maxrecords=0"),
+])
+def test_getrecords_hits_only_counts(streaming_config_path, monkeypatch,
+                                     version, namespace, parameters):
+    def query(*args, **kwargs):
+        raise AssertionError("records should not be queried")
+
+    monkeypatch.setattr(repository.Repository, "query", query)
+    env = {
+        "QUERY_STRING": (
+            "service=CSW&version={0}&request=GetRecords&typenames=csw:Record"
+            "&elementsetname=brief&{1}".format(version, parameters)),
+        "REQUEST_METHOD": "GET"
+    }
+    setup_testing_defaults(env)
+    pycsw_server = server.Csw(streaming_config_path, env)
+    status, contents = pycsw_server.dispatch_wsgi()
+    assert status == "200 OK"
+    response = etree.fromstring(contents)
+    search_results = response.find("{%s}SearchResults" % namespace)
+    assert search_results.get("numberOfRecordsMatched") == "12"
+    assert len(search_results) == 0
+
+
+def test_oaipmh_resumption_token_pages(streaming_config_path):
+    namespace = "http://www.openarchives.org/OAI/2.0/"
+    query = "mode=oaipmh&verb=ListRecords&metadataPrefix=oai_dc"
+    identifiers = []
+    token = None
+    while token != "0":
+        env = {"QUERY_STRING": query, "REQUEST_METHOD": "GET"}
+        if token is not None:
+            env["QUERY_STRING"] += "&resumptionToken=%s" % token
+        setup_testing_defaults(env)
+        status, contents = server.Csw(streaming_config_path,
+                                      env).dispatch_wsgi()
+        response = etree.fromstring(contents)
+        identifiers.extend(
+            element.text for element in
+            response.iter("{http://purl.org/dc/elements/1.1/}identifier"))
+        token = response.find(".//{%s}resumptionToken" % namespace).text
+    assert len(identifiers) == len(set(identifiers)) == 12
+    assert identifiers == sorted(identifiers)
+
+
+@pytest.mark.parametrize("key", [
+    "urn:uuid:19887a8a-f6b0-4a63-ae56-7fba0e17801f",
+    [{"identifier": 1}],
+    [None, None],
+])
+def test_oaipmh_resumption_token_invalid_key(streaming_config_path, key):
+    namespace = "http://www.openarchives.org/OAI/2.0/"
+    token = base64.urlsafe_b64encode(
+        json.dumps([10, key]).encode("utf-8")).decode("ascii")
+    env = {"QUERY_STRING": "mode=oaipmh&verb=ListIdentifiers&"
+                           "metadataPrefix=oai_dc&resumptionToken=%s" % token,
+           "REQUEST_METHOD": "GET"}
+    setup_testing_defaults(env)
+    status, contents = server.Csw(streaming_config_path, env).dispatch_wsgi()
+    response = etree.fromstring(contents)
+    # the key is ignored in favour of the record position: 10 to 12 of 12
+    assert response.find("{%s}error" % namespace) is None
+    assert len(response.findall(".//{%s}header" % namespace)) == 3
+
+
+@pytest.fixture()
+def ranking_config_path(streaming_config_path):
+    config = configparser.SafeConfigParser()
+    config.read(streaming_config_path)
+    config.set("server", "streaming", "false")
+    config.set("server", "spatial_ranking", "true")
+    with open(streaming_config_path, "w") as fh:
+        config.write(fh)
+    return streaming_config_path
+
+
+def _get_record_identifiers(config_path, constraint=None):
+    query = ("service=CSW&version=2.0.2&request=GetRecords"
+             "&typenames=csw:Record&elementsetname=brief"
+             "&resulttype=results&maxrecords=12")
+    if constraint is not None:
+        query += ("&constraintlanguage=FILTER"
+                  "&constraint_language_version=1.1.0"
+                  "&constraint=%s" % quote(constraint))
+    env = {"QUERY_STRING": query, "REQUEST_METHOD": "GET"}
+    setup_testing_defaults(env)
+    status, contents = server.Csw(config_path, env).dispatch_wsgi()
+    assert status == "200 OK"
+    response = etree.fromstring(contents)
+    return [element.text for element in
+            response.iter("{http://purl.org/dc/elements/1.1/}identifier")]
+
+
+def test_getrecords_ranking_is_request_scoped(ranking_config_path):
+    spatial = (
+        '<ogc:Filter xmlns:ogc="http://www.opengis.net/ogc" '
+        'xmlns:gml="http://www.opengis.net/gml"><ogc:BBOX>'
+        '<ogc:PropertyName>ows:BoundingBox</ogc:PropertyName>'
+        '<gml:Envelope><gml:lowerCorner>-90 -180</gml:lowerCorner>'
+        '<gml:upperCorner>90 180</gml:upperCorner></gml:Envelope>'
+        '</ogc:BBOX></ogc:Filter>'
+    )
+    constraints = [spatial, None]
+    expected = [_get_record_identifiers(ranking_config_path, constraint)
+                for constraint in constraints]
+    assert expected[0] != expected[1][:len(expected[0])]
+
+    errors = []
+
+    def run(offset):
+        try:
+            for request in range(20):
+                index = (offset + request) % len(constraints)
+                results = _get_record_identifiers(ranking_config_path,
+                                                  constraints[index])
+                assert results == expected[index]
+        except Exception as err:
+            errors.append(err)
+
+    threads = [threading.Thread(target=run, args=(offset,))
+               for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def _get_full_records(config_path, version, **options):
+    config = configparser.SafeConfigParser()
+    config.read(config_path)
+    for option, value in options.items():
+        config.set("server", option, value)
+    with open(config_path, "w") as fh:
+        config.write(fh)
+    env = {
+        "QUERY_STRING": (
+            "service=CSW&version={0}&request=GetRecords&typenames=csw:Record"
+            "&elementsetname=full&resulttype=results".format(
+                version)),
+        "REQUEST_METHOD": "GET"
+    }
+    setup_testing_defaults(env)
+    status, contents = server.Csw(config_path, env).dispatch_wsgi()
+    assert status == "200 OK"
+    return b"".join(contents) if options.get("streaming") == "true" \
+        else contents
+
+
+@pytest.mark.parametrize("streaming", ["true", "false"])
+def test_getrecords_passthrough(streaming_config_path, streaming):
+    expected = _get_full_records(streaming_config_path, "2.0.2",
+                                 streaming=streaming, passthrough="false")
+    contents = _get_full_records(streaming_config_path, "2.0.2",
+                                 streaming=streaming, passthrough="true")
+    assert b"<?pycsw-record" not in contents
+    # stored records keep their own namespace declarations, used or not
+    assert b'xmlns:xsd="' not in expected
+    assert b'xmlns:xsd="' in contents
+
+    def canonical_records(contents):
+        search_results = etree.fromstring(contents).find(
+            "{http://www.opengis.net/cat/csw/2.0.2}SearchResults")
+        return [etree.tostring(record, method="c14n", exclusive=True)
+                for record in search_results]
+
+    records = canonical_records(contents)
+    assert len(records) == 10
+    assert records == canonical_records(expected)
+
+
+def test_splice_stored_records(config_path):
+    env = {"QUERY_STRING": "", "REQUEST_METHOD": "GET"}
+    setup_testing_defaults(env)
+    pycsw_server = server.Csw(config_path, env)
+    first = pycsw_server._pass_through(
+        b"<record><?pycsw-record 2?></record>")
+    second = pycsw_server._pass_through(b"<other/>")
+    response = etree.Element("response")
+    response.extend([first, second])
+    spliced = pycsw_server._splice_stored_records(etree.tostring(response))
+    # placeholder-like instructions of stored documents are kept as is
+    assert spliced == (b"<response><record><?pycsw-record 2?></record>"
+                       b"<other/></response>")
+    assert pycsw_server.stored_records == {}
+    assert pycsw_server._splice_stored_records(
+        b"<?pycsw-record 1?>") == b"<?pycsw-record 1?>"
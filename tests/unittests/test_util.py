@@ -28,6 +28,7 @@
 # =================================================================
 """Unit tests for pycsw.core.util"""
 
+import copy
 import datetime as dt
 import os
 import time
@@ -37,6 +38,8 @@ import pytest
 from shapely.wkt import loads
 
 from pycsw.core import util
+from pycsw.core.config import StaticContext
+from pycsw.core.etree import etree
 
 pytestmark = pytest.mark.unit
 
@@ -92,14 +95,52 @@ def test_get_version_integer_invalid_version(invalid_version):
     ("ns1:first/*/ns3:third", "{something}first/*/{another}third"),
     ("", ""),
 ])
-def test_nspath_eval(xpath_expression, expected):
-    nsmap = {
+@pytest.mark.parametrize("namespaces", [dict, util.Namespaces])
+def test_nspath_eval(xpath_expression, expected, namespaces):
+    nsmap = namespaces({
         "ns1": "something",
         "ns2": "other",
         "ns3": "another",
-    }
+    })
     result = util.nspath_eval(xpath_expression, nsmap)
     assert result == expected
+    assert util.get_qnames(nsmap)[xpath_expression] == expected
+
+
+def test_namespaces_qnames():
+    nsmap = util.Namespaces(ns1="something")
+    assert util.nspath_eval("ns1:first", nsmap) == "{something}first"
+    assert nsmap.qnames == {"ns1:first": "{something}first"}
+    qnames = nsmap.qnames
+    nsmap.update(ns1="something")
+    nsmap["ns1"] = "something"
+    assert nsmap.qnames is qnames
+    assert util.Namespaces(nsmap).qnames is qnames
+    assert nsmap.copy().qnames is qnames
+    nsmap.update(ns1="other")
+    assert nsmap.qnames is not qnames
+    assert util.nspath_eval("ns1:first", nsmap) == "{other}first"
+    assert qnames == {"ns1:first": "{something}first"}
+    clone = copy.copy(nsmap)
+    clone["ns1"] = "another"
+    assert util.nspath_eval("ns1:first", clone) == "{another}first"
+    assert util.nspath_eval("ns1:first", nsmap) == "{other}first"
+    with pytest.raises(KeyError):
+        util.nspath_eval("ns2:first", nsmap)
+
+
+def test_namespaces_qnames_per_request():
+    context = StaticContext()
+    request_namespaces = []
+    for request in range(2):  # as an OAI-PMH request extends them
+        namespaces = context.clone().namespaces
+        namespaces.update({"oai": "http://www.openarchives.org/OAI/2.0/"})
+        namespaces.update({"gco": "http://www.isotc211.org/2005/gco"})
+        util.nspath_eval("oai:record", namespaces)
+        request_namespaces.append(namespaces)
+    assert request_namespaces[0].qnames is request_namespaces[1].qnames
+    assert "oai:record" in request_namespaces[1].qnames
+    assert context.namespaces.qnames is not request_namespaces[0].qnames
 
 
 def test_nspath_eval_invalid_element():
@@ -250,3 +291,72 @@ def test_ipaddress_in_whitelist(ip, whitelist, expected):
     assert result == expected
 
 
+
+
+def test_get_xml_schema(tmpdir):
+    schema_path = tmpdir.join("schema.xsd")
+    schema_path.write(
+        '<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">'
+        '<xs:element name="foo" type="xs:string"/>'
+        '</xs:schema>'
+    )
+    schema = util.get_xml_schema(str(schema_path))
+    assert util.get_xml_schema(str(schema_path)) is schema
+    assert schema.validate(etree.fromstring("<foo>bar</foo>"))
+    assert not schema.validate(etree.fromstring("<bar/>"))
+
+
+@pytest.mark.parametrize("xml, valid", [
+    ('<csw:GetRecords xmlns:csw="http://www.opengis.net/cat/csw/2.0.2"/>',
+     True),
+    ('<csw:GetRecord xmlns:csw="http://www.opengis.net/cat/csw/2.0.2"/>',
+     False),
+    ('<csw:GetRecords xmlns:csw="http://www.opengis.net/cat/csw/3.0"/>',
+     False),
+    ('<GetRecords/>', False),
+])
+def test_check_xml_structure(xml, valid):
+    doc = etree.fromstring(xml)
+    if valid:
+        util.check_xml_structure(
+            doc, "http://www.opengis.net/cat/csw/2.0.2", ["GetRecords"])
+    else:
+        with pytest.raises(RuntimeError):
+            util.check_xml_structure(
+                doc, "http://www.opengis.net/cat/csw/2.0.2", ["GetRecords"])
+
+
+
+@pytest.mark.parametrize("xml, expected", [
+    (b'<?xml version="1.0" encoding="UTF-8"?>\n<a:b xmlns:a="urn:a"/>\n',
+     b'<a:b xmlns:a="urn:a"/>'),
+    (b"<?xml version='1.0' encoding='us-ascii' standalone='yes'?><b/>",
+     b"<b/>"),
+    (u'<?xml version="1.0" encoding="ISO-8859-1"?><b>\xe9</b>',
+     u'<b>\xe9</b>'.encode("utf-8")),
+    (b'\xef\xbb\xbf<b/>', b'<b/>'),
+    (b'<?xml version="1.0" encoding="ISO-8859-1"?><b>\xe9</b>', None),
+    (b'<!DOCTYPE b><b/>', None),
+    (b'<?xml version="1.0"?>\n<!-- comment --><b/>', None),
+])
+def test_get_document_root(xml, expected):
+    assert util.get_document_root(xml) == expected
+
+def test_constraint_filter_dict():
+    namespaces = {"ogc": "http://www.opengis.net/ogc"}
+    element = etree.fromstring(
+        '<ogc:Filter xmlns:ogc="http://www.opengis.net/ogc">'
+        '<ogc:FeatureId fid="1"/></ogc:Filter>')
+    get_filter = mock.Mock(return_value=element)
+    constraint = util.Constraint(type="filter")
+    assert "_dict" not in constraint
+    assert constraint.get("_dict") is None
+    constraint.set_filter(get_filter, namespaces)
+    assert "_dict" in constraint
+    assert get_filter.call_count == 0
+    expected = {"ogc:Filter": {"ogc:FeatureId": {"@fid": "1"}}}
+    assert constraint["_dict"] == expected
+    assert constraint.get("_dict") == expected
+    assert get_filter.call_count == 1
+    with pytest.raises(KeyError):
+        constraint["where"]
@@ -28,6 +28,8 @@
 # =================================================================
 """Unit tests for pycsw.wsgi"""
 
+import gzip
+from io import BytesIO
 from wsgiref.util import setup_testing_defaults
 
 import mock
@@ -99,6 +101,15 @@ def test_compress_response(compression_level):
         assert headers["Content-Encoding"] == "gzip"
 
 
+@pytest.mark.parametrize("compression_level", [1, 9])
+def test_compress_response_stream(compression_level):
+    chunks = [b"<a>", b"dummy" * 100, b"</a>"]
+    compressed = b"".join(
+        wsgi.compress_response_stream(iter(chunks), compression_level))
+    with gzip.GzipFile(fileobj=BytesIO(compressed)) as fh:
+        assert fh.read() == b"".join(chunks)
+
+
 def test_application_no_gzip():
     fake_config_path = "fake_config_path"
     fake_status = "fake_status"
@@ -113,8 +124,11 @@ def test_application_no_gzip():
         mock_get_config_path.return_value = fake_config_path
         mock_csw_class = mock_server.Csw
         mock_pycsw = mock_csw_class.return_value
+        mock_pycsw.config = mock.MagicMock()
+        mock_pycsw.config.has_option.return_value = False
         mock_pycsw.dispatch_wsgi.return_value = (fake_status, fake_response)
         mock_pycsw.contenttype = fake_content_type
+        mock_pycsw.headers = {}
         result = wsgi.application(request_env, mock_start_response)
         mock_csw_class.assert_called_with(fake_config_path, request_env)
         start_response_args = mock_start_response.call_args[0]
@@ -147,7 +161,65 @@ def test_application_gzip():
         mock_pycsw.config.get.return_value = fake_compression_level
         mock_pycsw.dispatch_wsgi.return_value = (fake_status, fake_response)
         mock_pycsw.contenttype = fake_content_type
+        mock_pycsw.headers = {}
         wsgi.application(request_env, mock_start_response)
         mock_pycsw.config.get.assert_called_with("server",
                                                  "gzip_compresslevel")
         mock_compress.assert_called_with(fake_response, fake_compression_level)
+
+
+def test_application_stream():
+    fake_config_path = "fake_config_path"
+    fake_status = "fake_status"
+    fake_content_type = "fake_content_type"
+    fake_response = (chunk for chunk in [b"fake", b"_response"])
+    request_env = {}
+    setup_testing_defaults(request_env)
+    mock_start_response = mock.MagicMock()
+    with mock.patch("pycsw.wsgi.server", autospec=True) as mock_server, \
+            mock.patch.object(
+                wsgi, "get_configuration_path") as mock_get_config_path:
+        mock_get_config_path.return_value = fake_config_path
+        mock_pycsw = mock_server.Csw.return_value
+        mock_pycsw.config = mock.MagicMock()
+        mock_pycsw.config.has_option.return_value = False
+        mock_pycsw.dispatch_wsgi.return_value = (fake_status, fake_response)
+        mock_pycsw.contenttype = fake_content_type
+        mock_pycsw.headers = {}
+        result = wsgi.application(request_env, mock_start_response)
+        status, headers = mock_start_response.call_args[0]
+        assert status == fake_status
+        assert dict(headers) == {"Content-Type": fake_content_type}
+        assert result is fake_response
+
+
+@pytest.mark.parametrize("status, accept_encoding, compressible, expected", [
+    ("200 OK", "", False, {"ETag": '"abc"'}),
+    ("200 OK", "", True, {"ETag": '"abc"', "Vary": "Accept-Encoding"}),
+    ("200 OK", "gzip", True, {"ETag": '"abc-gzip"',
+                              "Vary": "Accept-Encoding",
+                              "Content-Encoding": "gzip"}),
+    ("304 Not Modified", "", True, {"ETag": '"abc"',
+                                    "Vary": "Accept-Encoding"}),
+    ("304 Not Modified", "gzip", True, {"ETag": '"abc-gzip"',
+                                        "Vary": "Accept-Encoding"}),
+])
+def test_application_etag(status, accept_encoding, compressible, expected):
+    request_env = {"HTTP_ACCEPT_ENCODING": accept_encoding}
+    setup_testing_defaults(request_env)
+    mock_start_response = mock.MagicMock()
+    with mock.patch("pycsw.wsgi.server.Csw", autospec=True) as mock_csw, \
+            mock.patch.object(wsgi, "get_configuration_path"):
+        mock_pycsw = mock_csw.return_value
+        mock_pycsw.config = mock.MagicMock()
+        mock_pycsw.config.has_option.return_value = compressible
+        mock_pycsw.config.get.return_value = "5"
+        mock_pycsw.dispatch_wsgi.return_value = (
+            status, b"" if status.startswith("304") else b"fake_response")
+        mock_pycsw.contenttype = "fake_content_type"
+        mock_pycsw.headers = {"ETag": '"abc"'}
+        wsgi.application(request_env, mock_start_response)
+        headers = dict(mock_start_response.call_args[0][1])
+        for name in ["Content-Type", "Content-Length"]:
+            headers.pop(name, None)
+        assert headers == expected